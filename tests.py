@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-import datetime
+import datetime, copy, StringIO, pickle, tempfile, os, array, itertools
 
 try:
 	import ujson as json
@@ -9,6 +9,18 @@ except ImportError:
 	import json
 	HAS_UJSON = False
 
+try:
+	import numpy
+	HAS_NUMPY = True
+except ImportError:
+	HAS_NUMPY = False
+
+try:
+	import trollius
+	HAS_TROLLIUS = True
+except ImportError:
+	HAS_TROLLIUS = False
+
 import unittest
 
 import typed
@@ -101,6 +113,76 @@ class TestTypedTest(unittest.TestCase):
 		t5 = t3 | t4
 		self.assertItemsEqual(t5.types, [typed.string, typed.int, typed.none, typed.bool])
 
+	def test_union_dispatch(self):
+		t_set = typed.set(1.5, 'x')
+		t_list = typed.list(typed.int)
+		t = typed.UnionType(typed.int, typed.string, typed.none, t_set, t_list, typed.dict({'a': typed.int}))
+
+		self.assertEqual(t.test_dispatch[int], (typed.int, t_set))
+		self.assertEqual(t.test_dispatch[float], (t_set, ))
+		self.assertEqual(t.test_dispatch[str], (typed.string, t_set))
+		self.assertEqual(t.test_dispatch[type(None)], (typed.none, ))
+		self.assertEqual(t.test_dispatch[list], (t_list, ))
+		self.assertEqual(t.test_dispatch[tuple], ())
+
+		for value in [1, 1L, 'a', u'b', None, 1.5, [1, 2], {'a': 1}]:
+			self.assertTrue(t.test(value))
+		for value in [True, 2.5, (), [1.2], {'b': 1}, self]:
+			self.assertFalse(t.test(value))
+
+		class Subclass(int):
+			pass
+
+		self.assertTrue(t.test(Subclass(1)))
+
+		t_datetime = typed.datetime.format('%Y-%m-%d')
+		t = t_datetime | typed.dict({'a': typed.int})
+		self.assertEqual(t.load_dispatch[str], (t_datetime, ))
+		self.assertEqual(t.save_dispatch[str], ())
+		self.assertEqual(t.save_dispatch[datetime.datetime], (t_datetime, ))
+
+	def test_validate(self):
+		t = typed.dict({
+				'a': typed.int,
+				'b': typed.list(typed.string | typed.none),
+				'c/d': typed.tuple(typed.int, typed.bool).optional,
+				'e': typed.tagged('kind', {'x': typed.dict({'y': typed.int})}).optional,
+			})
+
+		result = t.validate({'a': 1, 'b': ['x', None]})
+		self.assertTrue(result)
+		self.assertTrue(result.valid)
+		self.assertEqual(len(result), 0)
+
+		obj = {'a': 'x', 'b': ['a', 1, None, 2.0], 'c/d': (1, 2), 'e': {'kind': 'x', 'y': 'z'}, 'f': 1}
+
+		result = t.validate(obj)
+		self.assertFalse(result)
+		self.assertEqual(len(result), 1)
+
+		result = t.validate(obj, first=False)
+		self.assertFalse(result.valid)
+		self.assertItemsEqual([(failure.path, failure.expected) for failure in result], [
+				('/a', typed.int),
+				('/b/1', t.fields['b'].type),
+				('/b/3', t.fields['b'].type),
+				('/c~1d/1', typed.bool),
+				('/e/y', typed.int),
+				('/f', None),
+			])
+
+		result = t.validate({'b': [], 'e': {'kind': 'z'}}, first=False)
+		self.assertItemsEqual([(failure.path, failure.message) for failure in result], [
+				('/a', 'dict is missing field'),
+				('/e/kind', 'unknown kind'),
+			])
+
+		for value in [1, 'a', True, [1, 2, 3], 1.2, None, {'a': 1}, self]:
+			self.assertEqual(bool(t.validate(value)), t.test(value))
+			self.assertEqual(bool(t.trimmed.validate(value)), t.trimmed.test(value))
+
+		self.assertEqual([failure.path for failure in typed.list(typed.int).validate(5)], [''])
+
 	def test_set(self):
 		t1 = typed.set(1, 2, 3)
 		self.assertTrue(isinstance(t1, typed.SetType))
@@ -126,6 +208,43 @@ class TestTypedTest(unittest.TestCase):
 		self.assertItemsEqual(t3.values, [1, 2, 3, None, 'a'])
 
 
+	def test_range(self):
+		t1 = typed.int.range(-1, 1)
+		self.assertTrue(isinstance(t1, typed.RangeType))
+		self.assertTrue(all(t1.test(value) for value in [-1, 0, 1]))
+		for value in [-2, 2, 0.5, True, '0', None]:
+			self.assertFalse(t1.test(value))
+
+		t2 = typed.range(0, 1.5)
+		self.assertTrue(t2.test(0) and t2.test(1.5) and t2.test(1))
+		self.assertFalse(t2.test(1.6) or t2.test(False))
+		self.assertTrue(typed.float.range(4, 5.2).test(4.0))
+		self.assertFalse(typed.float.range(4, 5.2).test(4))
+		self.assertTrue(typed.range('a', 'z').test('m'))
+		self.assertFalse(typed.range('a', 'z').test('zz'))
+		self.assertTrue(typed.range(datetime.date(2013, 1, 1), datetime.date(2013, 12, 31)).test(datetime.date(2013, 5, 7)))
+		self.assertRaises(TypeError, typed.int.range, 0, 1.5)
+		self.assertRaises(TypeError, typed.range, None, 1)
+		self.assertRaises(ValueError, typed.int.range, 1, 0)
+
+		t3 = typed.int.range(20, 30) | typed.int.range(1, 3) | typed.set(10, 'x') | typed.int.range(4, 6) | typed.int.range(25, 40)
+		self.assertTrue(isinstance(t3, typed.RangeType))
+		self.assertEqual(t3.intervals, ((1, 6), (20, 40)))
+		self.assertEqual(repr(t3), "(typed.int.range(1, 6) | typed.int.range(20, 40) | %r)" % typed.set(10, 'x'))
+		self.assertEqual([value for value in xrange(50) if t3.test(value)], range(1, 7) + [10] + range(20, 41))
+		self.assertTrue(t3.test('x') and t3.test(10.0))
+		self.assertEqual(t3.load(5), 5)
+		self.assertRaises(ValueError, t3.save, 7)
+
+		t4 = typed.int.range(1, 3) | typed.float.range(1, 3) | typed.string
+		self.assertEqual(len(t4.types), 3)
+		self.assertTrue(t4.test(2) and t4.test(2.5) and t4.test('a'))
+		self.assertEqual(t4.load_dispatch[float], (t4.types[1], ))
+
+		compiled = t3.compile()
+		self.assertEqual([value for value in xrange(50) if compiled.test(value)], range(1, 7) + [10] + range(20, 41))
+		self.assertEqual(pickle.loads(pickle.dumps(t3)), t3)
+
 	def test_list(self):
 		self.assertRaises(TypeError, typed.list, int)
 
@@ -216,6 +335,49 @@ class TestTypedTest(unittest.TestCase):
 
 		self.assertFalse(t2.test([1, True]))
 
+	def test_equality(self):
+		def make():
+			return typed.dict({
+					'a': typed.list(typed.int | typed.none),
+					'b': typed.string.default([]),
+					'c': typed.date.format('%Y-%m-%d').format({'never': None}),
+					'd': typed.json(typed.tuple(typed.float, typed.set('x', 'y'))),
+				})
+
+		t1, t2 = make(), make()
+		self.assertEqual(t1, t2)
+		self.assertFalse(t1 != t2)
+		self.assertEqual(hash(t1), hash(t2))
+		self.assertEqual(t1.compile(), t2.compile())
+		self.assertEqual(pickle.loads(pickle.dumps(t1)), t1)
+		self.assertEqual({t1: 1}[t2], 1)
+
+		for t3 in [t1.trimmed, typed.dict({'a': typed.int}), typed.list(t1), typed.json(t1), None, 1]:
+			self.assertNotEqual(t1, t3)
+		self.assertNotEqual(typed.string.default([]), typed.string.default(None))
+		self.assertNotEqual(typed.json(t1), typed.json(t1, encoder='schema'))
+		self.assertNotEqual(typed.profile(t1), typed.profile(t1))
+
+		i1, i2 = typed.intern(t1), typed.intern(t2)
+		self.assertTrue(i1 is i2)
+		self.assertEqual(i1, t1)
+		self.assertTrue(i1.fields['a'] is typed.intern(typed.list(typed.int | typed.none)))
+		self.assertTrue(typed.intern(typed.IntType()) is typed.int)
+
+		# values which are equal in Python but converted differently
+		for a, b in [
+				(typed.any.default(0), typed.any.default(False)),
+				(typed.number.default(0), typed.number.default(0.0)),
+				(typed.set(1), typed.set(True)),
+				(typed.dict({'f': typed.any.default(0)}), typed.dict({'f': typed.any.default(False)})),
+				]:
+			self.assertNotEqual(a, b)
+			self.assertNotEqual(hash(a), hash(b))
+			self.assertFalse(typed.intern(a) is typed.intern(b))
+		self.assertTrue(typed.intern(typed.dict({'f': typed.any.default(False)})).load({})['f'] is False)
+		typed.intern(typed.set(True))
+		self.assertTrue(typed.binary(typed.intern(typed.set(1))).load(typed.binary(typed.set(1)).save(1)) is 1)
+
 
 class TestTypedLoadSave(unittest.TestCase):
 	def test_simple_types(self):
@@ -366,6 +528,138 @@ class TestTypedLoadSave(unittest.TestCase):
 		self.assertEqual(t4.load(list(dt_str_list)), dt_list)
 		self.assertEqual(t4.save(list(dt_list)), dt_str_list)
 
+	def test_optimize(self):
+		self.assertEqual(repr(typed.int | typed.string | typed.none), '(typed.int | typed.string | typed.none)')
+		self.assertEqual(repr((typed.int | typed.none) | (typed.string | typed.int)), '(typed.int | typed.none | typed.string)')
+		self.assertEqual(repr(typed.int | typed.none | typed.int), '(typed.int | typed.none)')
+		self.assertEqual(repr(typed.set('a') | typed.int | typed.set('b') | typed.set('c')), repr(typed.set('a') | typed.int | typed.set('b', 'c')))
+		self.assertTrue(typed.int | typed.any | typed.string is typed.any)
+		self.assertEqual(repr(typed.date.format('%Y') | typed.int | typed.any), "(typed.date.format('%Y') | typed.any)")
+
+		t = typed.list(typed.UnionType(typed.UnionType(typed.int, typed.none), typed.int, typed.UnionType(typed.any)))
+		self.assertEqual(repr(t.optimize()), 'typed.list(typed.any)')
+		self.assertEqual(repr(t.compile().optimize()), 'typed.list(typed.any).compile()')
+
+		obj = [(1, 'a'), (2, 'b')]
+		t = typed.list(typed.tuple(typed.int, typed.string))
+		self.assertTrue(t.load(obj) is obj)
+		self.assertTrue(t.save_new(obj) is obj)
+		self.assertTrue(obj[0] is t.type.load(obj[0]))
+		self.assertRaises(ValueError, t.load, [(1, 'a'), (2, 3)])
+
+	def test_reorder(self):
+		a = typed.dict({'kind': typed.set('a'), 'value': typed.int})
+		b = typed.dict({'kind': typed.set('b'), 'value': typed.string})
+		t = (a | b).reorder([1, 0])
+		self.assertEqual(repr(t), '(%r | %r).reorder([1, 0])' % (a, b))
+		self.assertEqual(t.load_dispatch[dict], (b, a))
+		self.assertEqual(t.load({'kind': 'a', 'value': 1}), {'kind': 'a', 'value': 1})
+		self.assertTrue(t.compile().test({'kind': 'b', 'value': 'x'}))
+		self.assertNotEqual(t, a | b)
+		self.assertEqual(pickle.loads(pickle.dumps(t)), t)
+		self.assertRaises(ValueError, (a | b).reorder, [0])
+
+		# members which might convert the same objects keep their order in load and save
+		t = (typed.dict({'a': typed.int, 'b': typed.int.optional}) | typed.dict({'a': typed.int}).trimmed).reorder([1, 0])
+		self.assertEqual(t.test_dispatch[dict], t.types[::-1])
+		self.assertEqual(t.load_dispatch[dict], t.types)
+		self.assertEqual(t.load({'a': 1, 'b': 2}), {'a': 1, 'b': 2})
+
+		t = typed.dict({'a': typed.int, 'b': typed.string}).trimmed.reorder(['b', 'a'])
+		self.assertEqual(repr(t), "typed.dict({'a': typed.int, 'b': typed.string}).trimmed.reorder(['b', 'a'])")
+		self.assertEqual([field for field, type in t.ordered_fields], ['b', 'a'])
+		self.assertEqual(t.load({'a': 1, 'b': 'x', 'c': 2}), {'a': 1, 'b': 'x'})
+		self.assertEqual(pickle.loads(pickle.dumps(t)), t)
+		self.assertRaises(ValueError, t.reorder, ['a', 'c'])
+
+	def test_list_buffers(self):
+		t1 = typed.list(typed.float, buffers=True)
+		t2 = typed.list(typed.int | typed.none, buffers=True)
+		self.assertEqual(repr(t1), 'typed.list(typed.float, buffers=True)')
+
+		floats = array.array('d', [1.5, 2.5])
+		ints = array.array('l', [1, 2])
+		for t, accepted, rejected in [(t1, floats, ints), (t2, ints, floats)]:
+			for t in [t, t.compile()]:
+				self.assertTrue(t.test(accepted))
+				self.assertTrue(t.load(accepted) is accepted)
+				self.assertTrue(t.save(accepted) is accepted)
+				self.assertTrue(t.load_new(accepted) is accepted)
+				self.assertFalse(t.test(rejected))
+				self.assertRaises(ValueError, t.load, rejected)
+				self.assertRaises(ValueError, t.load, 'ab')
+
+		self.assertTrue(typed.list(typed.float, buffers=True).test(array.array('f')))
+
+		# range bounds are checked over the items
+		t3 = typed.list(typed.float.range(0, 1), buffers=True)
+		t4 = typed.list(typed.int.range(0, 3) | typed.int.range(10, 12) | typed.set(20), buffers=True)
+		for t, accepted, rejected in [
+				(t3, [[], [0.5], [0, 1, 0.25]], [[0.5, 2], [0.5, float('nan')], [-0.5]]),
+				(t4, [[1, 11], [3, 20, 0]], [[1, 5], [1, 21]]),
+				]:
+			code = 'l' if t is t4 else 'd'
+			for t in [t, t.compile()]:
+				for items in accepted:
+					self.assertTrue(t.test(array.array(code, items)), items)
+				for items in rejected:
+					self.assertFalse(t.test(array.array(code, items)), items)
+				if HAS_NUMPY:
+					for items in accepted:
+						self.assertTrue(t.test(numpy.array(items, dtype=code)), items)
+						self.assertTrue(t.test(memoryview(numpy.array(items, dtype=code))), items)
+					for items in rejected:
+						self.assertFalse(t.test(numpy.array(items, dtype=code)), items)
+						self.assertFalse(t.test(memoryview(numpy.array(items, dtype=code))), items)
+		self.assertFalse(t3.test(array.array('l', [0])))
+		self.assertFalse(typed.list(typed.float).test(floats))
+		self.assertRaises(ValueError, typed.list(typed.int).load, ints)
+		self.assertEqual(typed.json(t1, encoder='schema').save(floats), '[1.5,2.5]')
+		self.assertEqual(typed.binary(t2).load(typed.binary(t2).save(ints)), [1, 2])
+
+		if HAS_NUMPY:
+			self.assertTrue(t1.test(numpy.zeros(3)))
+			self.assertTrue(t2.test(numpy.arange(3)))
+			self.assertTrue(t2.test(memoryview(numpy.arange(3))))
+			self.assertFalse(t1.test(numpy.zeros((3, 3))))
+			self.assertFalse(t1.test(numpy.arange(3)))
+
+	def test_iter(self):
+		t = typed.iter(typed.date.format('%Y-%m-%d'))
+		self.assertEqual(repr(t), "typed.iter(typed.date.format('%Y-%m-%d'))")
+		self.assertRaises(TypeError, typed.iter, int)
+
+		consumed = []
+		def days():
+			for day in ['2013-01-01', '2013-01-02', 'x']:
+				consumed.append(day)
+				yield day
+
+		items = t.load(days())
+		self.assertEqual(consumed, [])
+		self.assertEqual([items.next(), items.next()], [datetime.date(2013, 1, 1), datetime.date(2013, 1, 2)])
+		self.assertEqual(len(consumed), 2)
+		with self.assertRaisesRegexp(ValueError, '^item 2: '):
+			items.next()
+
+		self.assertEqual(list(t.save([datetime.date(2013, 1, 1)])), ['2013-01-01'])
+		self.assertEqual(list(itertools.islice(typed.iter(typed.int).load(itertools.count()), 3)), [0, 1, 2])
+		for value in [1, 'abc', u'abc', {'a': 1}, None]:
+			self.assertFalse(t.test(value))
+			self.assertRaises(ValueError, t.load, value)
+
+		t = typed.dict({'id': typed.int, 'days': typed.iter(typed.date.format('%Y-%m-%d'))})
+		for t in [t, t.compile()]:
+			obj = t.load({'id': 1, 'days': iter(['2013-01-01'])})
+			self.assertEqual(list(obj['days']), [datetime.date(2013, 1, 1)])
+			self.assertTrue(t.test({'id': 1, 'days': ('x' for i in xrange(3))}))
+			self.assertRaises(ValueError, list, t.load({'id': 1, 'days': ['x']})['days'])
+
+		# the encoders consume the iterator
+		for f in [typed.json(t, encoder='schema'), typed.binary(t)]:
+			data = f.save_new({'id': 1, 'days': iter([datetime.date(2013, 1, 1)])})
+			self.assertEqual(list(f.load(data)['days']), [datetime.date(2013, 1, 1)])
+
 	def test_dict(self):
 		datetime_format = '%Y-%m-%d %H:%M:%S'
 		dt = datetime.datetime(2013, 9, 21, 11, 42, 33)
@@ -445,6 +739,92 @@ class TestTypedLoadSave(unittest.TestCase):
 		self.assertRaises(ValueError, t.load, {'a': '', 'c': 2})
 
 
+	def test_lazy_dict(self):
+		t = typed.dict({
+				'a': typed.int,
+				'b': typed.datetime.format('%Y-%m-%d %H:%M:%S'),
+				'c': typed.json(typed.list(typed.int)),
+				'd': typed.bool.default(False),
+				'e': typed.string.optional,
+			})
+
+		obj = {'a': 1, 'b': '2013-02-15 10:11:12', 'c': '[1, 2]'}
+		lazy = t.load_lazy(obj)
+		self.assertEqual(lazy.values, {})
+		self.assertEqual(lazy['c'], [1, 2])
+		self.assertTrue(lazy['c'] is lazy['c'])
+		self.assertEqual(lazy.values.keys(), ['c'])
+		self.assertEqual(dict(lazy), t.load(copy.deepcopy(obj)))
+		self.assertEqual(sorted(lazy), ['a', 'b', 'c', 'd'])
+		self.assertFalse('e' in lazy)
+		self.assertEqual(lazy.get('e'), None)
+		self.assertEqual(obj, {'a': 1, 'b': '2013-02-15 10:11:12', 'c': '[1, 2]'})
+
+		lazy = t.load_lazy({'a': 1, 'b': 'invalid', 'c': 'invalid', 'e': 'x'})
+		self.assertEqual(lazy['e'], 'x')
+		self.assertRaises(ValueError, lazy.__getitem__, 'b')
+		self.assertRaises(ValueError, lazy.__getitem__, 'c')
+
+		self.assertRaises(ValueError, t.load_lazy, None)
+		self.assertRaises(ValueError, t.load_lazy, {'a': 1, 'b': ''})
+		self.assertRaises(ValueError, t.load_lazy, {'a': 1, 'b': '', 'c': '', 'f': 1})
+		self.assertEqual(dict(t.trimmed.load_lazy({'a': 1, 'b': '2013-02-15 10:11:12', 'c': '[]', 'f': 1})), {'a': 1, 'b': datetime.datetime(2013, 2, 15, 10, 11, 12), 'c': [], 'd': False})
+
+	def test_load_columns(self):
+		t = typed.dict({
+				'a': typed.int,
+				'b': typed.float.optional,
+				'c': typed.set('x', 'y'),
+				'd': typed.date.format('%Y-%m-%d').optional,
+				'e': typed.bool.default(False),
+			})
+		records = [
+				{'a': 1, 'b': 1.5, 'c': 'x', 'd': '2013-02-15'},
+				{'a': 2, 'c': 'y', 'e': True},
+				{'a': 3, 'b': 2.5, 'c': 'x', 'e': False, 'd': '2013-02-16'},
+			]
+
+		loaded = typed.list(t).load_columns(copy.deepcopy(records))
+		self.assertEqual(loaded, typed.list(t).load(copy.deepcopy(records)))
+		self.assertEqual(t.load_columns([]), [])
+		self.assertEqual(t.trimmed.load_columns([{'a': 1, 'c': 'x', 'f': 1}]), [{'a': 1, 'c': 'x', 'e': False}])
+
+		for obj, message in [
+				(None, 'object is not a list'),
+				([{'a': 1, 'c': 'x'}, None], 'record 1: object is not a dict'),
+				([{'a': 1, 'c': 'x'}, {'a': 1}], "record 1: dict is missing field 'c'"),
+				([{'a': 1, 'c': 'x'}, {'a': 1, 'c': 'x', 'f': 1}], 'record 1: dict has unexpected fields'),
+				([{'a': 1, 'c': 'x'}, {'a': True, 'c': 'x'}], 'record 1: object has invalid type'),
+				([{'a': 1, 'c': 'x'}, {'a': 1, 'c': 'z'}], 'record 1: object has invalid type'),
+				([{'a': 1, 'c': 'x'}, {'a': 1, 'c': 'x', 'b': 1}], 'record 1: object has invalid type'),
+				([{'a': 1, 'c': 'x'}, {'a': 1, 'c': 'x', 'd': '15.02.2013'}], "record 1: time data '15.02.2013' does not match format '%Y-%m-%d'"),
+				]:
+			with self.assertRaises(ValueError) as context:
+				t.load_columns(obj)
+			self.assertEqual(str(context.exception), message)
+
+		# records before the failing one are already converted in place
+		nested = typed.dict({'a': typed.dict({'d': typed.date.format('%Y-%m-%d')}), 'b': typed.int.optional})
+		for obj, message in [
+				([{'a': {'d': '2013-01-01'}}, {'a': {'d': '2013-1-x'}}], "record 1: time data '2013-1-x' does not match format '%Y-%m-%d'"),
+				([{'a': {'d': '2013-01-01'}}, {'a': {'d': '2013-01-01'}, 'b': 'x'}], 'record 1: object has invalid type'),
+				]:
+			with self.assertRaises(ValueError) as context:
+				nested.load_columns(obj)
+			self.assertEqual(str(context.exception), message)
+
+		self.assertRaises(TypeError, typed.list(typed.int).load_columns, [])
+
+		if HAS_NUMPY:
+			arrays = t.load_columns(copy.deepcopy(records), arrays=True)
+			self.assertEqual(sorted(arrays), ['a', 'b', 'c', 'd', 'e'])
+			self.assertEqual(arrays['a'].dtype, numpy.int64)
+			self.assertEqual(arrays['e'].dtype, numpy.bool_)
+			self.assertEqual(arrays['e'].tolist(), [False, True, False])
+			self.assertEqual(arrays['b'].tolist(), [1.5, None, 2.5])
+			self.assertEqual(arrays['d'].tolist(), [datetime.date(2013, 2, 15), None, datetime.date(2013, 2, 16)])
+			self.assertEqual(t.load_columns([{'a': 1, 'b': 1.5, 'c': 'x'}], arrays=True)['b'].dtype, numpy.float64)
+
 	def test_format_datetime(self):
 		datetime_formats = ['%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%d %H:%M:%S', '%A, %d. %B %Y %I:%M%p']
 		dt = datetime.datetime.now()
@@ -461,6 +841,39 @@ class TestTypedLoadSave(unittest.TestCase):
 			self.assertEqual(t.load(dt_str), new_dt)
 
 
+	def test_format_fast_path(self):
+		datetime_formats = ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f', '%d/%m/%Y', '%H:%M', '100%% %Y']
+		values = ['2013-10-11', '2013-10-11 11:02:45', '2013-10-11T11:02:45.123456', '11/10/2013', '11:02', '100% 2013',
+				'2013-1-11', '2013-13-11', '2013-02-30', '2013-10-11 24:00:00', '2013-10-11 11:02:45.1', '2013-10-11T11:02:45.12345',
+				'0000-10-11', '0999-10-11', '11/10/13', '', u'2013-10-11', u'٣٣٣٣-10-11', ' 2013-10-11', 1, None]
+
+		for datetime_format in datetime_formats:
+			t1 = typed.datetime.format(datetime_format)
+			t2 = typed.date.format(datetime_format)
+			self.assertTrue(t1.parse is not None)
+			self.assertTrue(t2.parse is not None)
+
+			for value in values:
+				try:
+					dt = datetime.datetime.strptime(value, datetime_format)
+				except (ValueError, TypeError):
+					self.assertRaises(ValueError, t1.load, value)
+					self.assertRaises(ValueError, t2.load, value)
+				else:
+					self.assertEqual(t1.load(value), dt)
+					self.assertEqual(t2.load(value), dt.date())
+
+			for dt in [datetime.datetime(2013, 10, 11, 11, 2, 45, 123), datetime.datetime(1899, 12, 31)]:
+				for t, value in [(t1, dt), (t2, dt.date())]:
+					try:
+						dt_str = value.strftime(datetime_format)
+					except ValueError:
+						self.assertRaises(ValueError, t.save, value)
+					else:
+						self.assertEqual(t.save(value), dt_str)
+
+		self.assertTrue(typed.datetime.format('%A, %d. %B %Y %I:%M%p').parse is None)
+
 	def test_format_date(self):
 		datetime_formats = ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%A, %d. %B %Y %I:%M%p']
 		dt = datetime.date.today()
@@ -575,6 +988,216 @@ class TestTypedLoadSave(unittest.TestCase):
 			self.assertItemsEqual(t3.save(obj)[2:-1].split(',"'), obj_json.replace(' ', '')[2:-1].split(',"'))		# elements might come in different order
 
 
+	def test_format_json_schema(self):
+		t1 = typed.dict({
+				'a': typed.int,
+				'b': (typed.string | typed.none).optional,
+				'c': typed.list(typed.dict({'x': typed.int, 'y': typed.date.format('%Y-%m-%d').optional})).default([]),
+				'd': (typed.int | typed.list(typed.dict({'z': typed.list(typed.int)}))).optional,
+				'e': typed.bool.format({True: 1, False: 0}).optional,
+			})
+		t2 = typed.json(t1, decoder='schema')
+		t3 = typed.json(t1.trimmed, decoder='schema')
+
+		for value in [
+				'{"a": 1}', ' {"a": 1, "b": null, "c": [], "d": 2}\n', '{"a": 1, "c": [{"x": 1}, {"x": 2, "y": "2013-02-15"}], "e": 0}',
+				'{"d": [{"z": [1, 2]}, {"z": []}], "a": 1, "b": "\\u017e"}', u'{"a": 1, "b": "ž"}', '{"a":1,"b":"x","c":[ {"x":1} ],"d":[ ],"e":1}',
+				'{"a": 1, "d": [{"z": [1]}, {"z": [%s]}], "c": [{"x": 1}], "b": "%s"}' % (', '.join(['1'] * 1000), 'x' * 5000),
+				]:
+			self.assertEqual(t2.load(value), t1.load(json.loads(value)))
+			self.assertEqual(t2.compile().load(value), t1.load(json.loads(value)))
+
+		for value in [
+				'', '[]', '"a"', '{"a": "1"}', '{"b": null}', '{"a": 1, "f": 2}', '{"a": 1, "c": [{"x": 1.5}]}', '{"a": 1, "d": [{"z": 1}]}',
+				'{"a": 1, "d": 1.5}', '{"a": 1, "e": 2}', '{"a": 1}}', '{"a": 1,}', '{"a" 1}', '{a: 1}', '{"a": 1 "b": null}', '{"a": [1, 2}', None, 1,
+				]:
+			self.assertRaises(ValueError, t2.load, value)
+
+		self.assertEqual(t3.load('{"a": 1, "f": {"g": [1, 2, 3]}}'), {'a': 1, 'c': []})
+
+		# invalid objects are rejected before the rest of the string is decoded
+		garbage = 'garbage' * 1000
+		self.assertRaisesRegexp(ValueError, 'invalid type', t2.load, '{"a": "1", "c": [{"x": 1}, ' + garbage)
+		self.assertRaisesRegexp(ValueError, 'unexpected fields', t2.load, '{"f": 1, "c": [{"x": 1}, ' + garbage)
+		self.assertRaisesRegexp(ValueError, 'not a dict', t2.load, '{"a": 1, "d": [{"z": [1]}, [' + garbage)
+		self.assertRaises(ValueError, typed.json(t1).load, '{"a": "1", "c": [{"x": 1}, ' + garbage)
+
+		self.assertEqual(repr(t2), 'typed.json(%r, decoder=\'schema\')' % t1)
+		self.assertRaises(ValueError, typed.json, t1, decoder='fast')
+
+	def test_format_json_encoder(self):
+		t1 = typed.dict({
+				'a': typed.int,
+				'b': (typed.string | typed.none).optional,
+				'c': typed.list(typed.dict({'x': typed.float, 'y': typed.date.format('%Y-%m-%d').optional})).default([]),
+				'd': typed.tuple(typed.bool, typed.list(typed.int)).format(typed.list).optional,
+				'e': typed.any.optional,
+			})
+		t2 = typed.json(t1, encoder='schema')
+
+		for obj in [
+				{'a': 1},
+				{'a': -2 ** 70, 'b': None, 'c': [], 'd': (True, []), 'e': {'f': [1, 'g']}},
+				{'a': 0, 'b': u'ž"\\/\n', 'c': [{'x': 1.5}, {'x': float('inf'), 'y': datetime.date(2013, 2, 15)}], 'd': (False, [1, 2])},
+				{'a': 1, 'b': '\xc5\xbe', 'c': [{'x': -0.1}, {'x': float('nan')}]},
+				]:
+			s = t2.save(copy.deepcopy(obj))
+			self.assertEqual(json.loads(s), json.loads(typed.json(t1).save(copy.deepcopy(obj))))
+			self.assertEqual(t2.compile().save(copy.deepcopy(obj)), s)
+			self.assertTrue(isinstance(s, str))
+			self.assertFalse(' ' in s.replace('\\n', ''))
+
+		self.assertEqual(t2.save({'a': 1, 'c': []}), '{"a":1}')
+
+		# field names are not format strings
+		t3 = typed.json(typed.dict({'100%': typed.int, 'a%sb': typed.string, '%d': typed.int.optional}), encoder='schema')
+		for t in [t3, t3.compile(), typed.json(t3.type | typed.int, encoder='schema')]:
+			obj = {'100%': 1, 'a%sb': 'x', '%d': 2}
+			self.assertEqual(json.loads(t.save(dict(obj))), obj)
+		self.assertEqual(json.loads(t2.save({'a': 1, 'b': 'c', 'c': [{'x': 1.0}]})), {'a': 1, 'b': 'c', 'c': [{'x': 1.0}]})
+
+		for obj in [
+				None, [], {}, {'b': 'c'}, {'a': 1.5}, {'a': True}, {'a': 1, 'f': 1}, {'a': 1, 'b': 1}, {'a': 1, 'c': [{'x': 1}]},
+				{'a': 1, 'c': [{'x': 1.5, 'y': '2013-02-15'}]}, {'a': 1, 'd': (True, [1.5])}, {'a': 1, 'd': (True, )}, {'a': 1, 'd': [True, []]},
+				]:
+			self.assertRaises(ValueError, t2.save, copy.deepcopy(obj))
+			self.assertRaises(ValueError, t2.compile().save, copy.deepcopy(obj))
+
+		obj = {'a': 1, 'c': [{'x': 1.5, 'y': datetime.date(2013, 2, 15)}]}
+		f = StringIO.StringIO()
+		t2.dump(obj, f)
+		buffer = bytearray('[')
+		t2.dump(obj, buffer)
+		self.assertEqual(f.getvalue(), t2.save(copy.deepcopy(obj)))
+		self.assertEqual(buffer, '[' + f.getvalue())
+		self.assertEqual(obj, {'a': 1, 'c': [{'x': 1.5, 'y': datetime.date(2013, 2, 15)}]})
+
+		self.assertEqual(typed.json(typed.list(typed.int) | typed.string, encoder='schema').save([1, 2]), '[1,2]')
+		self.assertRaises(ValueError, typed.json, t1, encoder='fast')
+
+	def test_format_binary(self):
+		t1 = typed.dict({
+				'a': typed.int,
+				'b': (typed.str | typed.none).optional,
+				'c': typed.list(typed.dict({'x': typed.float, 'y': typed.date.format('%Y-%m-%d').optional})).default([]),
+				'd': typed.tuple(typed.bool, typed.set('p', 'q', 'r')),
+				'e': typed.any.optional,
+				'f': typed.tagged('k', {'u': typed.dict({'k': typed.set('u'), 'v': typed.unicode}), 'w': typed.dict({'k': typed.set('w'), 'z': typed.datetime})}).optional,
+			})
+		t2 = typed.binary(t1)
+		self.assertEqual(repr(t2), 'typed.binary(%r)' % t1)
+		self.assertEqual(repr(t1.format(typed.binary)), repr(t2))
+
+		for obj in [
+				{'a': 1, 'd': (True, 'p')},
+				{'a': -2 ** 70, 'b': None, 'c': [], 'd': (False, 'r'), 'e': {'f': [1, u'g', None, (2.5, True)]}},
+				{'a': 300, 'b': 'x', 'c': [{'x': 1.5}, {'x': float('inf'), 'y': datetime.date(2013, 2, 15)}], 'd': (False, 'q'), 'f': {'k': 'u', 'v': u'ž'}},
+				{'a': 0, 'd': (True, 'q'), 'f': {'k': 'w', 'z': datetime.datetime(2013, 2, 15, 23, 59, 59, 999999)}},
+				]:
+			data = t2.save(obj)
+			self.assertTrue(isinstance(data, str))
+			self.assertEqual(t2.load(data), t1.load(t1.save(copy.deepcopy(obj))))
+			self.assertEqual(t2.load(bytearray(data)), t2.load(data))
+			self.assertEqual(t2.compile().load(data), t2.load(data))
+			self.assertRaises(ValueError, t2.load, data + '\x00')
+			for i in xrange(len(data)):
+				self.assertRaises(ValueError, t2.load, data[:i])
+
+		self.assertEqual(t2.save({'a': 1, 'c': [], 'd': (True, 'r')}), '\x00\x02\x01\x02')
+		self.assertEqual(typed.binary(typed.list(typed.int)).save([0, -1, 63, -64, 64]), '\x05\x00\x01\x7e\x7f\x80\x01')
+
+		for obj in [
+				None, {}, {'a': 1}, {'a': 1.5, 'd': (True, 'p')}, {'a': True, 'd': (True, 'p')}, {'a': 1, 'd': (True, 's')}, {'a': 1, 'd': (True, 'p'), 'g': 1},
+				{'a': 1, 'd': (True, 'p'), 'b': 1}, {'a': 1, 'd': (True, 'p', 1)}, {'a': 1, 'd': (True, 'p'), 'e': object()},
+				{'a': 1, 'd': (True, 'p'), 'f': {'k': 'x'}}, {'a': 1, 'd': (True, 'p'), 'c': [{'x': 1.5, 'y': '2013-02-15'}]},
+				]:
+			self.assertRaises(ValueError, t2.save, obj)
+		self.assertRaises(ValueError, t2.load, None)
+		self.assertRaises(ValueError, typed.binary(typed.list(typed.int)).load, '\xff\xff\x7f')
+
+	def test_tagged(self):
+		self.assertRaises(TypeError, typed.tagged, 'kind', [])
+		self.assertRaises(TypeError, typed.tagged, 'kind', {'a': int})
+
+		# the field order of a branch is kept, after the tag
+		t = typed.tagged('kind', {'click': typed.dict({'x': typed.int, 'y': typed.int}).reorder(['y', 'x'])})
+		self.assertEqual([field for field, type in t.types['click'].ordered_fields], ['kind', 'y', 'x'])
+		self.assertTrue(t.test({'kind': 'click', 'x': 1, 'y': 2}))
+
+		t = typed.tagged('kind', {
+				'click': typed.dict({'x': typed.int, 'y': typed.int}),
+				'view': typed.dict({'kind': typed.set('view'), 'page': typed.string, 'count': typed.int.default(1)}),
+				'raw': typed.any,
+			})
+
+		for t in [t, t.compile()]:
+			self.assertTrue(t.test({'kind': 'click', 'x': 1, 'y': 2}))
+			self.assertTrue(t.test({'kind': 'view', 'page': 'a', 'count': 3}))
+			self.assertTrue(t.test({'kind': 'raw', 'foo': None}))
+
+			self.assertFalse(t.test({'kind': 'click', 'page': 'a'}))
+			self.assertFalse(t.test({'kind': 'other'}))
+			self.assertFalse(t.test({'kind': [1]}))
+			self.assertFalse(t.test({}))
+			self.assertFalse(t.test([]))
+
+			self.assertEqual(t.load({'kind': 'view', 'page': 'a'}), {'kind': 'view', 'page': 'a', 'count': 1})
+			self.assertEqual(t.save({'kind': 'view', 'page': 'a', 'count': 1}), {'kind': 'view', 'page': 'a'})
+
+			obj = {'kind': 'click', 'x': 1, 'page': 'a'}
+			self.assertRaises(ValueError, t.load, obj)
+			self.assertEqual(obj, {'kind': 'click', 'x': 1, 'page': 'a'})
+
+			for value in [{'kind': 'other'}, {'kind': {}}, {'page': 'a'}, None]:
+				self.assertRaises(ValueError, t.load, value)
+				self.assertRaises(ValueError, t.save, value)
+
+	def test_load_save_new(self):
+		datetime_format = '%Y-%m-%d %H:%M:%S'
+		dt = datetime.datetime(2013, 9, 21, 11, 42, 33)
+		dt_str = dt.strftime(datetime_format)
+
+		t = typed.dict({
+				'a': typed.list(typed.int),
+				'b': typed.list(typed.datetime.format(datetime_format)).optional,
+				'c': typed.bool.default(False),
+				'd': typed.tuple(typed.int, typed.string).format(typed.list).optional,
+			})
+
+		obj = {'a': [1, 2], 'c': True}
+		self.assertTrue(t.load_new(obj) is obj)
+		self.assertTrue(t.save_new(obj) is obj)
+
+		obj = {'a': [1, 2], 'b': [dt_str, dt_str]}
+		new_obj = t.load_new(obj)
+		self.assertEqual(new_obj, {'a': [1, 2], 'b': [dt, dt], 'c': False})
+		self.assertEqual(obj, {'a': [1, 2], 'b': [dt_str, dt_str]})
+		self.assertTrue(new_obj['a'] is obj['a'])
+
+		saved_obj = t.save_new(new_obj)
+		self.assertEqual(saved_obj, obj)
+		self.assertEqual(new_obj, {'a': [1, 2], 'b': [dt, dt], 'c': False})
+		self.assertTrue(saved_obj['a'] is obj['a'])
+
+		self.assertEqual(t.load_new({'a': [], 'd': [1, 'x']}), {'a': [], 'c': False, 'd': (1, 'x')})
+		self.assertEqual(t.save_new({'a': [], 'd': (1, 'x')}), {'a': [], 'd': [1, 'x']})
+
+		self.assertRaises(ValueError, t.load_new, {'a': [1], 'e': 1})
+		self.assertEqual(t.trimmed.load_new({'a': [1], 'e': 1}), {'a': [1], 'c': False})
+
+		t = typed.dict({'a': typed.datetime.format(datetime_format), 'b': typed.int}) | typed.dict({'a': typed.string, 'b': typed.string})
+
+		obj = {'a': dt_str, 'b': 'x'}
+		self.assertEqual(t.load_new(obj), {'a': dt_str, 'b': 'x'})
+		self.assertEqual(obj, {'a': dt_str, 'b': 'x'})
+
+		t = typed.list(typed.datetime.format(datetime_format)) | typed.list(typed.string)
+
+		obj = [dt_str, 'x']
+		self.assertTrue(t.load_new(obj) is obj)
+		self.assertEqual(obj, [dt_str, 'x'])
+		self.assertRaises(ValueError, t.save_new, [dt, 1])
+
 	def test_tuple(self):
 		t1 = typed.tuple(typed.int, typed.datetime.format('%Y-%m-%d %H:%M:%S'), typed.string | typed.none)
 
@@ -608,6 +1231,561 @@ class TestTypedLoadSave(unittest.TestCase):
 		self.assertRaises(ValueError, t2.save, [3, datetime.datetime(2013, 10, 11, 11, 02, 45), None])
 
 
+class TestTypedCompile(unittest.TestCase):
+	def assertSameLoad(self, t, ct, value, method='load'):
+		try:
+			expected = getattr(t, method)(copy.deepcopy(value))
+		except ValueError:
+			self.assertRaises(ValueError, getattr(ct, method), copy.deepcopy(value))
+		else:
+			self.assertEqual(getattr(ct, method)(copy.deepcopy(value)), expected)
+
+	def test_compiled_test(self):
+		types = [
+				typed.int, typed.float, typed.none, typed.string, typed.bool, typed.date, typed.datetime, typed.any,
+				typed.int | typed.string | typed.none,
+				typed.set(1, 2, 'a', None) | typed.list(typed.int),
+				typed.list(typed.int | typed.string),
+				typed.tuple(typed.int, typed.bool),
+				typed.tuple(),
+				typed.dict({'a': typed.int, 'b': typed.bool.optional, 'c': typed.list(typed.string).default([])}),
+				typed.dict({'a': typed.int}).trimmed,
+			]
+		values = [1, 1L, True, 1.2, None, 'a', u'π', datetime.date.today(), datetime.datetime.now(), [], [1, 'a'], [[]],
+				(), (1, True), (True, 1), {}, {'a': 1}, {'a': 1, 'b': False}, {'a': 1, 'c': ['x']}, {'a': 1, 'd': 0}, self]
+
+		for t in types:
+			ct = t.compile()
+			self.assertTrue(isinstance(ct, typed.CompiledType))
+			for value in values:
+				self.assertEqual(bool(ct.test(value)), bool(t.test(value)), msg=repr(value))
+
+	def test_compiled_load_save(self):
+		datetime_format = '%Y-%m-%d %H:%M:%S'
+		dt = datetime.datetime(2013, 9, 21, 11, 42, 33)
+		dt_str = dt.strftime(datetime_format)
+
+		t = typed.dict({
+				'a': typed.string,
+				'b': typed.int.optional.format({1: 'one', 2: 'two'}),
+				'c': typed.bool.default(False),
+				'd': typed.set(0, 1).default(0),
+				'e': typed.datetime.format(datetime_format).optional,
+				'f': typed.list(typed.datetime.format(datetime_format) | typed.int).optional,
+				'g': typed.json(typed.dict({'x': typed.int.default(0)})).optional,
+				'h': typed.tuple(typed.int, typed.string | typed.none).format(typed.list).optional,
+			})
+		ct = t.compile()
+
+		for value in [{'a': ''}, {'a': '', 'b': 'one', 'c': True, 'd': 1}, {'a': '', 'e': dt_str, 'f': [dt_str, 3]},
+				{'a': '', 'g': '{}', 'h': [1, None]}, {'a': '', 'h': [1]}, {'a': '', 'd': 2}, {'a': '', 'z': 1}, {}, 'a']:
+			self.assertSameLoad(t, ct, value)
+
+		for value in [{'a': ''}, {'a': '', 'b': 1, 'c': False, 'd': 1}, {'a': '', 'e': dt, 'f': [dt, 3]},
+				{'a': '', 'g': {'x': 0}, 'h': (1, None)}, {'a': '', 'h': (1, )}, {'a': '', 'c': 1}, {'a': '', 'z': 1}, {}, 'a']:
+			self.assertSameLoad(t, ct, value, 'save')
+
+		ct = t.trimmed.compile()
+		self.assertEqual(ct.load({'a': '', 'z': 1}), {'a': '', 'c': False, 'd': 0})
+		self.assertEqual(ct.save({'a': '', 'c': False, 'z': 1}), {'a': ''})
+
+	def test_compiled_composition(self):
+		ct = typed.list(typed.int).compile()
+		t = typed.dict({'a': ct, 'b': ct.optional})
+
+		self.assertTrue(t.test({'a': [1, 2]}))
+		self.assertFalse(t.test({'a': [1, 2], 'b': ['3']}))
+		self.assertEqual(t.compile().load({'a': [1], 'b': [2]}), {'a': [1], 'b': [2]})
+		self.assertRaises(ValueError, t.compile().load, {'a': ['1']})
+
+
+class TestTypedStream(unittest.TestCase):
+	t = typed.dict({
+			'id': typed.int,
+			'date': typed.date.format('%Y-%m-%d'),
+			'tags': typed.list(typed.string).default([]),
+		})
+
+	records = [
+			{'id': 1, 'date': datetime.date(2013, 1, 1), 'tags': []},
+			{'id': 2, 'date': datetime.date(2013, 1, 2), 'tags': ['a', 'b']},
+			{'id': 3, 'date': datetime.date(2013, 1, 3), 'tags': ['c']},
+		]
+
+	def test_round_trip(self):
+		for compression in [None, 'gzip', 'bz2']:
+			f = StringIO.StringIO()
+			self.assertEqual(typed.stream.dump(self.t, iter(copy.deepcopy(self.records)), f, compression=compression, buffer_size=10), 3)
+
+			f.seek(0)
+			self.assertEqual(list(typed.stream.load(self.t, f, compression=compression)), self.records)
+
+	def test_dump_does_not_modify(self):
+		records = copy.deepcopy(self.records)
+		f = StringIO.StringIO()
+		typed.stream.dump(self.t, records, f)
+
+		self.assertEqual(records, self.records)
+		self.assertEqual(json.loads(f.getvalue().split('\n')[0]), {'id': 1, 'date': '2013-01-01'})
+
+	def test_bad_lines(self):
+		data = '{"id": 1, "date": "2013-01-01"}\n\n{"id": "x", "date": "2013-01-01"}\nnot json\n{"id": 2, "date": "2013-01-02"}'
+
+		self.assertEqual([record['id'] for record in typed.stream.load(self.t, StringIO.StringIO(data), on_error='skip')], [1, 2])
+
+		reader = typed.stream.load(self.t, StringIO.StringIO(data), on_error='collect')
+		self.assertEqual([record['id'] for record in reader], [1, 2])
+		self.assertEqual([error[0] for error in reader.errors], [3, 4])
+
+		reader = typed.stream.load(self.t, StringIO.StringIO(data))
+		self.assertRaises(ValueError, list, reader)
+
+		self.assertRaises(ValueError, typed.stream.load, self.t, StringIO.StringIO(data), on_error='ignore')
+
+	def test_json_format(self):
+		t = typed.json(self.t)
+		f = StringIO.StringIO()
+		typed.stream.dump(t, self.records, f)
+
+		f.seek(0)
+		self.assertEqual(list(typed.stream.load(t, f)), self.records)
+
+	def test_line_decoder(self):
+		decoder = typed.stream.LineDecoder(max_size=8)
+		self.assertEqual(decoder.feed('ab'), [])
+		self.assertEqual(decoder.feed('c\nde\n\nf'), ['abc', 'de', ''])
+		self.assertEqual(decoder.feed('g'), [])
+		self.assertEqual(decoder.flush(), ['fg'])
+		self.assertEqual(decoder.flush(), [])
+
+		self.assertRaises(ValueError, decoder.feed, '123456789')
+		decoder = typed.stream.LineDecoder(max_size=8)
+		decoder.feed('12345')
+		self.assertRaises(ValueError, decoder.feed, '6789\n')
+
+	def test_frame_decoder(self):
+		data = ''.join(typed.stream.FrameDecoder.encode(frame) for frame in ['abc', '', 'de\nf'])
+		decoder = typed.stream.FrameDecoder()
+		frames = []
+		for i in xrange(0, len(data), 3):
+			frames.extend(decoder.feed(data[i:i + 3]))
+		self.assertEqual(frames, ['abc', '', 'de\nf'])
+		self.assertEqual(decoder.flush(), [])
+
+		decoder.feed(data[:5])
+		self.assertRaises(ValueError, decoder.flush)
+		self.assertRaises(ValueError, typed.stream.FrameDecoder(max_size=2).feed, data)
+
+
+@unittest.skipUnless(HAS_TROLLIUS, 'trollius is not available')
+class TestTypedAio(unittest.TestCase):
+	t = TestTypedStream.t
+	records = TestTypedStream.records
+
+	def setUp(self):
+		import typed.aio
+		self.loop = trollius.new_event_loop()
+
+	def tearDown(self):
+		self.loop.close()
+
+	def stream(self, data):
+		stream = trollius.StreamReader(loop=self.loop)
+		stream.feed_data(data)
+		stream.feed_eof()
+		return stream
+
+	def batches(self, reader):
+		batches = []
+		while True:
+			batch = self.loop.run_until_complete(reader.read_batch())
+			if not batch:
+				return batches
+			batches.append(batch)
+
+	def test_ndjson(self):
+		f = StringIO.StringIO()
+		typed.stream.dump(self.t, self.records, f)
+
+		reader = typed.aio.load(self.t, self.stream(f.getvalue()), batch_size=2, chunk_size=7, loop=self.loop)
+		self.assertEqual(self.batches(reader), [self.records[:2], self.records[2:]])
+
+	def test_frames(self):
+		t = typed.json(self.t)
+		data = ''.join(typed.stream.FrameDecoder.encode(t.save_new(record)) for record in self.records)
+
+		reader = typed.aio.load(t, self.stream(data), framing='length', loop=self.loop)
+		self.assertEqual(self.loop.run_until_complete(reader.read_all()), self.records)
+
+		reader = typed.aio.load(t, self.stream(data[:-1]), framing='length', loop=self.loop)
+		self.assertRaises(ValueError, self.loop.run_until_complete, reader.read_all())
+
+	def test_executor(self):
+		f = StringIO.StringIO()
+		typed.stream.dump(self.t, self.records * 100, f)
+
+		reader = typed.aio.load(self.t, self.stream(f.getvalue()), batch_size=150, time_slice=0, loop=self.loop)
+		self.assertEqual([len(batch) for batch in self.batches(reader)], [150, 150])
+
+	def test_bad_frames(self):
+		data = '{"id": 1, "date": "2013-01-01"}\n\n{"id": "x", "date": "2013-01-01"}\nnot json\n{"id": 2, "date": "2013-01-02"}'
+
+		reader = typed.aio.load(self.t, self.stream(data), on_error='collect', batch_size=2, loop=self.loop)
+		self.assertEqual([record['id'] for record in self.loop.run_until_complete(reader.read_all())], [1, 2])
+		self.assertEqual([error[0] for error in reader.errors], [3, 4])
+
+		reader = typed.aio.load(self.t, self.stream(data), loop=self.loop)
+		self.assertRaises(ValueError, self.loop.run_until_complete, reader.read_all())
+
+		self.assertRaises(ValueError, typed.aio.load, self.t, self.stream(data), framing='xml', loop=self.loop)
+
+
+class TestTypedRecords(unittest.TestCase):
+	t = typed.dict({
+			'id': typed.int,
+			'date': typed.date.format('%Y-%m-%d'),
+			'tags': typed.list(typed.string).default([]),
+			'score': typed.float.optional,
+		})
+
+	records = [{'id': i, 'date': datetime.date(2013, 1, 1 + i % 28), 'tags': ['a'] * (i % 3)} for i in xrange(100)]
+
+	def setUp(self):
+		fd, self.path = tempfile.mkstemp()
+		os.close(fd)
+
+	def tearDown(self):
+		os.remove(self.path)
+
+	def test_round_trip(self):
+		records = copy.deepcopy(self.records)
+		records[7]['score'] = 1.5
+		saved = copy.deepcopy(records)
+		self.assertEqual(typed.records.dump(self.t, iter(records), self.path, buffer_size=10), 100)
+		self.assertEqual(records, saved)
+
+		with typed.records.open(self.t, self.path) as f:
+			self.assertEqual(len(f), 100)
+			self.assertEqual([dict(record) for record in f], records)
+			self.assertEqual(f[7]['score'], 1.5)
+			self.assertFalse('score' in f[8])
+			self.assertEqual(f[8].get('score'), None)
+			self.assertEqual(f[0]['tags'], [])
+			self.assertEqual(f[-1]['id'], 99)
+			self.assertRaises(IndexError, f.__getitem__, 100)
+			self.assertRaises(KeyError, f[0].__getitem__, 'name')
+
+			records = f[10:90:2][5:]
+			self.assertEqual(len(records), 35)
+			self.assertEqual([record['id'] for record in records][:3], [20, 22, 24])
+			self.assertEqual([record['id'] for record in f[::-30]], [99, 69, 39, 9])
+			self.assertEqual(list(f[200:]), [])
+
+	def test_tuple(self):
+		t = typed.tuple(typed.int, typed.string | typed.none)
+		typed.records.dump(t, [(1, 'a'), (2, None)], self.path)
+
+		with typed.records.open(t, self.path) as f:
+			self.assertEqual([tuple(record) for record in f], [(1, 'a'), (2, None)])
+			self.assertEqual(f[1][-1], None)
+			self.assertEqual(f[0][:1], (1, ))
+
+	def test_errors(self):
+		for obj in [{'id': 1}, {'id': 1, 'date': '2013-01-01'}, dict(self.records[0], name='x')]:
+			self.assertRaises(ValueError, typed.records.dump, self.t, [obj], self.path)
+		self.assertRaises(TypeError, typed.records.dump, typed.list(typed.int), [], self.path)
+
+		typed.records.dump(self.t, self.records, self.path)
+		self.assertRaises(ValueError, typed.records.open, typed.dict({'id': typed.int}), self.path)
+
+		with open(self.path, 'wb') as f:
+			f.write('{"id": 1}\n')
+		self.assertRaises(ValueError, typed.records.open, self.t, self.path)
+
+	def test_schema(self):
+		# equal types built in a different order open the same files
+		t1 = typed.dict(dict((field, typed.set(*'abcdefgh')) for field in 'abcdefgh'))
+		t2 = typed.dict(dict((field, typed.set(*'hgfedcba')) for field in 'hgfedcba'))
+		self.assertEqual(t1, t2)
+		typed.records.dump(t1, [dict.fromkeys('abcdefgh', 'a')], self.path)
+		with typed.records.open(t2, self.path) as f:
+			self.assertEqual(f[0]['h'], 'a')
+		self.assertNotEqual(typed.records.schema(typed.set(1)), typed.records.schema(typed.set(True)))
+
+		# the file opened by name is closed if it can't be read
+		opened = []
+		def record_file(type, fileobj):
+			opened.append(fileobj)
+			raise ValueError('not a record file')
+		original, typed.records.RecordFile = typed.records.RecordFile, record_file
+		try:
+			self.assertRaises(ValueError, typed.records.open, t1, self.path)
+		finally:
+			typed.records.RecordFile = original
+		self.assertTrue(opened[0].closed)
+
+
+class TestTypedCache(unittest.TestCase):
+	user = typed.dict({'id': typed.int, 'name': typed.string, 'joined': typed.date.format('%Y-%m-%d').optional})
+
+	schemas = {
+			'user': user,
+			'users': typed.list(user),
+			'value': typed.int | typed.string | typed.list(typed.int) | None,
+			'compiled': typed.dict({'id': typed.int, 'tags': typed.set('a', 'b')}).compile(),
+			'json': typed.json(user, encoder='schema'),
+			'binary': typed.binary(user),
+		}
+
+	def setUp(self):
+		self.code_cache = typed.code_cache
+		typed.code_cache = {}
+
+	def tearDown(self):
+		typed.code_cache = self.code_cache
+
+	def test_round_trip(self):
+		f = StringIO.StringIO()
+		typed.cache.dump(self.schemas, f)
+		f.seek(0)
+		schemas = typed.cache.load(f)
+
+		self.assertEqual(schemas, self.schemas)
+		self.assertTrue(schemas['users'].type is schemas['user'])
+		self.assertTrue(schemas['user'].fields['id'] is typed.int)
+		self.assertTrue(len(typed.code_cache) > 0)
+
+		# code compiled after loading isn't cached
+		size = len(typed.code_cache)
+		for i in xrange(20):
+			typed.dict({'f%d' % i: typed.int}).compile()
+		self.assertEqual(len(typed.code_cache), size)
+		self.assertEqual(typed.code_recorder, None)
+
+		user = {'id': 1, 'name': 'a', 'joined': '2013-10-11'}
+		self.assertEqual(schemas['user'].load_new(user), {'id': 1, 'name': 'a', 'joined': datetime.date(2013, 10, 11)})
+		self.assertEqual(schemas['users'].load_new([user]), [schemas['user'].load_new(user)])
+		self.assertRaises(ValueError, schemas['user'].load, {'id': 'a', 'name': 'a'})
+		self.assertEqual(schemas['value'].load([1, 2]), [1, 2])
+		self.assertRaises(ValueError, schemas['value'].load, 1.5)
+		self.assertTrue(schemas['compiled'].test({'id': 1, 'tags': 'a'}))
+		self.assertFalse(schemas['compiled'].test({'id': 1, 'tags': 'c'}))
+		self.assertEqual(schemas['json'].load(schemas['json'].save({'id': 1, 'name': 'a'})), {'id': 1, 'name': 'a'})
+		self.assertEqual(schemas['binary'].load(self.schemas['binary'].save({'id': 1, 'name': 'a'})), {'id': 1, 'name': 'a'})
+		self.assertEqual(pickle.loads(pickle.dumps(schemas['value'])), schemas['value'])
+
+	def test_digest(self):
+		self.assertEqual(typed.cache.digest(typed.dict({'a': typed.int, 'b': typed.set(1, 2)})), typed.cache.digest(typed.dict({'b': typed.set(2, 1), 'a': typed.int})))
+		self.assertNotEqual(typed.cache.digest(typed.int | typed.string), typed.cache.digest(typed.string | typed.int))
+
+	def test_errors(self):
+		f = StringIO.StringIO()
+		typed.cache.dump(self.schemas, f)
+		data = f.getvalue()
+		self.assertRaises(ValueError, typed.cache.load, StringIO.StringIO('not a cache'))
+		self.assertRaises(ValueError, typed.cache.load, StringIO.StringIO(data[:8] + chr(0) + data[9:]))
+		self.assertRaises(ValueError, typed.cache.load, StringIO.StringIO(data[:40]))
+
+		# profiled and adaptive types are only equal to themselves
+		self.assertRaises(TypeError, typed.cache.digest, typed.profile(typed.int))
+		for t in [typed.profile(typed.int | typed.string), typed.adaptive(typed.int | typed.string), typed.list(typed.adaptive(typed.int))]:
+			f = StringIO.StringIO()
+			self.assertRaises(TypeError, typed.cache.dump, {'a': t}, f)
+			self.assertEqual(f.getvalue(), '')
+
+
+@unittest.skipUnless(HAS_NUMPY, 'numpy is not available')
+class TestTypedNumpy(unittest.TestCase):
+	t = typed.dict({
+			'id': typed.int,
+			'day': typed.date.format('%Y-%m-%d'),
+			'kind': typed.set('a', 'b', 'c'),
+			'score': typed.float.optional,
+			'count': typed.int.default(0),
+			'at': typed.datetime.optional,
+			'pos': typed.tuple(typed.int, typed.bool),
+			'name': typed.string,
+		})
+
+	records = [
+			{'id': 1, 'day': '2013-02-15', 'kind': 'c', 'pos': (1, True), 'name': 'a', 'at': datetime.datetime(2013, 2, 15, 10, 11, 12)},
+			{'id': 2, 'day': '2013-02-16', 'kind': 'a', 'score': 1.5, 'count': 3, 'pos': (2, False), 'name': u'b'},
+		]
+
+	def test_dtype(self):
+		import typed.numpy
+
+		dtype = typed.numpy.dtype(self.t)
+		self.assertEqual(dtype.names, ('at', 'count', 'day', 'id', 'kind', 'name', 'pos', 'score'))
+		self.assertEqual(dtype['day'], numpy.dtype('M8[D]'))
+		self.assertEqual(dtype['at'], numpy.dtype('M8[us]'))
+		self.assertEqual(dtype['kind'], numpy.dtype('u1'))
+		self.assertEqual(dtype['name'], numpy.dtype('O'))
+		self.assertEqual(dtype['pos'], numpy.dtype([('f0', 'i8'), ('f1', '?')]))
+		self.assertEqual(typed.numpy.categories(self.t.fields['kind']), ['a', 'b', 'c'])
+
+		self.assertRaises(TypeError, typed.numpy.dtype, typed.list(typed.int))
+		self.assertRaises(TypeError, typed.numpy.dtype, typed.dict({'a': typed.int.optional}))
+
+	def test_load(self):
+		import typed.numpy
+
+		records = copy.deepcopy(self.records)
+		array = typed.numpy.load(self.t, iter(records), count=2)
+		self.assertEqual(records, self.records)
+		self.assertEqual(array['id'].tolist(), [1, 2])
+		self.assertEqual(array['day'].tolist(), [datetime.date(2013, 2, 15), datetime.date(2013, 2, 16)])
+		self.assertEqual(array['kind'].tolist(), [2, 0])
+		self.assertTrue(numpy.isnan(array['score'][0]))
+		self.assertEqual(array['score'][1], 1.5)
+		self.assertEqual(array['count'].tolist(), [0, 3])
+		self.assertEqual(array['at'][0], numpy.datetime64('2013-02-15T10:11:12'))
+		self.assertTrue(numpy.isnat(array['at'][1]))
+		self.assertEqual(array['pos'].tolist(), [(1, True), (2, False)])
+		self.assertEqual(array['name'].tolist(), ['a', u'b'])
+
+		for records, message in [
+				([self.records[0], dict(self.records[1], kind='d')], 'record 1: object has invalid type'),
+				([dict(self.records[0], id='1')], 'record 0: object has invalid type'),
+				([dict(self.records[0], day='15.02.2013')], "record 0: time data '15.02.2013' does not match format '%Y-%m-%d'"),
+				([dict(self.records[0], pos=(1, ))], 'record 0: not enough items'),
+				([dict(self.records[0], extra=1)], 'record 0: dict has unexpected fields'),
+				([{'id': 1}], "record 0: dict is missing field 'day'"),
+				]:
+			with self.assertRaises(ValueError) as context:
+				typed.numpy.load(self.t, records)
+			self.assertEqual(str(context.exception), message)
+		self.assertRaises(ValueError, typed.numpy.load, self.t, iter(self.records), count=3)
+
+class TestTypedParallel(unittest.TestCase):
+	t = typed.dict({
+			'a': typed.int | typed.none,
+			'b': typed.list(typed.datetime.format('%Y-%m-%d %H:%M:%S')).optional,
+			'c': typed.set(1, 2).default(1),
+			'd': typed.tuple(typed.string, typed.date).format(typed.list).optional,
+			'e': typed.json(typed.any).format({'{}': ''}).optional,
+			'f': typed.tagged('kind', {'x': typed.dict({'y': typed.float})}).optional,
+		}).trimmed
+
+	def test_pickle(self):
+		for protocol in [0, 1, 2]:
+			for t in [typed.int, typed.none, typed.number, typed.any, typed.optional]:
+				self.assertTrue(pickle.loads(pickle.dumps(t, protocol)) is t)
+
+			t = pickle.loads(pickle.dumps(self.t, protocol))
+			self.assertEqual(repr(t), repr(self.t))
+			self.assertTrue(t.fields['a'].types[0] is typed.int)
+			self.assertEqual(t.load({'a': None, 'b': ['2013-10-11 11:02:45'], 'e': '', 'z': 0}),
+					{'a': None, 'b': [datetime.datetime(2013, 10, 11, 11, 2, 45)], 'c': 1, 'e': {}})
+
+			t = pickle.loads(pickle.dumps(self.t.compile(), protocol))
+			self.assertTrue(isinstance(t, typed.CompiledType))
+			self.assertEqual(t.load({'a': 1}), {'a': 1, 'c': 1})
+
+	def test_load_save_many(self):
+		records = [{'a': i, 'b': ['2013-10-11 11:02:45']} for i in range(20)]
+		loaded = [{'a': i, 'b': [datetime.datetime(2013, 10, 11, 11, 2, 45)], 'c': 1} for i in range(20)]
+
+		for workers in [1, 2]:
+			self.assertEqual(list(self.t.load_many(copy.deepcopy(records), workers=workers, chunksize=3)), loaded)
+			self.assertEqual(list(self.t.save_many(copy.deepcopy(loaded), workers=workers, chunksize=3)), records)
+
+		results = self.t.load_many(copy.deepcopy(records), workers=2, chunksize=3, ordered=False)
+		self.assertItemsEqual([record['a'] for record in results], range(20))
+
+		self.assertRaises(ValueError, list, typed.int.load_many([1, 2, 'x', 3], workers=2, chunksize=1))
+
+
+class TestTypedBench(unittest.TestCase):
+	def test_run(self):
+		import typed.bench
+
+		report = typed.bench.run(['int.', 'dict.deep', 'json.stdlib'], duration=0.001, size=10)
+		self.assertEqual(sorted(report['results']), ['dict.deep.load', 'dict.deep.save', 'dict.deep.test', 'int.load', 'int.save', 'int.test', 'json.stdlib.load', 'json.stdlib.save'])
+		for result in report['results'].values():
+			self.assertTrue(result['ops'] > 0)
+			self.assertTrue(0 < result['p50'] <= result['p90'] <= result['p99'] <= result['max'])
+
+		baseline = copy.deepcopy(report)
+		baseline['results']['int.test']['ops'] *= 2
+		baseline['results']['int.load']['ops'] *= 1.05
+		del baseline['results']['int.save']
+		comparison, regressions = typed.bench.compare(report, baseline, tolerance=0.1)
+		self.assertEqual(len(comparison), 7)
+		self.assertEqual(regressions, ['int.test'])
+
+
+class TestTypedProfile(unittest.TestCase):
+	def test_profile(self):
+		t = typed.dict({
+				'id': typed.int,
+				'tags': typed.list(typed.string).default([]),
+				'value': typed.UnionType(typed.int, typed.string),
+				'pair': typed.tuple(typed.int, typed.int).format(typed.list).optional,
+			})
+		p = typed.profile(t)
+		self.assertEqual(repr(p), repr(t))
+		self.assertFalse(isinstance(t.fields['id'], typed.ProfiledType))
+
+		self.assertEqual(p.load({'id': 1, 'value': 'a'}), {'id': 1, 'value': 'a', 'tags': []})
+		self.assertEqual(p.load({'id': 2, 'value': 2, 'tags': ['x', 'y'], 'pair': [1, 2]}), {'id': 2, 'value': 2, 'tags': ['x', 'y'], 'pair': (1, 2)})
+		self.assertRaises(ValueError, p.load, {'id': 3, 'value': 1.5})
+		self.assertFalse(p.test({'id': 1, 'value': 1, 'extra': None}))
+
+		stats = dict(((row['path'], row['method']), row) for row in p.profile.stats())
+		self.assertEqual(sorted(stats), [
+				('', 'load'), ('', 'test'), ('/id', 'load'), ('/id', 'test'), ('/pair', 'load'), ('/pair/0', 'load'), ('/pair/1', 'load'),
+				('/tags', 'load'), ('/tags/*', 'load'), ('/value', 'load'), ('/value', 'test'), ('/value|0', 'load'), ('/value|0', 'test'), ('/value|1', 'load'),
+			])
+		self.assertEqual((stats['', 'load']['calls'], stats['', 'load']['failures']), (3, 1))
+		self.assertEqual((stats['', 'test']['calls'], stats['', 'test']['failures']), (1, 1))
+		self.assertEqual(stats['/tags/*', 'load']['calls'], 2)
+		self.assertEqual((stats['/value', 'load']['calls'], stats['/value', 'load']['failures']), (3, 1))
+		self.assertEqual(stats['/value|0', 'load']['hit_rate'], 1.0 / 3)
+		self.assertEqual(stats['/value|1', 'load']['hit_rate'], 1.0 / 3)
+		self.assertTrue(all(row['time'] >= 0 for row in stats.values()))
+
+		self.assertTrue('/value|1' in p.profile.table())
+		self.assertEqual(len(json.loads(p.profile.json())), len(stats))
+
+		p.profile.reset()
+		self.assertEqual(p.profile.stats(), [])
+
+	def test_pickle(self):
+		p = typed.profile(typed.list(typed.int | typed.string))
+		p.load([1, 'a'])
+		for protocol in [0, pickle.HIGHEST_PROTOCOL]:
+			q = pickle.loads(pickle.dumps(p, protocol))
+			self.assertEqual(repr(q), repr(p))
+			self.assertEqual(q.load([2]), [2])
+			# the copy keeps the counts, and counts into its own profile
+			self.assertEqual(q.profile.totals('/*'), (3, 0))
+			self.assertTrue(q.type.type.profile is q.profile)
+		self.assertEqual(p.profile.totals('/*'), (2, 0))
+		self.assertEqual(list(p.load_many([[1], ['a']], workers=2)), [[1], ['a']])
+
+	def test_adaptive(self):
+		members = [typed.dict({'kind': typed.set(kind), 'value': typed.int}) for kind in 'abc']
+		t = typed.adaptive(typed.UnionType(members), sample=2, interval=10)
+		records = [{'kind': 'c', 'value': 1}] * 8 + [{'kind': 'b', 'value': 1}] * 2
+		for i in xrange(3):
+			self.assertTrue(all(t.test(record) for record in records))
+			self.assertEqual([t.load_new(record) for record in records], records)
+		self.assertRaises(ValueError, t.load, {'kind': 'd', 'value': 1})
+		self.assertEqual([member.fields['kind'] for member in t.current.load_dispatch[dict]], [typed.set('c'), typed.set('b'), typed.set('a')])
+		self.assertEqual(t.current.types[0].order, ('kind', 'value'))
+
+		frozen = t.freeze()
+		self.assertEqual(frozen.order, (2, 1, 0))
+		self.assertEqual(frozen.load({'kind': 'a', 'value': 1}), {'kind': 'a', 'value': 1})
+		self.assertEqual(repr(t), 'typed.adaptive(%r)' % t.type)
+
+		t = typed.adaptive(typed.dict({'a': typed.int, 'b': typed.int, 'c': typed.int}).compile(), sample=1)
+		for i in xrange(5):
+			self.assertFalse(t.test({'a': 1, 'b': 1, 'c': 'x'}))
+		self.assertEqual(t.freeze().type.order[0], 'c')
+
+
 
 
 
@@ -19,7 +19,10 @@
 	assert datetime.datetime(2012, 12, 12, 12, 12, 12) == typed.datetime.format("%Y-%m-%d %H:%M:%S").cast('2012-12-12 12:12:12')
 """
 
-import types, datetime, itertools
+from __future__ import absolute_import
+
+import types, datetime, itertools, multiprocessing, timeit, struct, collections, operator, array, weakref, bisect, math
+from json import decoder as json_decoder, encoder as json_encoder, scanner as json_scanner
 
 try:
 	import ujson as json
@@ -28,6 +31,13 @@ except ImportError:
 	import json
 	__HAS_UJSON__ = False
 
+try:
+	import numpy
+	__HAS_NUMPY__ = True
+except ImportError:
+	numpy = None
+	__HAS_NUMPY__ = False
+
 class O(object):
 	pass
 
@@ -49,10 +59,473 @@ python.json = json
 python.tuple = tuple
 python.types = types
 python.iter = iter
+python.compile = compile
+python.range = range
+python.numpy = numpy
+
+
+# runtime classes for which type unions precompute the members that might accept them
+dispatch_classes = (python.int, python.long, python.bool, python.float, python.types.NoneType, python.str, python.unicode,
+		python.list, python.dict, python.tuple, python.datetime.date, python.datetime.datetime)
+
+def value_family(cls):
+	"""
+	Returns a key shared by all classes whose instances might compare equal
+	to each other, e.g. `1 == 1.0 == True` and `'a' == u'a'`.
+	"""
+	if issubclass(cls, (python.int, python.long, python.float, python.bool)):
+		return python.int
+	elif issubclass(cls, basestring):
+		return basestring
+	elif issubclass(cls, python.datetime.date):
+		return python.datetime.date
+	return cls
+
+
+def values_accept(values, cls):
+	"""
+	Returns True if objects of the class `cls` might be equal to one of
+	`values`.
+	"""
+	family = value_family(cls)
+	for value in values:
+		if python.type(value) not in dispatch_classes or value_family(python.type(value)) is family:
+			return True
+	return False
+
+def json_pointer(path, key):
+	return '%s/%s' % (path, ('%s' % key).replace('~', '~0').replace('/', '~1'))
+
+
+# the building blocks of the standard library JSON decoder, used by schema-driven decoding
+json_whitespace = json_decoder.WHITESPACE.match
+json_scanstring = json_decoder.scanstring
+json_number = json_scanner.NUMBER_RE.match
+json_raw_decode = json_decoder.JSONDecoder().raw_decode
+
+# containers closer than this to the end of the string are decoded in one go, since rejecting them early saves little
+json_nested_size = 4096
+
+json_classes = {
+		'"': python.unicode,
+		'{': python.dict,
+		'[': python.list,
+		't': python.bool,
+		'f': python.bool,
+		'n': python.types.NoneType,
+		'N': python.float,
+		'I': python.float,
+	}
+
+def json_class(s, i):
+	"""
+	Returns the class of the JSON value starting at index `i` of `s`, without
+	decoding it.
+	"""
+	c = s[i:i + 1]
+	if c in json_classes:
+		return json_classes[c]
+	match = json_number(s, i)
+	if match is not None:
+		integer, frac, exp = match.groups()
+		return python.float if frac or exp else python.int
+	if s.startswith('-Infinity', i):
+		return python.float
+	raise ValueError('No JSON object could be decoded: char %d' % i)
+
+# schema-driven encoding writes compact JSON, escaped as with `ensure_ascii`
+json_string = json_encoder.encode_basestring_ascii
+json_encode = json_encoder.JSONEncoder(separators=(',', ':')).encode
+
+def json_float(obj):
+	if obj != obj:
+		return 'NaN'
+	elif obj == json_encoder.INFINITY:
+		return 'Infinity'
+	elif obj == -json_encoder.INFINITY:
+		return '-Infinity'
+	return python.float.__repr__(obj)
+
+def binary_order(values):
+	"""
+	Returns `values` in an order which doesn't depend on the process, used to
+	number set members and dict fields in binary encodings.
+	"""
+	return sorted(values, key=lambda value: (python.type(value).__name__, repr(value)))
+
+binary_bytes = [chr(b) for b in xrange(256)]
+binary_double = struct.Struct('<d')
+
+def binary_uint(n):
+	if n < 128:
+		return binary_bytes[n]
+	parts = []
+	while n >= 128:
+		parts.append(binary_bytes[n & 127 | 128])
+		n >>= 7
+	parts.append(binary_bytes[n])
+	return ''.join(parts)
+
+def binary_int(n):
+	return binary_uint(n << 1 if n >= 0 else ~n << 1 | 1)
+
+def binary_read_uint(s, i, b):
+	"""
+	Reads the rest of a variable-length unsigned integer whose first byte `b`
+	was read from index `i - 1` of the bytearray `s`.
+	"""
+	n = b & 127
+	shift = 7
+	while True:
+		b = s[i]
+		i += 1
+		n |= (b & 127) << shift
+		if b < 128:
+			return n, i
+		shift += 7
+
+def binary_bits(bits, width):
+	return ''.join(binary_bytes[bits >> shift & 255] for shift in xrange(0, 8 * width, 8))
+
+def binary_read_bits(s, i, width):
+	bits = 0
+	for shift in xrange(0, 8 * width, 8):
+		bits |= s[i] << shift
+		i += 1
+	return bits
+
+def binary_datetime(days, microseconds):
+	seconds, microseconds = divmod(microseconds, 1000000)
+	minutes, seconds = divmod(seconds, 60)
+	hours, minutes = divmod(minutes, 60)
+	d = python.datetime.date.fromordinal(days)
+	return python.datetime.datetime(d.year, d.month, d.day, hours, minutes, seconds, microseconds)
+
+binary_tags = {
+		python.types.NoneType: 0,
+		python.bool: 1,
+		python.int: 2,
+		python.long: 2,
+		python.float: 3,
+		python.str: 4,
+		python.unicode: 5,
+		python.list: 6,
+		python.tuple: 7,
+		python.dict: 8,
+	}
+
+def binary_any(obj, p):
+	"""
+	Appends the self-describing binary encoding of a plain python object
+	(built from None, bools, numbers, strings, lists, tuples and dicts) to
+	the list `p`. Used for values whose type doesn't define their encoding.
+	"""
+	tag = binary_tags.get(python.type(obj))
+	if tag is None:
+		raise ValueError('object can not be encoded')
+	p.append(binary_bytes[tag])
+	if tag == 1:
+		p.append(binary_bytes[obj])
+	elif tag == 2:
+		p.append(binary_int(obj))
+	elif tag == 3:
+		p.append(binary_double.pack(obj))
+	elif tag == 4 or tag == 5:
+		if tag == 5:
+			obj = obj.encode('utf-8')
+		p.append(binary_uint(len(obj)))
+		p.append(obj)
+	elif tag == 6 or tag == 7:
+		p.append(binary_uint(len(obj)))
+		for item in obj:
+			binary_any(item, p)
+	elif tag == 8:
+		p.append(binary_uint(len(obj)))
+		for key, value in obj.iteritems():
+			binary_any(key, p)
+			binary_any(value, p)
+
+def binary_load_any(s, i):
+	tag = s[i]
+	i += 1
+	if tag == 0:
+		return None, i
+	elif tag == 1:
+		return (False, True)[s[i]], i + 1
+	elif tag == 3:
+		return binary_double.unpack_from(s, i)[0], i + 8
+
+	n = s[i]
+	i += 1
+	if n >= 128:
+		n, i = binary_read_uint(s, i, n)
+	if tag == 2:
+		return (n >> 1) ^ -(n & 1), i
+	elif n > len(s) - i:
+		raise ValueError('invalid binary data')
+	elif tag == 4:
+		return python.str(s[i:i + n]), i + n
+	elif tag == 5:
+		return s[i:i + n].decode('utf-8'), i + n
+	elif tag == 6 or tag == 7:
+		obj = []
+		for j in xrange(n):
+			item, i = binary_load_any(s, i)
+			obj.append(item)
+		return (obj if tag == 6 else python.tuple(obj)), i
+	elif tag == 8:
+		obj = {}
+		for j in xrange(n):
+			key, i = binary_load_any(s, i)
+			obj[key], i = binary_load_any(s, i)
+		return obj, i
+	raise ValueError('invalid binary data')
+
+def binary_empty(type):
+	"""
+	Returns True if objects of `type` may be encoded in zero bytes.
+	"""
+	while isinstance(type, (OptionalType, CompiledType, DictFormatType, JSONFormatType, ListTupleFormatType)):
+		type = type.type
+	if isinstance(type, SetType):
+		return len(type.values) == 1
+	elif isinstance(type, TupleType):
+		return all(binary_empty(t) for t in type.types)
+	elif isinstance(type, DictType):
+		return all(binary_empty(t) for t in type.fields.itervalues())
+	return type is none
+
+def binary_lines(lines, indent='\t'):
+	return [indent + line for line in lines]
+
+def binary_read_uint_lines(n):
+	return [
+			'%s = s[i]' % n,
+			'i += 1',
+			'if %s >= 128:' % n,
+			'\t%s, i = _binary_read_uint(s, i, %s)' % (n, n),
+		]
+
+column_missing = object()
+
+def test_column_classes(type, column):
+	"""
+	Tests a column of a type whose `test` only depends on the class of the
+	object, checking each distinct class once.
+	"""
+	return all(type._accepts(cls, 'test') for cls in python.set(map(python.type, column)))
+
+def column_array(type, column):
+	"""
+	Converts a loaded column of `type` to a NumPy array, with a numeric dtype
+	for int, float and bool columns without missing values.
+	"""
+	dtype = column_dtypes.get(repr(type))
+	if dtype is not None and None not in column:
+		try:
+			return python.numpy.array(column, dtype=dtype)
+		except OverflowError:
+			pass
+	array = python.numpy.empty(len(column), dtype=object)
+	for i, value in enumerate(column):
+		array[i] = value
+	return array
+
+column_dtypes = {
+		'typed.int': 'int64',
+		'typed.float': 'float64',
+		'typed.bool': 'bool',
+	}
+
+buffer_formats = {
+		python.int: python.frozenset('bBhHiIlLqQ'),
+		python.float: python.frozenset('fd'),
+		python.bool: python.frozenset('?'),
+	}
+
+def buffer_classes():
+	if python.numpy is not None:
+		return (array.array, memoryview, python.numpy.ndarray)
+	return (array.array, memoryview)
+
+def buffer_format(obj):
+	"""
+	Returns the struct format code of the items of a one-dimensional typed
+	buffer: an `array.array`, a `memoryview` or a NumPy array. Returns None
+	for other objects.
+	"""
+	cls = python.type(obj)
+	if cls is array.array:
+		return obj.typecode
+	elif cls is memoryview:
+		if obj.ndim == 1:
+			return obj.format.lstrip('@=<>!')
+	elif python.numpy is not None and isinstance(obj, python.numpy.ndarray):
+		if obj.ndim == 1:
+			return obj.dtype.char
+	return None
+
+def freeze(obj):
+	"""
+	Returns a hashable equivalent of the constructor arguments `obj` of a type.
+	Values are paired with their classes, since values which are equal in
+	Python, like 1, 1.0 and True, are converted differently.
+	"""
+	cls = python.type(obj)
+	if cls is python.dict:
+		return python.frozenset((freeze(key), freeze(value)) for key, value in obj.iteritems())
+	elif cls is python.list or cls is python.tuple:
+		return python.tuple(freeze(item) for item in obj)
+	elif cls is python.set or cls is python.frozenset:
+		return python.frozenset(freeze(item) for item in obj)
+	try:
+		hash(obj)
+	except TypeError:
+		return (cls, repr(obj))
+	return (cls, obj)
+
+def type_slots(cls):
+	"""
+	Returns the names of the attributes of the instances of the type class
+	`cls`, except those which are not part of their state.
+	"""
+	return [name for base in reversed(cls.__mro__) for name in getattr(base, '__slots__', ()) if name not in ('structural_hash', '__weakref__')]
+
+interned = weakref.WeakValueDictionary()
+
+def intern(type):
+	"""
+	Returns the interned type equal to `type`, whose child types are interned
+	as well, so that equal types (and their subtrees) are shared, and objects
+	derived from types can be cached once for each distinct type.
+	"""
+	if not isinstance(type, CompiledType):
+		type = type._map(lambda child, path: intern(child))
+	# the key must not reference the type itself, or it would never be freed
+	return interned.setdefault((python.type(type), freeze(type._args())), type)
+
+def union(types):
+	"""
+	Returns the union of `types` in their order, with nested unions flattened,
+	equal types removed, adjacent sets merged and types which follow
+	`typed.any` (or only test what it accepts) dropped. A union of a single
+	type is that type.
+	"""
+	members = []
+	seen = python.set()
+	for type in itertools.chain.from_iterable(type.types if isinstance(type, UnionType) else (type, ) for type in types):
+		if type in seen:
+			continue
+		seen.add(type)
+		if isinstance(type, (SetType, RangeType)) and members and isinstance(members[-1], (SetType, RangeType)):
+			start = len(members) - 1
+			while start > 0 and isinstance(members[start - 1], (SetType, RangeType)):
+				start -= 1
+			members[start:] = merge_values(members[start:] + [type])
+		elif isinstance(type, AnyType):
+			members = [member for member in members if not member._is_identity()]
+			members.append(type)
+			break
+		else:
+			members.append(type)
+
+	if len(members) == 1:
+		return members[0]
+	return UnionType(*members)
+
+def merge_values(types):
+	"""
+	Merges `types`, adjacent sets and ranges of a union, which only test
+	objects, into a set or into one range per base type, with the values of
+	the sets added to the first range.
+	"""
+	ranges = []
+	values = python.frozenset()
+	for type in types:
+		if isinstance(type, SetType):
+			values |= type.values
+			continue
+		for i, other in enumerate(ranges):
+			if other.type == type.type:
+				ranges[i] = RangeType(other.type, other.intervals + type.intervals, other.values | type.values)
+				break
+		else:
+			ranges.append(type)
+
+	if not ranges:
+		return [SetType(values)]
+	if values:
+		ranges[0] = RangeType(ranges[0].type, ranges[0].intervals, ranges[0].values | values)
+	return ranges
+
+def exclusive(a, b):
+	"""
+	Returns whether no object can be converted by both of the types `a` and
+	`b`, so that the order in which a union tries them doesn't matter. False
+	means that they might overlap.
+	"""
+	classes_a = a._classes()
+	classes_b = b._classes()
+	if classes_a is not None and classes_b is not None:
+		if not python.any(issubclass(x, y) or issubclass(y, x) for x in classes_a for y in classes_b):
+			return True
+	return a._excludes(b) or b._excludes(a)
+
+def reordered(type, order):
+	return type.reorder(order)
+
+def json_load(type, s):
+	"""
+	Decodes the JSON string `s` while loading it with `type`. The structure of
+	the type is followed while decoding, so that a value of the wrong type is
+	rejected as soon as it is reached, without decoding the rest of `s`.
+	"""
+	if not isinstance(s, basestring):
+		raise ValueError('object is not a string')
+
+	obj, i = type._load_json(s, json_whitespace(s, 0).end())
+	i = json_whitespace(s, i).end()
+	if i != len(s):
+		raise ValueError('Extra data: char %d' % i)
+	return obj
+
+
+class ValidationFailure(object):
+	__slots__ = ['path', 'expected', 'value', 'message']
+
+	def __init__(self, path, expected, value, message):
+		self.path = path
+		self.expected = expected
+		self.value = value
+		self.message = message
+
+	def __repr__(self):
+		return '<%s at %s: %s, expected %r>' % (self.__class__.__name__, repr(self.path), self.message, self.expected)
+
+
+class ValidationResult(object):
+	__slots__ = ['failures']
+
+	def __init__(self, failures):
+		self.failures = failures
+
+	def __nonzero__(self):
+		return not self.failures
+
+	valid = property(__nonzero__)
+
+	def __iter__(self):
+		return python.iter(self.failures)
+
+	def __len__(self):
+		return len(self.failures)
+
+	def __repr__(self):
+		return '<%s %r>' % (self.__class__.__name__, self.failures)
 
 
 class Type(object):
-	__slots__ = []
+	__slots__ = ['structural_hash', '__weakref__']
 
 	def __init__(self):
 		raise Exception('abstract')
@@ -60,6 +533,33 @@ class Type(object):
 	def test(self, obj):
 		raise NotImplementedError()
 
+	def validate(self, obj, first=True):
+		failures = []
+		self._validate(obj, '', failures, first)
+		return ValidationResult(failures)
+
+	def _validate(self, obj, path, failures, first):
+		if self.test(obj):
+			return True
+		failures.append(ValidationFailure(path, self, obj, 'object has invalid type'))
+		return False
+
+	def _test_column(self, column):
+		"""
+		Returns True if all objects of the list `column` pass `test`. Types
+		whose test only depends on the class of the object check each class
+		once instead.
+		"""
+		return all(itertools.imap(self.test, column))
+
+	def _accepts_buffer(self, obj, fmt):
+		"""
+		Returns True if all items of the typed buffer `obj`, whose struct
+		format code is `fmt`, are valid objects of this type. Most types only
+		check the format code.
+		"""
+		return False
+
 	def make_optional(self):
 		return OptionalType(self)
 
@@ -68,6 +568,13 @@ class Type(object):
 	def default(self, value):
 		return DefaultType(self, value)
 
+	def range(self, low, high):
+		if not self.test(low) or not self.test(high):
+			raise TypeError('range bounds must be valid objects of %r' % self)
+		if high < low:
+			raise ValueError('range low bound is greater than its high bound')
+		return RangeType(self, [(low, high)])
+
 	def load(self, obj):
 		if not self.test(obj):
 			raise ValueError('object has invalid type')
@@ -80,23 +587,174 @@ class Type(object):
 
 		return obj
 
+	def load_new(self, obj):
+		return self.load(obj)
+
+	def _load_json(self, s, i):
+		"""
+		Decodes the JSON value starting at index `i` of `s` and loads it.
+		Returns the loaded object and the index after the value. Containers
+		are checked before they are decoded.
+		"""
+		c = s[i:i + 1]
+		if (c == '{' or c == '[') and not self._accepts(json_classes[c], 'load'):
+			raise ValueError('object has invalid type')
+		obj, i = json_raw_decode(s, i)
+		return self.load(obj), i
+
+	def _json_nested(self):
+		"""
+		Returns True if `_load_json` decodes objects of this type piece by piece
+		to reject invalid ones early, and False if they are decoded in one go,
+		which is faster for objects without large nested containers.
+		"""
+		return False
+
+	def save_new(self, obj):
+		return self.save(obj)
+
 	def format(self, fmt):
 		if isinstance(fmt, python.dict):
 			return DictFormatType(self, fmt)
 		elif fmt is json:
 			return JSONFormatType(self)
+		elif fmt is binary:
+			return BinaryFormatType(self)
 		raise NotImplementedError()
 
 	def __or__(self, another_type):
 		if another_type is None:
-			return UnionType(self, none)
+			return union((self, none))
 		elif isinstance(another_type, UnionType):
-			return UnionType(self, *another_type.types)
+			return union((self, ) + another_type.types)
 		elif isinstance(another_type, Type):
-			return UnionType(self, another_type)
+			return union((self, another_type))
 		else:
 			return NotImplemented
 
+	def __reduce__(self):
+		if id(self) in singleton_names:
+			return (singleton, (singleton_names[id(self)], ))
+		return (self.__class__, self._args())
+
+	def _args(self):
+		return ()
+
+	def __eq__(self, other):
+		"""
+		Types are equal if they are of the same class and were constructed
+		with equal arguments, so equal types accept and convert the same
+		objects in the same way.
+		"""
+		if self is other:
+			return True
+		if python.type(self) is not python.type(other):
+			return False
+		return freeze(self._args()) == freeze(other._args())
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __hash__(self):
+		try:
+			return self.structural_hash
+		except AttributeError:
+			self.structural_hash = hash((python.type(self).__name__, freeze(self._args())))
+			return self.structural_hash
+
+	def load_many(self, iterable, workers=None, chunksize=100, ordered=True):
+		return map_many(self, 'load', iterable, workers, chunksize, ordered)
+
+	def save_many(self, iterable, workers=None, chunksize=100, ordered=True):
+		return map_many(self, 'save', iterable, workers, chunksize, ordered)
+
+	def compile(self):
+		return Compiler().compile(self)
+
+	def _map(self, f):
+		"""
+		Returns a copy of the type with each child type replaced by
+		`f(child, suffix)`, where `suffix` extends the path of the type to the
+		path of the child. Types without children return themselves.
+		"""
+		return self
+
+	def optimize(self):
+		"""
+		Returns an equivalent type with simplified type unions: nested unions
+		are flattened, duplicate members are removed, adjacent sets are merged
+		and members which can't be reached after `typed.any` are dropped.
+		"""
+		return self._map(lambda type, path: type.optimize())
+
+	def _state(self):
+		"""
+		Returns a dict of the attributes from which `_restore` rebuilds the
+		type without calling its constructor. Functions generated for the type
+		are left out and generated again by `_restore`.
+		"""
+		return python.dict((name, getattr(self, name)) for name in type_slots(python.type(self)) if hasattr(self, name))
+
+	def _restore(self, state):
+		for name, value in state.iteritems():
+			setattr(self, name, value)
+
+	def _accepts(self, cls, method):
+		return True
+
+	def _classes(self):
+		"""
+		Returns the classes of which all objects accepted by the type are
+		instances, or None if they are not known.
+		"""
+		return None
+
+	def _excludes(self, other):
+		"""
+		Returns True if no object can be converted both by the type and by
+		`other`, for reasons other than their classes (see `exclusive`).
+		"""
+		return False
+
+	def _reorder(self, profile, path):
+		return self
+
+	def _is_identity(self):
+		return False
+
+	def _compile_test(self, c, v):
+		return '%s.test(%s)' % (c.const(self), v)
+
+	def _compile_load(self, c, v):
+		if self._is_identity():
+			return '(%s if %s else _invalid())' % (v, self._compile_test(c, v))
+		return '%s.load(%s)' % (c.const(self), v)
+
+	def _compile_save(self, c, v):
+		if self._is_identity():
+			return '(%s if %s else _invalid())' % (v, self._compile_test(c, v))
+		return '%s.save(%s)' % (c.const(self), v)
+
+	def _compile_json(self, c, v):
+		return '_json_encode(%s)' % self._compile_save(c, v)
+
+	def _compile_binary_save(self, c, v):
+		"""
+		Returns the lines of code which append the binary encoding of `v` to
+		the list `p`, whose `append` method is bound to `a`.
+		"""
+		return ['_binary_any(%s, p)' % self._compile_save(c, v)]
+
+	def _compile_binary_load(self, c, v):
+		"""
+		Returns the lines of code which decode an object from index `i` of the
+		bytearray `s` into the variable `v`, and advance `i` past it.
+		"""
+		return [
+				'%s, i = _binary_load_any(s, i)' % v,
+				'%s = %s' % (v, self._compile_load(c, v)),
+			]
+
 
 class AnyType(Type):
 	__slots__ = []
@@ -107,12 +765,41 @@ class AnyType(Type):
 	def test(self, obj):
 		return True
 
+	def __repr__(self):
+		return 'typed.any'
+
 	def load(self, obj):
 		return obj
 
 	def save(self, obj):
 		return obj
 
+	def _is_identity(self):
+		return True
+
+	def _compile_test(self, c, v):
+		return 'True'
+
+	def _compile_load(self, c, v):
+		return v
+
+	def _compile_json(self, c, v):
+		return '_json_encode(%s)' % v
+
+	def _test_column(self, column):
+		return True
+
+	def _accepts_buffer(self, obj, fmt):
+		return fmt is not None
+
+	def _compile_binary_save(self, c, v):
+		return ['_binary_any(%s, p)' % v]
+
+	def _compile_binary_load(self, c, v):
+		return ['%s, i = _binary_load_any(s, i)' % v]
+
+	_compile_save = _compile_load
+
 
 class PrimitiveType(Type):
 	__slots__ = ['type']
@@ -120,9 +807,130 @@ class PrimitiveType(Type):
 	def __init__(self, t):
 		self.type = t
 
+	def _args(self):
+		return (self.type, )
+
 	def test(self, obj):
 		return isinstance(obj, self.type)
 
+	names = {
+			python.float: 'typed.float',
+			python.types.NoneType: 'typed.none',
+			python.str: 'typed.str',
+			python.unicode: 'typed.unicode',
+			basestring: 'typed.string',
+			python.bool: 'typed.bool',
+			python.datetime.datetime: 'typed.datetime',
+		}
+
+	def __repr__(self):
+		if self.type in self.names:
+			return self.names[self.type]
+		return 'typed.PrimitiveType(%s)' % self.type.__name__
+
+	def _accepts(self, cls, method):
+		return issubclass(cls, self.type)
+
+	def _classes(self):
+		return (self.type, )
+
+	def range(self, low, high):
+		# float ranges accept integer bounds, as in typed.float.range(4, 5.2)
+		if self.type is python.float:
+			low, high = [python.float(bound) if int.test(bound) else bound for bound in (low, high)]
+		return super(PrimitiveType, self).range(low, high)
+
+	def _is_identity(self):
+		return True
+
+	def _test_column(self, column):
+		return test_column_classes(self, column)
+
+	def _accepts_buffer(self, obj, fmt):
+		return fmt in buffer_formats.get(self.type, ())
+
+	def _compile_test(self, c, v):
+		if self.type is python.types.NoneType:
+			return '%s is None' % v
+		return 'isinstance(%s, %s)' % (v, c.const(self.type))
+
+	def _compile_json(self, c, v):
+		if self.type is python.bool:
+			return "('true' if %s is True else 'false' if %s is False else _invalid())" % (v, v)
+		elif self.type is python.types.NoneType:
+			return "('null' if %s is None else _invalid())" % v
+		elif self.type is python.float:
+			return '((_float_repr(%s) if -_infinity < %s < _infinity else _json_float(%s)) if %s else _invalid())' % (v, v, v, self._compile_test(c, v))
+		elif self.type in (python.str, python.unicode, basestring):
+			return '(_json_string(%s) if %s else _invalid())' % (v, self._compile_test(c, v))
+		return super(PrimitiveType, self)._compile_json(c, v)
+
+	def _compile_binary_save(self, c, v):
+		if self.type is python.types.NoneType:
+			return ['if %s is not None:' % v, '\t_invalid()']
+		elif self.type is python.bool:
+			return ["a('\\x01' if %s is True else '\\x00' if %s is False else _invalid())" % (v, v)]
+		elif self.type is python.float:
+			return ['a(_pack_double(%s) if %s else _invalid())' % (v, self._compile_test(c, v))]
+		elif self.type is python.datetime.datetime:
+			return [
+					'if not %s:' % self._compile_test(c, v),
+					'\t_invalid()',
+					'if %s.tzinfo is not None:' % v,
+					"\traise ValueError('timezone-aware datetimes are not supported')",
+					'a(_binary_uint(%s.toordinal()))' % v,
+					'a(_binary_uint(((%s.hour * 60 + %s.minute) * 60 + %s.second) * 1000000 + %s.microsecond))' % (v, v, v, v),
+				]
+		elif self.type is python.str:
+			return [
+					'if not isinstance(%s, _str):' % v,
+					'\t_invalid()',
+					'a(_binary_uint(len(%s)))' % v,
+					'a(%s)' % v,
+				]
+		elif self.type is python.unicode:
+			return [
+					'if not isinstance(%s, _unicode):' % v,
+					'\t_invalid()',
+					'b = %s.encode(\'utf-8\')' % v,
+					'a(_binary_uint(len(b)))',
+					'a(b)',
+				]
+		elif self.type is basestring:
+			return [
+					'if isinstance(%s, _str):' % v,
+					'\ta(_binary_uint(len(%s) << 1))' % v,
+					'\ta(%s)' % v,
+					'elif isinstance(%s, _unicode):' % v,
+					'\tb = %s.encode(\'utf-8\')' % v,
+					'\ta(_binary_uint(len(b) << 1 | 1))',
+					'\ta(b)',
+					'else:',
+					'\t_invalid()',
+				]
+		return super(PrimitiveType, self)._compile_binary_save(c, v)
+
+	def _compile_binary_load(self, c, v):
+		if self.type is python.types.NoneType:
+			return ['%s = None' % v]
+		elif self.type is python.bool:
+			return ['%s = _bools[s[i]]' % v, 'i += 1']
+		elif self.type is python.float:
+			return ['%s = _unpack_double(s, i)[0]' % v, 'i += 8']
+		elif self.type is python.datetime.datetime:
+			return binary_read_uint_lines('n') + binary_read_uint_lines('m') + ['%s = _binary_datetime(n, m)' % v]
+		elif self.type is python.str:
+			return binary_read_uint_lines('n') + ['%s = _str(s[i:i + n])' % v, 'i += n']
+		elif self.type is python.unicode:
+			return binary_read_uint_lines('n') + ['%s = s[i:i + n].decode(\'utf-8\')' % v, 'i += n']
+		elif self.type is basestring:
+			return binary_read_uint_lines('n') + [
+					'%s = s[i:i + (n >> 1)]' % v,
+					'%s = %s.decode(\'utf-8\') if n & 1 else _str(%s)' % (v, v, v),
+					'i += n >> 1',
+				]
+		return super(PrimitiveType, self)._compile_binary_load(c, v)
+
 
 class IntType(Type):
 	__slots__ = []
@@ -132,28 +940,154 @@ class IntType(Type):
 	def test(self, obj):
 		return isinstance(obj, (python.int, python.long)) and not isinstance(obj, python.bool)
 
+	def __repr__(self):
+		return 'typed.int'
 
-class UnionType(Type):
-	__slots__ = ['types']
+	def _accepts(self, cls, method):
+		return issubclass(cls, (python.int, python.long)) and not issubclass(cls, python.bool)
+
+	def _classes(self):
+		return (python.int, python.long)
+
+	def _is_identity(self):
+		return True
+
+	def _test_column(self, column):
+		return test_column_classes(self, column)
+
+	def _accepts_buffer(self, obj, fmt):
+		return fmt in buffer_formats[python.int]
+
+	def _compile_test(self, c, v):
+		return '(isinstance(%s, _int_types) and %s.__class__ is not bool)' % (v, v)
+
+	def _compile_json(self, c, v):
+		return '(_str(%s) if %s else _invalid())' % (v, self._compile_test(c, v))
+
+	def _compile_binary_save(self, c, v):
+		return ['a(_binary_int(%s) if %s else _invalid())' % (v, self._compile_test(c, v))]
+
+	def _compile_binary_load(self, c, v):
+		return binary_read_uint_lines('n') + ['%s = (n >> 1) ^ -(n & 1)' % v]
 
-	def __init__(self, *args):
+
+class UnionType(Type):
+	"""
+	A union of types, whose members are tried in the order in which they
+	were declared, or in the preferred `order` of their indices. Members are
+	only tried before earlier members by `load` and `save` if no object can be
+	converted by both, so that the order doesn't change the results.
+	"""
+	__slots__ = ['types', 'order', 'constraints', 'test_dispatch', 'load_dispatch', 'save_dispatch']
+
+	def __init__(self, *args, **kwargs):
 		if len(args) == 1 and not isinstance(args[0], Type):
 			args = args[0]
+		order = kwargs.pop('order', None)
+		if kwargs:
+			raise TypeError('unexpected keyword arguments %s' % ', '.join(sorted(kwargs)))
+		if order is not None and sorted(order) != python.list(xrange(len(args))):
+			raise ValueError('order must contain the index of each member once')
+
 		self.types = args
+		self.order = order
+		self.constraints = None
+		if order is not None:
+			# the indices of the earlier members which each member can't be tried before
+			self.constraints = [python.frozenset(j for j in xrange(i) if not exclusive(args[i], args[j])) for i in xrange(len(args))]
+		self.test_dispatch = self.make_dispatch('test')
+		self.load_dispatch = self.make_dispatch('load')
+		self.save_dispatch = self.make_dispatch('save')
+
+	def _args(self):
+		if self.order is None:
+			return python.tuple(self.types)
+		return (python.tuple(self.types), self.order)
+
+	def __reduce__(self):
+		if self.order is None:
+			return super(UnionType, self).__reduce__()
+		return (reordered, (UnionType(*self.types), self.order))
+
+	def _map(self, f):
+		return UnionType(*[f(type, '|%d' % i) for i, type in enumerate(self.types)], order=self.order)
+
+	def reorder(self, order):
+		"""
+		Returns a copy of the union which prefers to try its members in the
+		order of the member indices in `order`.
+		"""
+		return UnionType(*self.types, order=python.tuple(order))
+
+	def _reorder(self, profile, path):
+		hits = [profile.totals(path + '|%d' % i) for i in xrange(len(self.types))]
+		hits = [calls - failures for calls, failures in hits]
+		if not python.any(hits):
+			return self
+		return self.reorder(sorted(xrange(len(self.types)), key=lambda i: -hits[i]))
+
+	def members(self, method, indices=None):
+		"""
+		Returns the members of the union with the given `indices` (by default,
+		all members) in the order in which `method` tries them.
+		"""
+		if indices is None:
+			indices = xrange(len(self.types))
+		if self.order is not None:
+			pending = sorted(indices, key=self.order.index)
+			if method == 'test':
+				indices = pending
+			else:
+				indices = []
+				while pending:
+					index = next(i for i in pending if not self.constraints[i].intersection(pending))
+					pending.remove(index)
+					indices.append(index)
+		return [self.types[index] for index in indices]
+
+	def make_dispatch(self, method):
+		dispatch = {}
+		for cls in dispatch_classes:
+			dispatch[cls] = python.tuple(self.members(method, [i for i, type in enumerate(self.types) if type._accepts(cls, method)]))
+		return dispatch
 
 	def test(self, obj):
-		return python.any(t.test(obj) for t in self.types)
+		for type in self.test_dispatch.get(python.type(obj), self.types):
+			if type.test(obj):
+				return True
+		return False
+
+	def _validate(self, obj, path, failures, first):
+		types = self.test_dispatch.get(python.type(obj), self.types)
+		for type in types:
+			if type.test(obj):
+				return True
+
+		if len(types) == 1:
+			return types[0]._validate(obj, path, failures, first)
+		failures.append(ValidationFailure(path, self, obj, 'object matches none of the valid types'))
+		return False
+
+	def __repr__(self):
+		if self.order is not None:
+			return '(%s).reorder(%r)' % (' | '.join(repr(type) for type in self.types), python.list(self.order))
+		return '(%s)' % ' | '.join(repr(type) for type in self.types)
 
 	def __or__(self, another_type):
 		if another_type is None:
-			return UnionType(none, *self.types)
+			return union(self.types + (none, ))
 		elif isinstance(another_type, UnionType):
-			return UnionType(python.frozenset(self.types + another_type.types))
+			return union(self.types + another_type.types)
+		elif isinstance(another_type, Type):
+			return union(self.types + (another_type, ))
 		else:
-			return UnionType(another_type, *self.types)
+			return NotImplemented
+
+	def optimize(self):
+		return union([type.optimize() for type in self.types])
 
 	def load(self, obj):
-		for type in self.types:
+		for type in self.load_dispatch.get(python.type(obj), self.types):
 			try:
 				return type.load(obj)
 			except ValueError:
@@ -162,7 +1096,7 @@ class UnionType(Type):
 		raise ValueError('object matches none of the valid types')
 
 	def save(self, obj):
-		for type in self.types:
+		for type in self.save_dispatch.get(python.type(obj), self.types):
 			try:
 				return type.save(obj)
 			except ValueError:
@@ -170,6 +1104,103 @@ class UnionType(Type):
 
 		raise ValueError('object matches none of the valid types')
 
+	def load_new(self, obj):
+		for type in self.load_dispatch.get(python.type(obj), self.types):
+			try:
+				return type.load_new(obj)
+			except ValueError:
+				continue
+
+		raise ValueError('object matches none of the valid types')
+
+	def _load_json(self, s, i):
+		types = self.load_dispatch.get(json_class(s, i), self.types)
+		if len(types) == 1:
+			return types[0]._load_json(s, i)
+		elif not types:
+			raise ValueError('object matches none of the valid types')
+		obj, i = json_raw_decode(s, i)
+		return self.load(obj), i
+
+	def _json_nested(self):
+		return python.any(type._json_nested() for type in self.types)
+
+	def save_new(self, obj):
+		for type in self.save_dispatch.get(python.type(obj), self.types):
+			try:
+				return type.save_new(obj)
+			except ValueError:
+				continue
+
+		raise ValueError('object matches none of the valid types')
+
+	def _accepts(self, cls, method):
+		return python.any(type._accepts(cls, method) for type in self.types)
+
+	def _accepts_buffer(self, obj, fmt):
+		return python.any(type._accepts_buffer(obj, fmt) for type in self.types)
+
+	def _is_identity(self):
+		return all(type._is_identity() for type in self.types)
+
+	def _compile_test(self, c, v):
+		return '(%s)' % ' or '.join(type._compile_test(c, v) for type in self.members('test'))
+
+	def _compile_load(self, c, v):
+		return c.function(self, 'load', v, self._compile_method, 'load')
+
+	def _compile_save(self, c, v):
+		return c.function(self, 'save', v, self._compile_method, 'save')
+
+	def _compile_json(self, c, v):
+		return c.function(self, 'json', v, self._compile_method, 'json')
+
+	def _compile_binary_save(self, c, v):
+		return ['%s(%s, p)' % (c.function(self, 'binary_save', '', self._compile_binary_save_body, params='v, p')[:-2], v)]
+
+	def _compile_binary_save_body(self, c):
+		lines = ['a = p.append', 'n = len(p)']
+		for index, type in enumerate(self.types):
+			if type._is_identity():
+				lines.append('if %s:' % type._compile_test(c, 'v'))
+			else:
+				lines.append('try:')
+			lines.append('\ta(%s)' % c.literal(binary_uint(index)))
+			lines.extend(binary_lines(type._compile_binary_save(c, 'v')))
+			lines.append('\treturn')
+			if not type._is_identity():
+				lines.append('except ValueError:')
+				lines.append('\tdel p[n:]')
+		lines.append("raise ValueError('object matches none of the valid types')")
+		return lines
+
+	def _compile_binary_load(self, c, v):
+		return ['%s, i = %s' % (v, c.function(self, 'binary_load', 's, i', self._compile_binary_load_body, params='s, i'))]
+
+	def _compile_binary_load_body(self, c):
+		lines = binary_read_uint_lines('j')
+		for index, type in enumerate(self.types):
+			lines.append('%s j == %d:' % ('if' if index == 0 else 'elif', index))
+			lines.extend(binary_lines(type._compile_binary_load(c, 'v')))
+		lines.append('else:')
+		lines.append("\traise ValueError('invalid binary data')")
+		lines.append('return v, i')
+		return lines
+
+	def _compile_method(self, c, method):
+		lines = []
+		for type in self.members('load' if method == 'load' else 'save'):
+			if type._is_identity():
+				lines.append('if %s:' % type._compile_test(c, 'v'))
+				lines.append('\treturn %s' % (type._compile_json(c, 'v') if method == 'json' else 'v'))
+			else:
+				lines.append('try:')
+				lines.append('\treturn %s' % getattr(type, '_compile_' + method)(c, 'v'))
+				lines.append('except ValueError:')
+				lines.append('\tpass')
+		lines.append("raise ValueError('object matches none of the valid types')")
+		return lines
+
 
 class SetType(Type):
 	__slots__ = ['values']
@@ -179,12 +1210,54 @@ class SetType(Type):
 			values = python.frozenset(values)
 		self.values = values
 
+	def _args(self):
+		return (self.values, )
+
 	def test(self, obj):
 		try:
 			return obj in self.values
 		except TypeError:		# unhashable types
 			return False
 
+	def __repr__(self):
+		return 'typed.set(%s)' % ', '.join(repr(value) for value in self.values)
+
+	def _excludes(self, other):
+		return isinstance(other, SetType) and not self.values & other.values
+
+	def _accepts(self, cls, method):
+		return values_accept(self.values, cls)
+
+	def _is_identity(self):
+		return True
+
+	def _test_column(self, column):
+		try:
+			return python.frozenset(column) <= self.values
+		except TypeError:		# unhashable types
+			return super(SetType, self)._test_column(column)
+
+	def _compile_test(self, c, v):
+		values = c.const(self.values)
+		return '(%s in %s if %s.__class__ in _hashable_types else _contains(%s, %s))' % (v, values, v, values, v)
+
+	def _compile_binary_save(self, c, v):
+		if len(self.values) == 1:
+			return ['if not %s:' % self._compile_test(c, v), '\t_invalid()']
+		values = binary_order(self.values)
+		ordinals = c.const(python.dict((value, binary_uint(i)) for i, value in enumerate(values)))
+		return [
+				'try:',
+				'\ta(%s[%s])' % (ordinals, v),
+				'except (KeyError, TypeError):',
+				'\t_invalid()',
+			]
+
+	def _compile_binary_load(self, c, v):
+		if len(self.values) == 1:
+			return ['%s = %s' % (v, c.literal(python.iter(self.values).next()))]
+		return binary_read_uint_lines('n') + ['%s = %s[n]' % (v, c.const(binary_order(self.values)))]
+
 	def __or__(self, another_type):
 		if isinstance(another_type, SetType):
 			return SetType(self.values | another_type.values)
@@ -192,6 +1265,109 @@ class SetType(Type):
 			return super(SetType, self).__or__(another_type)
 
 
+class RangeType(Type):
+	"""
+	The objects of `type` which lie within one of the closed `intervals`, a
+	list of (low, high) pairs, and the objects equal to one of `values`. The
+	intervals are sorted and merged, so that objects are looked up by
+	bisection, and values by hashing.
+	"""
+	__slots__ = ['type', 'intervals', 'values', 'lows', 'highs']
+
+	def __init__(self, type, intervals, values=python.frozenset()):
+		merged = []
+		for low, high in sorted(intervals):
+			if merged and (low <= merged[-1][1] or isinstance(type, IntType) and low == merged[-1][1] + 1):
+				if high > merged[-1][1]:
+					merged[-1] = (merged[-1][0], high)
+			else:
+				merged.append((low, high))
+
+		self.type = type
+		self.intervals = python.tuple(merged)
+		self.values = python.frozenset(values)
+		self.lows = [low for low, high in merged]
+		self.highs = [high for low, high in merged]
+
+	def _args(self):
+		return (self.type, self.intervals, self.values)
+
+	def contains(self, obj):
+		"""
+		Returns whether `obj`, an object of the base type, lies within one of
+		the intervals.
+		"""
+		i = bisect.bisect_right(self.lows, obj) - 1
+		return i >= 0 and obj <= self.highs[i]
+
+	def test(self, obj):
+		if self.type.test(obj) and self.contains(obj):
+			return True
+		try:
+			return obj in self.values
+		except TypeError:		# unhashable types
+			return False
+
+	def __repr__(self):
+		if range_base(*self.intervals[0]) == self.type:
+			parts = ['typed.range(%r, %r)' % interval for interval in self.intervals]
+		else:
+			parts = ['%r.range(%r, %r)' % ((self.type, ) + interval) for interval in self.intervals]
+		if self.values:
+			parts.append(repr(SetType(self.values)))
+		if len(parts) == 1:
+			return parts[0]
+		return '(%s)' % ' | '.join(parts)
+
+	def _accepts(self, cls, method):
+		return self.type._accepts(cls, method) or values_accept(self.values, cls)
+
+	def _classes(self):
+		if self.values:
+			return None
+		return self.type._classes()
+
+	def _accepts_buffer(self, obj, fmt):
+		if not self.type._accepts_buffer(obj, fmt):
+			return False
+		if python.numpy is not None and isinstance(obj, python.numpy.ndarray):
+			if not len(obj):
+				return True
+			# one pass for the bounds, and a vectorized lookup if they are not
+			# within the same interval
+			if self.within(obj.min(), obj.max()):
+				return True
+			lows = python.numpy.array(self.lows)
+			indices = python.numpy.maximum(python.numpy.searchsorted(lows, obj, 'right') - 1, 0)
+			with python.numpy.errstate(invalid='ignore'):		# NaN is in no interval
+				inside = (obj >= lows[indices]) & (obj <= python.numpy.array(self.highs)[indices])
+			return all(item in self.values for item in obj[~inside].tolist())
+
+		items = struct.unpack('%d%s' % (len(obj), fmt), obj.tobytes()) if isinstance(obj, memoryview) else obj
+		if not len(items):
+			return True
+		# min and max skip NaN, which no interval contains
+		if self.within(min(items), max(items)) and (fmt not in buffer_formats[python.float] or not python.any(itertools.imap(math.isnan, items))):
+			return True
+		return all(itertools.imap(self.test, items))
+
+	def within(self, low, high):
+		"""
+		Returns whether `low` and `high` lie within the same interval.
+		"""
+		i = bisect.bisect_right(self.lows, low) - 1
+		return i >= 0 and high <= self.highs[i]
+
+	def _is_identity(self):
+		return True
+
+	def _compile_test(self, c, v):
+		test = '(%s and %s(%s))' % (self.type._compile_test(c, v), c.const(self.contains), v)
+		if self.values:
+			test = '(%s or %s)' % (test, SetType(self.values)._compile_test(c, v))
+		return test
+
+
 class DateType(Type):
 	__slots__ = []
 
@@ -201,23 +1377,171 @@ class DateType(Type):
 	def test(self, obj):
 		return isinstance(obj, python.datetime.date) and not isinstance(obj, python.datetime.datetime)
 
+	def __repr__(self):
+		return 'typed.date'
+
+	def _accepts(self, cls, method):
+		return issubclass(cls, python.datetime.date) and not issubclass(cls, python.datetime.datetime)
+
+	def _classes(self):
+		return (python.datetime.date, )
+
 	def format(self, fmt):
 		if isinstance(fmt, basestring):
 			return DateFormatType(fmt)
 		else:
 			return super(DateType, self).format(fmt)
 
+	def _is_identity(self):
+		return True
+
+	def _test_column(self, column):
+		return test_column_classes(self, column)
+
+	def _compile_test(self, c, v):
+		return '(isinstance(%s, _date) and not isinstance(%s, _datetime))' % (v, v)
+
+	def _compile_binary_save(self, c, v):
+		return ['a(_binary_uint(%s.toordinal()) if %s else _invalid())' % (v, self._compile_test(c, v))]
+
+	def _compile_binary_load(self, c, v):
+		return binary_read_uint_lines('n') + ['%s = _date.fromordinal(n)' % v]
+
+
+date_directives = {
+		'Y': ('year', 4),
+		'm': ('month', 2),
+		'd': ('day', 2),
+		'H': ('hour', 2),
+		'M': ('minute', 2),
+		'S': ('second', 2),
+		'f': ('microsecond', 6),
+	}
+
+date_defaults = [('year', '1900'), ('month', '1'), ('day', '1'), ('hour', '0'), ('minute', '0'), ('second', '0'), ('microsecond', '0')]
+
+# code objects loaded from schema caches, keyed by their source; code which
+# is compiled afterwards isn't added, so the cache doesn't grow with types
+# built at runtime
+code_cache = {}
+# while a dict, collects the code of the types restored by `typed.cache.dump`
+code_recorder = None
+
+def compile_source(source, filename):
+	code = code_cache.get(source)
+	if code is None:
+		code = python.compile(source, filename, 'exec')
+	if code_recorder is not None:
+		code_recorder[source] = code
+	return code
+
+def compile_date_format(fmt, has_time):
+	"""
+	Compiles a date format consisting of fixed-width numeric directives into
+	a parser, which slices strings of the right length at fixed offsets and
+	returns a datetime (or None for strings it can't handle, which should be
+	parsed by strptime), and a formatter, which returns None for years that
+	strftime doesn't support. Returns (None, None) for other formats.
+	"""
+	if not isinstance(fmt, python.str):
+		return None, None
+
+	fields = {}
+	literals = []
+	pattern = []
+	values = []
+	pos = 0
+	i = 0
+	while i < len(fmt):
+		if fmt[i] != '%':
+			literals.append((pos, fmt[i]))
+			pattern.append(fmt[i].replace('%', '%%'))
+			pos += 1
+			i += 1
+			continue
+
+		directive = fmt[i + 1:i + 2]
+		i += 2
+		if directive == '%':
+			literals.append((pos, '%'))
+			pattern.append('%%')
+			pos += 1
+		elif directive in date_directives and date_directives[directive][0] not in fields:
+			name, width = date_directives[directive]
+			fields[name] = (pos, pos + width)
+			pos += width
+			if has_time or name in ('year', 'month', 'day'):
+				pattern.append('%%0%dd' % width)
+				values.append('o.%s' % name)
+			else:
+				pattern.append('0' * width)
+		else:
+			return None, None
+
+	checks = ['len(s) == %d' % pos] + ['s[%d] == %r' % literal for literal in literals]
+	slices = ['s[%d:%d]' % fields[name] for name in sorted(fields, key=fields.get)]
+	args = ['int(s[%d:%d])' % fields[name] if name in fields else default for name, default in date_defaults]
+	source = '\n'.join([
+			'def parse(s):',
+			'\tif (s.__class__ is str or s.__class__ is unicode) and %s:' % ' and '.join(checks),
+			'\t\tdigits = %s' % (' + '.join(slices) or "'0'"),
+			"\t\tif digits.isdigit() and max(digits) <= '9':",
+			'\t\t\treturn datetime(%s)' % ', '.join(args),
+			'',
+			'def format(o):',
+			'\tif o.year >= 1900:',
+			'\t\treturn %r %% (%s)' % (''.join(pattern), ''.join(value + ', ' for value in values)),
+			'',
+		])
+
+	namespace = {'datetime': python.datetime.datetime, 'str': python.str, 'unicode': python.unicode, 'int': python.int, 'len': len, 'max': max}
+	exec compile_source(source, '<typed %s>' % fmt) in namespace
+	return namespace['parse'], namespace['format']
+
 
 class DateFormatType(Type):
-	__slots__ = ['fmt']
+	__slots__ = ['fmt', 'parse', 'format_date']
 
 	def __init__(self, fmt):
 		self.fmt = fmt
+		self.parse, self.format_date = compile_date_format(fmt, False)
+
+	def _args(self):
+		return (self.fmt, )
+
+	def _state(self):
+		return {'fmt': self.fmt}
+
+	def _restore(self, state):
+		self.fmt = state['fmt']
+		self.parse, self.format_date = compile_date_format(self.fmt, False)
 
 	def test(self, obj):
 		return date.test(obj)
 
+	def __repr__(self):
+		return 'typed.date.format(%s)' % repr(self.fmt)
+
+	def _compile_test(self, c, v):
+		return date._compile_test(c, v)
+
+	def _compile_binary_save(self, c, v):
+		return date._compile_binary_save(c, v)
+
+	def _compile_binary_load(self, c, v):
+		return date._compile_binary_load(c, v)
+
+	def _accepts(self, cls, method):
+		if method == 'load':
+			return issubclass(cls, basestring)
+		return date._accepts(cls, method)
+
 	def load(self, obj):
+		if self.parse is not None:
+			dt = self.parse(obj)
+			if dt is not None:
+				return dt.date()
+
 		try:
 			return python.datetime.datetime.strptime(obj, self.fmt).date()
 		except TypeError, e:
@@ -227,6 +1551,11 @@ class DateFormatType(Type):
 		if not date.test(obj):
 			raise ValueError('object is not a date')
 
+		if self.format_date is not None:
+			s = self.format_date(obj)
+			if s is not None:
+				return s
+
 		return obj.strftime(self.fmt)
 
 
@@ -234,6 +1563,9 @@ class DatetimeType(PrimitiveType):
 	def __init__(self):
 		super(DatetimeType, self).__init__(python.datetime.datetime)
 
+	def _args(self):
+		return ()
+
 	def format(self, fmt):
 		if isinstance(fmt, basestring):
 			return DatetimeFormatType(fmt)
@@ -242,15 +1574,48 @@ class DatetimeType(PrimitiveType):
 
 
 class DatetimeFormatType(Type):
-	__slots__ = ['fmt']
+	__slots__ = ['fmt', 'parse', 'format_date']
 
 	def __init__(self, fmt):
 		self.fmt = fmt
+		self.parse, self.format_date = compile_date_format(fmt, True)
+
+	def _args(self):
+		return (self.fmt, )
+
+	def _state(self):
+		return {'fmt': self.fmt}
+
+	def _restore(self, state):
+		self.fmt = state['fmt']
+		self.parse, self.format_date = compile_date_format(self.fmt, True)
 
 	def test(self, obj):
 		return isinstance(obj, python.datetime.datetime)
 
+	def __repr__(self):
+		return 'typed.datetime.format(%s)' % repr(self.fmt)
+
+	def _compile_test(self, c, v):
+		return 'isinstance(%s, _datetime)' % v
+
+	def _compile_binary_save(self, c, v):
+		return datetime._compile_binary_save(c, v)
+
+	def _compile_binary_load(self, c, v):
+		return datetime._compile_binary_load(c, v)
+
+	def _accepts(self, cls, method):
+		if method == 'load':
+			return issubclass(cls, basestring)
+		return issubclass(cls, python.datetime.datetime)
+
 	def load(self, obj):
+		if self.parse is not None:
+			dt = self.parse(obj)
+			if dt is not None:
+				return dt
+
 		try:
 			return python.datetime.datetime.strptime(obj, self.fmt)
 		except TypeError, e:
@@ -260,52 +1625,362 @@ class DatetimeFormatType(Type):
 		if not isinstance(obj, python.datetime.datetime):
 			raise ValueError('object is not a datetime')
 
+		if self.format_date is not None:
+			s = self.format_date(obj)
+			if s is not None:
+				return s
+
 		return obj.strftime(self.fmt)
 
 
 class ListType(Type):
-	__slots__ = ['type']
+	__slots__ = ['type', 'buffers', 'identity']
 
-	def __init__(self, type):
+	def __init__(self, type, buffers=False):
 		self.type = type
+		self.buffers = buffers
+		self.identity = type._is_identity()
+
+	def _args(self):
+		return (self.type, self.buffers)
+
+	def _map(self, f):
+		return ListType(f(self.type, '/*'), self.buffers)
+
+	def accepts_buffer(self, obj):
+		"""
+		Returns True if `obj` is a typed buffer (an `array.array`, `memoryview`
+		or one-dimensional NumPy array) which is accepted in place of a list,
+		because the type of its items is compatible with the type of the list.
+		"""
+		return self.buffers and self.type._accepts_buffer(obj, buffer_format(obj))
 
 	def test(self, obj):
 		if not isinstance(obj, python.list):
-			return False
+			return self.accepts_buffer(obj)
 
 		t = self.type
 		return all(t.test(el) for el in obj)
 
+	def _validate(self, obj, path, failures, first):
+		if not isinstance(obj, python.list):
+			if self.accepts_buffer(obj):
+				return True
+			failures.append(ValidationFailure(path, self, obj, 'object is not a list'))
+			return False
+
+		valid = True
+		t = self.type
+		for i, item in enumerate(obj):
+			if not t._validate(item, json_pointer(path, i), failures, first):
+				if first:
+					return False
+				valid = False
+		return valid
+
+	def __repr__(self):
+		if self.buffers:
+			return 'typed.list(%r, buffers=True)' % self.type
+		return 'typed.list(%r)' % self.type
+
 	def load(self, obj):
 		if not isinstance(obj, python.list):
+			if self.accepts_buffer(obj):
+				return obj
 			raise ValueError('object is not a list')
 
 		t = self.type
-		for i in range(len(obj)):
+		if self.identity and all(itertools.imap(t.test, obj)):
+			return obj
+		for i in xrange(len(obj)):
 			obj[i] = t.load(obj[i])
 
 		return obj
 
 	def save(self, obj):
 		if not isinstance(obj, python.list):
+			if self.accepts_buffer(obj):
+				return obj
 			raise ValueError('object is not a list')
 
 		t = self.type
-		for i in range(len(obj)):
+		if self.identity and all(itertools.imap(t.test, obj)):
+			return obj
+		for i in xrange(len(obj)):
 			obj[i] = t.save(obj[i])
 
 		return obj
 
+	def load_new(self, obj):
+		return self.convert_new(obj, self.type.load_new)
 
-class DictType(Type):
-	__slots__ = ['fields', 'trim']
+	def save_new(self, obj):
+		return self.convert_new(obj, self.type.save_new)
+
+	def convert_new(self, obj, convert):
+		if not isinstance(obj, python.list):
+			if self.accepts_buffer(obj):
+				return obj
+			raise ValueError('object is not a list')
+
+		if self.identity and all(itertools.imap(self.type.test, obj)):
+			return obj
+		new_obj = obj
+		for i, item in enumerate(obj):
+			value = convert(item)
+			if new_obj is obj:
+				if value is item:
+					continue
+				new_obj = obj[:i]
+			new_obj.append(value)
+
+		return new_obj
+
+	def _load_json(self, s, i):
+		if s[i:i + 1] != '[':
+			raise ValueError('object is not a list')
+		if not self.type._json_nested() or len(s) - i < json_nested_size:
+			obj, i = json_raw_decode(s, i)
+			return self.load(obj), i
+
+		obj = []
+		i = json_whitespace(s, i + 1).end()
+		if s[i:i + 1] == ']':
+			return obj, i + 1
+
+		load = self.type._load_json
+		while True:
+			value, i = load(s, i)
+			obj.append(value)
+			i = json_whitespace(s, i).end()
+			c = s[i:i + 1]
+			if c == ']':
+				return obj, i + 1
+			elif c != ',':
+				raise ValueError('Expecting , delimiter: char %d' % i)
+			i = json_whitespace(s, i + 1).end()
+
+	def _json_nested(self):
+		return self.type._json_nested()
+
+	def _accepts(self, cls, method):
+		if self.buffers and issubclass(cls, buffer_classes()):
+			return True
+		return issubclass(cls, python.list)
+
+	def _classes(self):
+		if self.buffers:
+			return (python.list, ) + buffer_classes()
+		return (python.list, )
+
+	def _is_identity(self):
+		return self.identity
+
+	def load_columns(self, obj, arrays=False):
+		"""
+		Loads a list of dicts column by column, see `DictType.load_columns`.
+		"""
+		if not isinstance(self.type, DictType):
+			raise TypeError('load_columns() requires a list of typed.dict')
+		return self.type.load_columns(obj, arrays)
+
+	def _compile_test(self, c, v):
+		return c.function(self, 'test', v, self._compile_test_body)
+
+	def _compile_list_check(self, c, lines):
+		"""
+		Returns the lines of code which check that `v` is a list, running
+		`lines` instead of failing for accepted buffers.
+		"""
+		check = ['if not isinstance(v, list):']
+		if self.buffers:
+			check.append('\tif %s(v):' % c.const(self.accepts_buffer))
+			check.extend('\t\t' + line for line in lines)
+		return check
+
+	def _compile_test_body(self, c):
+		return self._compile_list_check(c, ['return True']) + [
+				'\treturn False',
+				'for x in v:',
+				'\tif not %s:' % self.type._compile_test(c, 'x'),
+				'\t\treturn False',
+				'return True',
+			]
+
+	def _compile_load(self, c, v):
+		return c.function(self, 'load', v, self._compile_method, 'load')
+
+	def _compile_save(self, c, v):
+		return c.function(self, 'save', v, self._compile_method, 'save')
+
+	def _compile_method(self, c, method):
+		lines = self._compile_list_check(c, ['return v']) + [
+				"\traise ValueError('object is not a list')",
+			]
+		if self.type._is_identity():
+			lines.append('for x in v:')
+			lines.append('\tif not %s:' % self.type._compile_test(c, 'x'))
+			lines.append('\t\t_invalid()')
+		else:
+			lines.append('for i in xrange(len(v)):')
+			lines.append('\tx = v[i]')
+			lines.append('\tv[i] = %s' % getattr(self.type, '_compile_' + method)(c, 'x'))
+		lines.append('return v')
+		return lines
+
+	def _compile_json(self, c, v):
+		return c.function(self, 'json', v, self._compile_json_body)
+
+	def _compile_json_body(self, c):
+		lines = self._compile_list_check(c, ['return _json_encode(v.tolist())']) + [
+				"\traise ValueError('object is not a list')",
+			]
+		if self.type._is_identity():
+			# checking all items first and encoding the list in one go is faster
+			lines.append('for x in v:')
+			lines.append('\tif not %s:' % self.type._compile_test(c, 'x'))
+			lines.append('\t\t_invalid()')
+			lines.append('return _json_encode(v)')
+		else:
+			lines.append("return '[' + ','.join([%s for x in v]) + ']'" % self.type._compile_json(c, 'x'))
+		return lines
+
+	def _compile_binary_save(self, c, v):
+		return ['%s(%s, p)' % (c.function(self, 'binary_save', '', self._compile_binary_save_body, params='v, p')[:-2], v)]
+
+	def _compile_binary_save_body(self, c):
+		# buffers are encoded as the lists of their items
+		encode = c.function(self, 'binary_save', 'v.tolist(), p', self._compile_binary_save_body, params='v, p')
+		return self._compile_list_check(c, ['return ' + encode]) + [
+				"\traise ValueError('object is not a list')",
+				'a = p.append',
+				'a(_binary_uint(len(v)))',
+				'for x in v:',
+			] + binary_lines(self.type._compile_binary_save(c, 'x'))
+
+	def _compile_binary_load(self, c, v):
+		return ['%s, i = %s' % (v, c.function(self, 'binary_load', 's, i', self._compile_binary_load_body, params='s, i'))]
+
+	def _compile_binary_load_body(self, c):
+		lines = binary_read_uint_lines('k')
+		if not binary_empty(self.type):
+			# every item takes at least one byte, so corrupted counts fail early
+			lines.append('if k > len(s) - i:')
+			lines.append("\traise ValueError('invalid binary data')")
+		return lines + [
+				'v = []',
+				'for k in xrange(k):',
+			] + binary_lines(self.type._compile_binary_load(c, 'x')) + [
+				'\tv.append(x)',
+				'return v, i',
+			]
+
+
+class IterType(Type):
+	"""
+	An iterable of items of `type`. `load` and `save` don't consume the
+	iterable, they return an iterator which converts each item as it is
+	consumed, so that an invalid item raises a ValueError with its index
+	only when it is reached. `test` and `validate` only check that the object
+	is iterable.
+	"""
+
+	__slots__ = ['type']
+
+	def __init__(self, type):
+		self.type = type
+
+	def _args(self):
+		return (self.type, )
+
+	def _map(self, f):
+		return IterType(f(self.type, '/*'))
+
+	def test(self, obj):
+		return isinstance(obj, collections.Iterable) and not isinstance(obj, (basestring, collections.Mapping))
+
+	def _validate(self, obj, path, failures, first):
+		if self.test(obj):
+			return True
+		failures.append(ValidationFailure(path, self, obj, 'object is not iterable'))
+		return False
+
+	def __repr__(self):
+		return 'typed.iter(%r)' % self.type
+
+	def load(self, obj):
+		return self.convert(obj, self.type.load)
+
+	def save(self, obj):
+		return self.convert(obj, self.type.save)
+
+	def load_new(self, obj):
+		return self.convert(obj, self.type.load_new)
+
+	def save_new(self, obj):
+		return self.convert(obj, self.type.save_new)
 
-	def __init__(self, fields_dict, trim=False):
+	def convert(self, obj, convert):
+		if not self.test(obj):
+			raise ValueError('object is not iterable')
+		return self.convert_items(python.iter(obj), convert)
+
+	def convert_items(self, iterator, convert):
+		for i, item in enumerate(iterator):
+			try:
+				value = convert(item)
+			except ValueError, e:
+				raise ValueError('item %d: %s' % (i, e))
+			yield value
+
+	def _accepts(self, cls, method):
+		return issubclass(cls, collections.Iterable) and not issubclass(cls, (basestring, collections.Mapping))
+
+	# the encoders consume the iterator
+
+	def _compile_json(self, c, v):
+		return '_json_encode(list(%s))' % self._compile_save(c, v)
+
+	def _compile_binary_save(self, c, v):
+		return ['_binary_any(list(%s), p)' % self._compile_save(c, v)]
+
+
+class DictType(Type):
+	"""
+	A dict with the types of its fields in `fields`, which are checked in
+	the order of the field names in `order`, or in the order of `fields`.
+	"""
+	__slots__ = ['fields', 'trim', 'order', 'ordered_fields', 'nested']
+
+	def __init__(self, fields_dict, trim=False, order=None):
+		if order is not None and (len(order) != len(fields_dict) or python.set(order) != python.set(fields_dict)):
+			raise ValueError('order must contain each field once')
 		self.fields = fields_dict
 		self.trim = trim
+		self.order = order
+		if order is None:
+			self.ordered_fields = fields_dict.items()
+		else:
+			self.ordered_fields = [(field, fields_dict[field]) for field in order]
+		self.nested = python.any(type._accepts(python.dict, 'load') or type._accepts(python.list, 'load') for type in fields_dict.itervalues())
+
+	def _args(self):
+		if self.order is None:
+			return (self.fields, self.trim)
+		return (self.fields, self.trim, self.order)
+
+	def _map(self, f):
+		return DictType(python.dict((field, f(type, json_pointer('', field))) for field, type in self.fields.iteritems()), self.trim, self.order)
 
 	def make_trimmed(self):
-		return DictType(self.fields, trim=True)
+		return DictType(self.fields, True, self.order)
+
+	def reorder(self, order):
+		"""
+		Returns a copy of the dict type which checks its fields in the order
+		of the field names in `order`.
+		"""
+		return DictType(self.fields, self.trim, python.tuple(order))
 
 	trimmed = property(make_trimmed)
 
@@ -314,7 +1989,7 @@ class DictType(Type):
 			return False
 
 		num = 0
-		for field, type in self.fields.iteritems():
+		for field, type in self.ordered_fields:
 			if field in obj:
 				value = obj[field]
 			else:
@@ -331,12 +2006,46 @@ class DictType(Type):
 
 		return True
 
+	def _validate(self, obj, path, failures, first):
+		if not isinstance(obj, python.dict):
+			failures.append(ValidationFailure(path, self, obj, 'object is not a dict'))
+			return False
+
+		valid = True
+		num = 0
+		for field, type in self.ordered_fields:
+			if field in obj:
+				num += 1
+				if type._validate(obj[field], json_pointer(path, field), failures, first):
+					continue
+			elif isinstance(type, OptionalType):
+				continue
+			else:
+				failures.append(ValidationFailure(json_pointer(path, field), type, None, 'dict is missing field'))
+			if first:
+				return False
+			valid = False
+
+		if not self.trim and len(obj) > num:
+			for field, value in obj.iteritems():
+				if not field in self.fields:
+					failures.append(ValidationFailure(json_pointer(path, field), None, value, 'dict has unexpected field'))
+					if first:
+						return False
+					valid = False
+		return valid
+
+	def __repr__(self):
+		fields = ', '.join('%r: %r' % item for item in self.fields.iteritems())
+		order = '.reorder(%r)' % python.list(self.order) if self.order is not None else ''
+		return 'typed.dict({%s})%s%s' % (fields, '.trimmed' if self.trim else '', order)
+
 	def load(self, obj):
 		if not isinstance(obj, python.dict):
 			raise ValueError('object is not a dict')
 
 		num = 0
-		for field, type in self.fields.iteritems():
+		for field, type in self.ordered_fields:
 			if field in obj:
 				value = obj[field]
 			else:
@@ -366,7 +2075,7 @@ class DictType(Type):
 			raise ValueError('object is not a dict')
 
 		num = 0
-		for field, type in self.fields.iteritems():
+		for field, type in self.ordered_fields:
 			if field in obj:
 				value = obj[field]
 			else:
@@ -392,24 +2101,620 @@ class DictType(Type):
 
 		return obj
 
+	def load_new(self, obj):
+		if not isinstance(obj, python.dict):
+			raise ValueError('object is not a dict')
 
-class OptionalType(Type):
-	__slots__ = ['type']
-
-	def __init__(self, type):
-		self.type = type
+		new_obj = obj
+		num = 0
+		for field, type in self.ordered_fields:
+			if field in obj:
+				value = obj[field]
+			else:
+				if isinstance(type, DefaultType):
+					if new_obj is obj:
+						new_obj = python.dict(obj)
+					new_obj[field] = type.default_value
+					continue
+				if isinstance(type, OptionalType):
+					continue
+				raise ValueError('dict is missing field %s' % repr(field))
 
-	def test(self, obj):
-		return self.type.test(obj)
+			new_value = type.load_new(value)
+			if new_value is not value:
+				if new_obj is obj:
+					new_obj = python.dict(obj)
+				new_obj[field] = new_value
+			num += 1
 
-	def load(self, obj):
-		return self.type.load(obj)
+		if len(obj) > num:
+			if self.trim:
+				new_obj = self.trim_new(obj, new_obj)
+			else:
+				raise ValueError('dict has unexpected fields')
 
-	def save(self, obj):
-		return self.type.save(obj)
+		return new_obj
 
-	def format(self, fmt):
-		return self.type.format(fmt).optional
+	def load_lazy(self, obj):
+		"""
+		Checks that `obj` has all required fields and no unexpected ones, and
+		returns a read-only mapping which loads each field the first time it
+		is accessed, without modifying `obj`. Fields which fail to load raise
+		ValueError on access.
+		"""
+		if not isinstance(obj, python.dict):
+			raise ValueError('object is not a dict')
+
+		num = 0
+		for field, type in self.fields.iteritems():
+			if field in obj:
+				num += 1
+			elif not isinstance(type, OptionalType):
+				raise ValueError('dict is missing field %s' % repr(field))
+
+		if len(obj) > num and not self.trim:
+			raise ValueError('dict has unexpected fields')
+
+		return LazyDict(self, obj)
+
+	def load_columns(self, records, arrays=False):
+		"""
+		Loads a list of dicts of this type field by field instead of record by
+		record, checking the values of each field as a column. Columns of
+		types whose `load` doesn't convert anything are only tested, which for
+		primitive and set types takes a few passes in C. Returns the list of
+		records, loaded in place like `load` does, or with `arrays=True`, a dict
+		of NumPy arrays keyed by field. Missing optional fields are None in
+		the arrays.
+		"""
+		if arrays and not __HAS_NUMPY__:
+			raise NotImplementedError('arrays are not supported since the `numpy` library is not available for import')
+		if not isinstance(records, python.list):
+			raise ValueError('object is not a list')
+		for cls in python.set(map(python.type, records)):
+			if not issubclass(cls, python.dict):
+				raise ValueError('record %d: object is not a dict' % map(python.type, records).index(cls))
+
+		fields = sorted(self.fields.iteritems())
+		columns = {}
+		present = {}
+		counts = [0] * len(records)
+		for field, type in fields:
+			if isinstance(type, OptionalType):
+				column = [record.get(field, column_missing) for record in records]
+				flags = present[field] = [value is not column_missing for value in column]
+				counts = map(operator.add, counts, flags)
+			else:
+				try:
+					column = [record[field] for record in records]
+				except KeyError:
+					index = [field in record for record in records].index(False)
+					raise ValueError('record %d: dict is missing field %s' % (index, repr(field)))
+				counts = [count + 1 for count in counts]
+			columns[field] = column
+
+		extra = map(operator.gt, map(len, records), counts)
+		if not self.trim and True in extra:
+			raise ValueError('record %d: dict has unexpected fields' % extra.index(True))
+
+		for field, type in fields:
+			column = columns[field]
+			flags = present.get(field)
+			values = column if flags is None else python.list(itertools.compress(column, flags))
+			if type._is_identity():
+				if type._test_column(values):
+					continue
+				for index, value in enumerate(column):
+					if value is not column_missing and not type.test(value):
+						try:
+							type.load(value)
+						except ValueError, e:
+							raise ValueError('record %d: %s' % (index, e))
+				continue
+
+			# values are converted in place, so the failing one is located
+			# while loading instead of loading the column again
+			loaded = []
+			try:
+				for value in values:
+					loaded.append(type.load(value))
+			except ValueError, e:
+				index = len(loaded)
+				if flags is not None:
+					index = [i for i, flag in enumerate(flags) if flag][index]
+				raise ValueError('record %d: %s' % (index, e))
+
+			if flags is None:
+				columns[field] = loaded
+			else:
+				loaded = python.iter(loaded)
+				columns[field] = [loaded.next() if flag else None for flag in flags]
+
+		if arrays:
+			result = {}
+			for field, type in fields:
+				column = columns[field]
+				if field in present:
+					missing = type.default_value if isinstance(type, DefaultType) else None
+					column = [value if flag else missing for value, flag in itertools.izip(column, present[field])]
+				if isinstance(type, OptionalType):
+					type = type.type
+				result[field] = column_array(type, column)
+			return result
+
+		for field, type in fields:
+			if not type._is_identity():
+				flags = present.get(field)
+				for record, value, flag in itertools.izip(records, columns[field], flags or itertools.repeat(True)):
+					if flag:
+						record[field] = value
+			if isinstance(type, DefaultType):
+				for record, flag in itertools.izip(records, present[field]):
+					if not flag:
+						record[field] = type.default_value
+		if self.trim and True in extra:
+			for record, flag in itertools.izip(records, extra):
+				if flag:
+					for field in record.keys():
+						if field not in self.fields:
+							del record[field]
+		return records
+
+	def save_new(self, obj):
+		if not isinstance(obj, python.dict):
+			raise ValueError('object is not a dict')
+
+		new_obj = obj
+		num = 0
+		for field, type in self.ordered_fields:
+			if field in obj:
+				value = obj[field]
+			else:
+				if isinstance(type, OptionalType):
+					continue
+				raise ValueError('dict is missing field %s' % repr(field))
+
+			num += 1
+
+			if isinstance(type, DefaultType) and value == type.default_value:
+				if new_obj is obj:
+					new_obj = python.dict(obj)
+				del new_obj[field]
+				continue
+
+			new_value = type.save_new(value)
+			if new_value is not value:
+				if new_obj is obj:
+					new_obj = python.dict(obj)
+				new_obj[field] = new_value
+
+		if len(obj) > num:
+			if self.trim:
+				new_obj = self.trim_new(obj, new_obj)
+			else:
+				raise ValueError('dict has additional fields')
+
+		return new_obj
+
+	def trim_new(self, obj, new_obj):
+		if new_obj is obj:
+			new_obj = python.dict(obj)
+		for field in obj:
+			if not field in self.fields:
+				del new_obj[field]
+		return new_obj
+
+	def _load_json(self, s, i):
+		if s[i:i + 1] != '{':
+			raise ValueError('object is not a dict')
+		if not self.nested or len(s) - i < json_nested_size:
+			obj, i = json_raw_decode(s, i)
+			return self.load(obj), i
+
+		obj = {}
+		fields = self.fields
+		i = json_whitespace(s, i + 1).end()
+		if s[i:i + 1] == '}':
+			i += 1
+		else:
+			while True:
+				if s[i:i + 1] != '"':
+					raise ValueError('Expecting property name enclosed in double quotes: char %d' % i)
+				field, i = json_scanstring(s, i + 1)
+				i = json_whitespace(s, i).end()
+				if s[i:i + 1] != ':':
+					raise ValueError('Expecting : delimiter: char %d' % i)
+				i = json_whitespace(s, i + 1).end()
+
+				if field in fields:
+					obj[field], i = fields[field]._load_json(s, i)
+				elif self.trim:
+					value, i = json_raw_decode(s, i)
+				else:
+					raise ValueError('dict has unexpected fields')
+
+				i = json_whitespace(s, i).end()
+				c = s[i:i + 1]
+				if c == '}':
+					i += 1
+					break
+				elif c != ',':
+					raise ValueError('Expecting , delimiter: char %d' % i)
+				i = json_whitespace(s, i + 1).end()
+
+		if len(obj) < len(fields):
+			for field, type in fields.iteritems():
+				if field in obj:
+					continue
+				if isinstance(type, DefaultType):
+					obj[field] = type.default_value
+				elif not isinstance(type, OptionalType):
+					raise ValueError('dict is missing field %s' % repr(field))
+
+		return obj, i
+
+	def _json_nested(self):
+		return self.nested
+
+	def _accepts(self, cls, method):
+		return issubclass(cls, python.dict)
+
+	def _classes(self):
+		return (python.dict, )
+
+	def _excludes(self, other):
+		if not isinstance(other, DictType):
+			return False
+		for field, type in self.ordered_fields:
+			if isinstance(type, OptionalType):
+				continue
+			if field not in other.fields:
+				if not other.trim:
+					return True
+			elif not isinstance(other.fields[field], OptionalType) and exclusive(type, other.fields[field]):
+				return True
+		return False
+
+	def _reorder(self, profile, path):
+		rates = {}
+		for field in self.fields:
+			calls, failures = profile.totals(path + json_pointer('', field))
+			rates[field] = python.float(failures) / calls if calls else 0.0
+		if not python.any(rates.itervalues()):
+			return self
+		return self.reorder(sorted(self.fields, key=lambda field: -rates[field]))
+
+	def _compile_test(self, c, v):
+		return c.function(self, 'test', v, self._compile_test_body)
+
+	def _compile_test_body(self, c):
+		lines = [
+				'if not isinstance(v, dict):',
+				'\treturn False',
+				'n = 0',
+			]
+		for field, type in self.ordered_fields:
+			key = c.literal(field)
+			lines.append('if %s in v:' % key)
+			lines.append('\tx = v[%s]' % key)
+			lines.append('\tif not %s:' % type._compile_test(c, 'x'))
+			lines.append('\t\treturn False')
+			lines.append('\tn += 1')
+			if not isinstance(type, OptionalType):
+				lines.append('else:')
+				lines.append('\treturn False')
+		if not self.trim:
+			lines.append('if len(v) > n:')
+			lines.append('\treturn False')
+		lines.append('return True')
+		return lines
+
+	def _compile_load(self, c, v):
+		return c.function(self, 'load', v, self._compile_load_body)
+
+	def _compile_load_body(self, c):
+		lines = [
+				'if not isinstance(v, dict):',
+				"\traise ValueError('object is not a dict')",
+				'n = 0',
+			]
+		for field, type in self.ordered_fields:
+			key = c.literal(field)
+			lines.append('if %s in v:' % key)
+			lines.append('\tx = v[%s]' % key)
+			if type._is_identity():
+				lines.append('\tif not %s:' % type._compile_test(c, 'x'))
+				lines.append('\t\t_invalid()')
+			else:
+				lines.append('\tv[%s] = %s' % (key, type._compile_load(c, 'x')))
+			lines.append('\tn += 1')
+			if isinstance(type, DefaultType):
+				lines.append('else:')
+				lines.append('\tv[%s] = %s' % (key, c.const(type.default_value)))
+				lines.append('\tn += 1')
+			elif not isinstance(type, OptionalType):
+				lines.append('else:')
+				lines.append('\traise ValueError(%s)' % c.literal('dict is missing field %s' % repr(field)))
+		lines.extend(self._compile_extra_fields(c, 'dict has unexpected fields'))
+		return lines
+
+	def _compile_save(self, c, v):
+		return c.function(self, 'save', v, self._compile_save_body)
+
+	def _compile_save_body(self, c):
+		lines = [
+				'if not isinstance(v, dict):',
+				"\traise ValueError('object is not a dict')",
+				'n = 0',
+			]
+		for field, type in self.ordered_fields:
+			key = c.literal(field)
+			lines.append('if %s in v:' % key)
+			lines.append('\tx = v[%s]' % key)
+			indent = '\t'
+			if isinstance(type, DefaultType):
+				lines.append('\tif x == %s:' % c.const(type.default_value))
+				lines.append('\t\tdel v[%s]' % key)
+				lines.append('\telse:')
+				indent = '\t\t'
+			lines.append(indent + 'n += 1')
+			if type._is_identity():
+				lines.append(indent + 'if not %s:' % type._compile_test(c, 'x'))
+				lines.append(indent + '\t_invalid()')
+			else:
+				lines.append(indent + 'v[%s] = %s' % (key, type._compile_save(c, 'x')))
+			if not isinstance(type, OptionalType):
+				lines.append('else:')
+				lines.append('\traise ValueError(%s)' % c.literal('dict is missing field %s' % repr(field)))
+		lines.extend(self._compile_extra_fields(c, 'dict has additional fields'))
+		return lines
+
+	def _compile_json(self, c, v):
+		if not all(isinstance(field, basestring) for field in self.fields):
+			return super(DictType, self)._compile_json(c, v)
+		return c.function(self, 'json', v, self._compile_json_body)
+
+	def _compile_json_body(self, c):
+		required = [(field, type) for field, type in self.fields.iteritems() if not isinstance(type, OptionalType)]
+		optional = [(field, type) for field, type in self.fields.iteritems() if isinstance(type, OptionalType)]
+		names = ['x%d' % i for i in xrange(len(required))]
+
+		lines = [
+				'if not isinstance(v, dict):',
+				"\traise ValueError('object is not a dict')",
+			]
+		if required:
+			lines.append('try:')
+			lines.extend('\t%s = v[%s]' % (name, c.literal(field)) for name, (field, type) in itertools.izip(names, required))
+			lines.append('except KeyError:')
+			lines.append('\t_missing(v, %s)' % c.const([field for field, type in required]))
+			template = ','.join('%s:%%s' % json_string(field).replace('%', '%%') for field, type in required)
+			values = ''.join('%s, ' % type._compile_json(c, name) for name, (field, type) in itertools.izip(names, required))
+			lines.append('p = %s %% (%s)' % (c.literal(template), values))
+		if optional:
+			lines.append('p = [p]' if required else 'p = []')
+			lines.append('n = %d' % len(required))
+			for field, type in optional:
+				key = c.literal(field)
+				lines.append('if %s in v:' % key)
+				lines.append('\tx = v[%s]' % key)
+				lines.append('\tn += 1')
+				indent = '\t'
+				if isinstance(type, DefaultType):
+					lines.append('\tif x != %s:' % c.const(type.default_value))
+					indent = '\t\t'
+				lines.append(indent + 'p.append(%s + %s)' % (c.literal(json_string(field) + ':'), type._compile_json(c, 'x')))
+			lines.append("p = ','.join(p)")
+		elif not required:
+			lines.append("p = ''")
+		if not self.trim:
+			lines.append('if len(v) > %s:' % ('n' if optional else len(required)))
+			lines.append("\traise ValueError('dict has additional fields')")
+		lines.append("return '{' + p + '}'")
+		return lines
+
+	def _compile_binary_fields(self):
+		fields = [(field, self.fields[field]) for field in binary_order(self.fields)]
+		optional = [field for field, type in fields if isinstance(type, OptionalType)]
+		return fields, python.dict((field, 1 << i) for i, field in enumerate(optional)), (len(optional) + 7) // 8
+
+	def _compile_binary_save(self, c, v):
+		return ['%s(%s, p)' % (c.function(self, 'binary_save', '', self._compile_binary_save_body, params='v, p')[:-2], v)]
+
+	def _compile_binary_save_body(self, c):
+		fields, bits, width = self._compile_binary_fields()
+		lines = [
+				'if not isinstance(v, dict):',
+				"\traise ValueError('object is not a dict')",
+				'a = p.append',
+				'n = 0',
+			]
+		if bits:
+			lines.append('bits = 0')
+			for field, type in fields:
+				if field in bits:
+					key = c.literal(field)
+					lines.append('if %s in v:' % key)
+					lines.append('\tn += 1')
+					if isinstance(type, DefaultType):
+						lines.append('\tif v[%s] != %s:' % (key, c.const(type.default_value)))
+						lines.append('\t\tbits |= %d' % bits[field])
+					else:
+						lines.append('\tbits |= %d' % bits[field])
+			lines.append('a(_binary_bits(bits, %d))' % width)
+		for field, type in fields:
+			key = c.literal(field)
+			if field in bits:
+				lines.append('if bits & %d:' % bits[field])
+			else:
+				lines.append('if %s in v:' % key)
+				lines.append('\tn += 1')
+			lines.append('\tx = v[%s]' % key)
+			lines.extend(binary_lines(type._compile_binary_save(c, 'x')))
+			if field not in bits:
+				lines.append('else:')
+				lines.append('\traise ValueError(%s)' % c.literal('dict is missing field %s' % repr(field)))
+		if not self.trim:
+			lines.append('if len(v) > n:')
+			lines.append("\traise ValueError('dict has additional fields')")
+		return lines
+
+	def _compile_binary_load(self, c, v):
+		return ['%s, i = %s' % (v, c.function(self, 'binary_load', 's, i', self._compile_binary_load_body, params='s, i'))]
+
+	def _compile_binary_load_body(self, c):
+		fields, bits, width = self._compile_binary_fields()
+		lines = []
+		if bits:
+			lines.append('bits = _binary_read_bits(s, i, %d)' % width)
+			lines.append('i += %d' % width)
+		lines.append('v = {}')
+		for field, type in fields:
+			key = c.literal(field)
+			indent = ''
+			if field in bits:
+				lines.append('if bits & %d:' % bits[field])
+				indent = '\t'
+			lines.extend(binary_lines(type._compile_binary_load(c, 'x'), indent))
+			lines.append(indent + 'v[%s] = x' % key)
+			if isinstance(type, DefaultType):
+				lines.append('else:')
+				lines.append('\tv[%s] = %s' % (key, c.const(type.default_value)))
+		lines.append('return v, i')
+		return lines
+
+	def _compile_extra_fields(self, c, message):
+		lines = ['if len(v) > n:']
+		if self.trim:
+			lines.append('\tfor field in v.keys():')
+			lines.append('\t\tif not field in %s:' % c.const(self.fields))
+			lines.append('\t\t\tdel v[field]')
+		else:
+			lines.append('\traise ValueError(%s)' % c.literal(message))
+		lines.append('return v')
+		return lines
+
+class LazyDict(collections.Mapping):
+	"""
+	A read-only mapping returned by `DictType.load_lazy`. Fields are loaded by
+	their types on first access and cached; missing fields with a default
+	value have their default value. The loaded dict is available as
+	`dict(obj)`.
+	"""
+
+	__slots__ = ['type', 'obj', 'values']
+
+	def __init__(self, type, obj):
+		self.type = type
+		self.obj = obj
+		self.values = {}
+
+	def __getitem__(self, field):
+		if field in self.values:
+			return self.values[field]
+
+		type = self.type.fields[field]
+		if field in self.obj:
+			value = self.values[field] = type.load_new(self.obj[field])
+			return value
+		elif isinstance(type, DefaultType):
+			return type.default_value
+		raise KeyError(field)
+
+	def __contains__(self, field):
+		if field not in self.type.fields:
+			return False
+		return field in self.obj or isinstance(self.type.fields[field], DefaultType)
+
+	def __iter__(self):
+		for field in self.type.fields:
+			if field in self:
+				yield field
+
+	def __len__(self):
+		return sum(1 for field in self)
+
+	def __repr__(self):
+		return '<typed.LazyDict %s>' % ', '.join(sorted(repr(field) for field in self))
+
+
+class OptionalType(Type):
+	__slots__ = ['type']
+
+	def __init__(self, type):
+		self.type = type
+
+	def _args(self):
+		return (self.type, )
+
+	def _map(self, f):
+		return OptionalType(f(self.type, ''))
+
+	def test(self, obj):
+		return self.type.test(obj)
+
+	def _validate(self, obj, path, failures, first):
+		return self.type._validate(obj, path, failures, first)
+
+	def __repr__(self):
+		return '%r.optional' % self.type
+
+	def load(self, obj):
+		return self.type.load(obj)
+
+	def save(self, obj):
+		return self.type.save(obj)
+
+	def load_new(self, obj):
+		return self.type.load_new(obj)
+
+	def save_new(self, obj):
+		return self.type.save_new(obj)
+
+	def _load_json(self, s, i):
+		return self.type._load_json(s, i)
+
+	def _json_nested(self):
+		return self.type._json_nested()
+
+	def format(self, fmt):
+		return self.type.format(fmt).optional
+
+	def _accepts(self, cls, method):
+		return self.type._accepts(cls, method)
+
+	def _classes(self):
+		classes = self.type._classes()
+		if classes is None:
+			return None
+		return classes + (python.types.NoneType, )
+
+	def _is_identity(self):
+		return self.type._is_identity()
+
+	def _test_column(self, column):
+		return self.type._test_column(column)
+
+	def _accepts_buffer(self, obj, fmt):
+		return self.type._accepts_buffer(obj, fmt)
+
+	def _compile_test(self, c, v):
+		return self.type._compile_test(c, v)
+
+	def _compile_load(self, c, v):
+		return self.type._compile_load(c, v)
+
+	def _compile_save(self, c, v):
+		return self.type._compile_save(c, v)
+
+	def _compile_json(self, c, v):
+		return self.type._compile_json(c, v)
+
+	def _compile_binary_save(self, c, v):
+		return self.type._compile_binary_save(c, v)
+
+	def _compile_binary_load(self, c, v):
+		return self.type._compile_binary_load(c, v)
 
 
 class DefaultType(OptionalType):
@@ -419,6 +2724,15 @@ class DefaultType(OptionalType):
 		self.type = type
 		self.default_value = default_value
 
+	def _args(self):
+		return (self.type, self.default_value)
+
+	def _map(self, f):
+		return DefaultType(f(self.type, ''), self.default_value)
+
+	def __repr__(self):
+		return '%r.default(%r)' % (self.type, self.default_value)
+
 	def format(self, fmt):
 		return self.type.format(fmt).default(self.default_value)
 
@@ -435,9 +2749,21 @@ class DictFormatType(Type):
 		self.load_dict = load_dict
 		self.type = type
 
+	def _args(self):
+		return (self.type, self.save_dict)
+
+	def _map(self, f):
+		return DictFormatType(f(self.type, ''), self.save_dict)
+
 	def test(self, obj):
 		return self.type.test(obj)
 
+	def _validate(self, obj, path, failures, first):
+		return self.type._validate(obj, path, failures, first)
+
+	def __repr__(self):
+		return '%r.format(%r)' % (self.type, self.save_dict)
+
 	def load(self, obj):
 		if obj in self.load_dict:
 			val = self.load_dict[obj]
@@ -452,33 +2778,267 @@ class DictFormatType(Type):
 		else:
 			return obj
 
+	def load_new(self, obj):
+		if obj in self.load_dict:
+			val = self.load_dict[obj]
+		else:
+			val = obj
+		return self.type.load_new(val)
+
+	def save_new(self, obj):
+		obj = self.type.save_new(obj)
+		if obj in self.save_dict:
+			return self.save_dict[obj]
+		else:
+			return obj
+
+	def _accepts(self, cls, method):
+		if method == 'load':
+			family = value_family(cls)
+			for value in self.load_dict:
+				if python.type(value) not in dispatch_classes or value_family(python.type(value)) is family:
+					return True
+		return self.type._accepts(cls, method)
+
+	def _compile_test(self, c, v):
+		return self.type._compile_test(c, v)
+
+	def _compile_load(self, c, v):
+		return c.function(self, 'load', v, self._compile_load_body)
+
+	def _compile_load_body(self, c):
+		load_dict = c.const(self.load_dict)
+		return [
+				'if v in %s:' % load_dict,
+				'\tv = %s[v]' % load_dict,
+				'return %s' % self.type._compile_load(c, 'v'),
+			]
+
+	def _compile_save(self, c, v):
+		return c.function(self, 'save', v, self._compile_save_body)
+
+	def _compile_save_body(self, c):
+		save_dict = c.const(self.save_dict)
+		return [
+				'v = %s' % self.type._compile_save(c, 'v'),
+				'if v in %s:' % save_dict,
+				'\treturn %s[v]' % save_dict,
+				'return v',
+			]
+
+	def _compile_binary_save(self, c, v):
+		return self.type._compile_binary_save(c, v)
+
+	def _compile_binary_load(self, c, v):
+		return self.type._compile_binary_load(c, v)
+
 
 class JSONFormatType(Type):
-	__slots__ = ['type', 'double_precision']
+	__slots__ = ['type', 'double_precision', 'decoder', 'encoder', 'schema_encode']
 
-	def __init__(self, type, double_precision=None):
+	def __init__(self, type, double_precision=None, decoder=None, encoder=None):
 		if double_precision is not None and not __HAS_UJSON__:
 			raise NotImplementedError('double_precision is not supported since the `ujson` library is not available for import')
+		if decoder not in (None, 'schema'):
+			raise ValueError('decoder must be None or \'schema\'')
+		if encoder not in (None, 'schema'):
+			raise ValueError('encoder must be None or \'schema\'')
+		if encoder is not None and double_precision is not None:
+			raise ValueError('double_precision is not supported by the schema encoder')
 		self.type = type
 		self.double_precision = double_precision
+		self.decoder = decoder
+		self.encoder = encoder
+		self.schema_encode = None
+
+	def _args(self):
+		return (self.type, self.double_precision, self.decoder, self.encoder)
+
+	def _state(self):
+		return {'type': self.type, 'double_precision': self.double_precision, 'decoder': self.decoder, 'encoder': self.encoder}
+
+	def _restore(self, state):
+		super(JSONFormatType, self)._restore(state)
+		self.schema_encode = Compiler().compile_json(self.type) if self.encoder == 'schema' else None
+
+	def _map(self, f):
+		return JSONFormatType(f(self.type, ''), self.double_precision, self.decoder, self.encoder)
 
 	def test(self, obj):
 		return self.type.test(obj)
 
+	def _validate(self, obj, path, failures, first):
+		return self.type._validate(obj, path, failures, first)
+
+	def __repr__(self):
+		args = [repr(self.type)]
+		if self.double_precision is not None:
+			args.append('double_precision=%r' % self.double_precision)
+		if self.decoder is not None:
+			args.append('decoder=%r' % self.decoder)
+		if self.encoder is not None:
+			args.append('encoder=%r' % self.encoder)
+		return 'typed.json(%s)' % ', '.join(args)
+
 	def load(self, obj):
+		if self.decoder == 'schema':
+			return json_load(self.type, obj)
 		return self.type.load(python.json.loads(obj))
 
 	def save(self, obj):
+		if self.encoder == 'schema':
+			return self.save_schema(obj)
 		if self.double_precision is not None:
 			return python.json.dumps(self.type.save(obj), double_precision=self.double_precision)
 		return python.json.dumps(self.type.save(obj))
 
+	def save_schema(self, obj):
+		if self.schema_encode is None:
+			self.schema_encode = Compiler().compile_json(self.type)
+		return self.schema_encode(obj)
+
+	def save_new(self, obj):
+		if self.encoder == 'schema':
+			return self.save_schema(obj)
+		if self.double_precision is not None:
+			return python.json.dumps(self.type.save_new(obj), double_precision=self.double_precision)
+		return python.json.dumps(self.type.save_new(obj))
+
+	def dump(self, obj, fp):
+		"""
+		Saves `obj` without modifying it and writes the JSON to the file-like
+		object or bytearray `fp`.
+		"""
+		data = self.save_new(obj)
+		if isinstance(fp, bytearray):
+			fp.extend(data)
+		else:
+			fp.write(data)
+
+	def _accepts(self, cls, method):
+		if method == 'load':
+			return issubclass(cls, basestring)
+		return self.type._accepts(cls, method)
+
+	def _compile_test(self, c, v):
+		return self.type._compile_test(c, v)
+
+	def _compile_load(self, c, v):
+		return c.function(self, 'load', v, self._compile_load_body)
+
+	def _compile_load_body(self, c):
+		if self.decoder == 'schema':
+			return ['return %s(%s, v)' % (c.const(json_load), c.const(self.type))]
+		return [
+				'v = %s(v)' % c.const(python.json.loads),
+				'return %s' % self.type._compile_load(c, 'v'),
+			]
+
+	def _compile_save(self, c, v):
+		return c.function(self, 'save', v, self._compile_save_body)
+
+	def _compile_save_body(self, c):
+		if self.encoder == 'schema':
+			return ['return %s' % self.type._compile_json(c, 'v')]
+		dumps = c.const(python.json.dumps)
+		if self.double_precision is not None:
+			return ['return %s(%s, double_precision=%d)' % (dumps, self.type._compile_save(c, 'v'), self.double_precision)]
+		return ['return %s(%s)' % (dumps, self.type._compile_save(c, 'v'))]
+
+	def _compile_binary_save(self, c, v):
+		return self.type._compile_binary_save(c, v)
+
+	def _compile_binary_load(self, c, v):
+		return self.type._compile_binary_load(c, v)
+
+class BinaryFormatType(Type):
+	"""
+	Loads objects of `type` from, and saves them to, a compact binary encoding
+	which is driven by the schema: field names are not stored, integers are
+	variable-length, set members are stored as ordinals and optional fields
+	as a bitmap.
+	"""
+
+	__slots__ = ['type', 'encode', 'decode']
+
+	def __init__(self, type):
+		self.type = type
+		self.encode = None
+		self.decode = None
+
+	def _args(self):
+		return (self.type,)
+
+	def _state(self):
+		return {'type': self.type}
+
+	def _restore(self, state):
+		self.type = state['type']
+		self.encode, self.decode = Compiler().compile_binary(self.type)
+
+	def _map(self, f):
+		return BinaryFormatType(f(self.type, ''))
+
+	def test(self, obj):
+		return self.type.test(obj)
+
+	def _validate(self, obj, path, failures, first):
+		return self.type._validate(obj, path, failures, first)
+
+	def __repr__(self):
+		return 'typed.binary(%r)' % self.type
+
+	def _compile_binary(self):
+		if self.encode is None:
+			self.encode, self.decode = Compiler().compile_binary(self.type)
+
+	def load(self, obj):
+		if self.decode is None:
+			self._compile_binary()
+		if not isinstance(obj, bytearray):
+			if not isinstance(obj, python.str):
+				raise ValueError('object is not a binary string')
+			obj = bytearray(obj)
+		try:
+			value, i = self.decode(obj)
+		except (IndexError, OverflowError, struct.error, UnicodeDecodeError):
+			raise ValueError('invalid binary data')
+		if i != len(obj):
+			raise ValueError('binary data has trailing bytes')
+		return value
+
+	def save(self, obj):
+		if self.encode is None:
+			self._compile_binary()
+		return self.encode(obj)
+
+	def _accepts(self, cls, method):
+		if method == 'load':
+			return issubclass(cls, (python.str, bytearray))
+		return self.type._accepts(cls, method)
+
+	def _compile_test(self, c, v):
+		return self.type._compile_test(c, v)
+
+	def _compile_binary_save(self, c, v):
+		return self.type._compile_binary_save(c, v)
+
+	def _compile_binary_load(self, c, v):
+		return self.type._compile_binary_load(c, v)
+
 
 class TupleType(Type):
-	__slots__ = ['types']
+	__slots__ = ['types', 'identity']
 
 	def __init__(self, types):
 		self.types = types
+		self.identity = all(type._is_identity() for type in types)
+
+	def _args(self):
+		return (self.types, )
+
+	def _map(self, f):
+		return TupleType(python.tuple(f(type, json_pointer('', i)) for i, type in enumerate(self.types)))
 
 	def test(self, obj):
 		if not isinstance(obj, python.tuple):
@@ -489,6 +3049,29 @@ class TupleType(Type):
 
 		return all(type.test(item) for type, item in itertools.izip(self.types, obj))
 
+	def _validate(self, obj, path, failures, first):
+		if not isinstance(obj, python.tuple):
+			failures.append(ValidationFailure(path, self, obj, 'object is not a tuple'))
+			return False
+
+		if len(obj) != len(self.types):
+			if len(obj) > len(self.types):
+				failures.append(ValidationFailure(path, self, obj, 'too many items'))
+			else:
+				failures.append(ValidationFailure(path, self, obj, 'not enough items'))
+			return False
+
+		valid = True
+		for i, (type, item) in enumerate(itertools.izip(self.types, obj)):
+			if not type._validate(item, json_pointer(path, i), failures, first):
+				if first:
+					return False
+				valid = False
+		return valid
+
+	def __repr__(self):
+		return 'typed.tuple(%s)' % ', '.join(repr(type) for type in self.types)
+
 	def load(self, obj):
 		if not isinstance(obj, python.tuple):
 			raise ValueError('object is not a tuple')
@@ -499,6 +3082,8 @@ class TupleType(Type):
 			else:
 				raise ValueError('not enough items')
 
+		if self.identity and self.test(obj):
+			return obj
 		return python.tuple(type.load(item) for type, item in itertools.izip(self.types, obj))
 
 	def save(self, obj):
@@ -511,8 +3096,128 @@ class TupleType(Type):
 			else:
 				raise ValueError('not enough items')
 
+		if self.identity and self.test(obj):
+			return obj
 		return python.tuple(type.save(item) for type, item in itertools.izip(self.types, obj))
 
+	def load_new(self, obj):
+		return self.convert_new(obj, [type.load_new for type in self.types])
+
+	def save_new(self, obj):
+		return self.convert_new(obj, [type.save_new for type in self.types])
+
+	def convert_new(self, obj, converters):
+		if not isinstance(obj, python.tuple):
+			raise ValueError('object is not a tuple')
+
+		if len(obj) != len(self.types):
+			if len(obj) > len(self.types):
+				raise ValueError('too many items')
+			else:
+				raise ValueError('not enough items')
+
+		if self.identity and self.test(obj):
+			return obj
+		items = [convert(item) for convert, item in itertools.izip(converters, obj)]
+		if all(new_item is item for new_item, item in itertools.izip(items, obj)):
+			return obj
+		return python.tuple(items)
+
+	def _is_identity(self):
+		return self.identity
+
+	def _accepts(self, cls, method):
+		return issubclass(cls, python.tuple)
+
+	def _classes(self):
+		return (python.tuple, )
+
+	def _excludes(self, other):
+		if not isinstance(other, TupleType):
+			return False
+		if len(self.types) != len(other.types):
+			return True
+		return python.any(exclusive(a, b) for a, b in itertools.izip(self.types, other.types))
+
+	def _compile_unpack(self):
+		names = ['x%d' % i for i in xrange(len(self.types))]
+		if not names:
+			return names, []
+		return names, ['%s, = v' % ', '.join(names)]
+
+	def _compile_test(self, c, v):
+		return c.function(self, 'test', v, self._compile_test_body)
+
+	def _compile_test_body(self, c):
+		names, lines = self._compile_unpack()
+		tests = [type._compile_test(c, name) for type, name in itertools.izip(self.types, names)]
+		return [
+				'if not isinstance(v, tuple) or len(v) != %d:' % len(self.types),
+				'\treturn False',
+			] + lines + ['return %s' % (' and '.join(tests) or 'True')]
+
+	def _compile_load(self, c, v):
+		return c.function(self, 'load', v, self._compile_method, 'load')
+
+	def _compile_save(self, c, v):
+		return c.function(self, 'save', v, self._compile_method, 'save')
+
+	def _compile_method(self, c, method):
+		names, lines = self._compile_unpack()
+		items = [getattr(type, '_compile_' + method)(c, name) for type, name in itertools.izip(self.types, names)]
+		return [
+				'if not isinstance(v, tuple):',
+				"\traise ValueError('object is not a tuple')",
+				'if len(v) > %d:' % len(self.types),
+				"\traise ValueError('too many items')",
+				'if len(v) < %d:' % len(self.types),
+				"\traise ValueError('not enough items')",
+			] + lines + ['return (%s)' % ''.join(item + ', ' for item in items)]
+
+	def _compile_json(self, c, v):
+		return c.function(self, 'json', v, self._compile_json_body)
+
+	def _compile_json_body(self, c):
+		names, lines = self._compile_unpack()
+		items = [type._compile_json(c, name) for type, name in itertools.izip(self.types, names)]
+		return [
+				'if not isinstance(v, tuple):',
+				"\traise ValueError('object is not a tuple')",
+				'if len(v) > %d:' % len(self.types),
+				"\traise ValueError('too many items')",
+				'if len(v) < %d:' % len(self.types),
+				"\traise ValueError('not enough items')",
+			] + lines + ["return '[' + %s + ']'" % " + ',' + ".join(items or ["''"])]
+
+	def _compile_binary_save(self, c, v):
+		return ['%s(%s, p)' % (c.function(self, 'binary_save', '', self._compile_binary_save_body, params='v, p')[:-2], v)]
+
+	def _compile_binary_save_body(self, c):
+		names, lines = self._compile_unpack()
+		lines = [
+				'if not isinstance(v, tuple):',
+				"\traise ValueError('object is not a tuple')",
+				'if len(v) > %d:' % len(self.types),
+				"\traise ValueError('too many items')",
+				'if len(v) < %d:' % len(self.types),
+				"\traise ValueError('not enough items')",
+				'a = p.append',
+			] + lines
+		for type, name in itertools.izip(self.types, names):
+			lines.extend(type._compile_binary_save(c, name))
+		return lines
+
+	def _compile_binary_load(self, c, v):
+		return ['%s, i = %s' % (v, c.function(self, 'binary_load', 's, i', self._compile_binary_load_body, params='s, i'))]
+
+	def _compile_binary_load_body(self, c):
+		names, unpack = self._compile_unpack()
+		lines = []
+		for type, name in itertools.izip(self.types, names):
+			lines.extend(type._compile_binary_load(c, name))
+		lines.append('return (%s), i' % ''.join(name + ', ' for name in names))
+		return lines
+
 	def format(self, fmt):
 		if fmt is list:
 			return ListTupleFormatType(self)
@@ -529,9 +3234,21 @@ class ListTupleFormatType(Type):
 
 		self.type = type
 
+	def _args(self):
+		return (self.type, )
+
+	def _map(self, f):
+		return ListTupleFormatType(f(self.type, ''))
+
 	def test(self, obj):
 		return self.type.test(obj)
 
+	def _validate(self, obj, path, failures, first):
+		return self.type._validate(obj, path, failures, first)
+
+	def __repr__(self):
+		return '%r.format(typed.list)' % self.type
+
 	def load(self, obj):
 		if not isinstance(obj, python.list):
 			raise ValueError('object is not a list')
@@ -540,6 +3257,695 @@ class ListTupleFormatType(Type):
 	def save(self, obj):
 		return python.list(self.type.save(obj))
 
+	def load_new(self, obj):
+		if not isinstance(obj, python.list):
+			raise ValueError('object is not a list')
+		return self.type.load_new(python.tuple(obj))
+
+	def save_new(self, obj):
+		return python.list(self.type.save_new(obj))
+
+	def _accepts(self, cls, method):
+		if method == 'load':
+			return issubclass(cls, python.list)
+		return self.type._accepts(cls, method)
+
+	def _compile_test(self, c, v):
+		return self.type._compile_test(c, v)
+
+	def _compile_load(self, c, v):
+		return c.function(self, 'load', v, self._compile_load_body)
+
+	def _compile_load_body(self, c):
+		return [
+				'if not isinstance(v, list):',
+				"\traise ValueError('object is not a list')",
+				'v = tuple(v)',
+				'return %s' % self.type._compile_load(c, 'v'),
+			]
+
+	def _compile_save(self, c, v):
+		return 'list(%s)' % self.type._compile_save(c, v)
+
+	def _compile_json(self, c, v):
+		return self.type._compile_json(c, v)
+
+	def _compile_binary_save(self, c, v):
+		return self.type._compile_binary_save(c, v)
+
+	def _compile_binary_load(self, c, v):
+		return self.type._compile_binary_load(c, v)
+
+
+class TaggedUnionType(Type):
+	__slots__ = ['tag', 'types']
+
+	def __init__(self, tag, types):
+		self.tag = tag
+		self.types = {}
+		for value, type in types.iteritems():
+			if isinstance(type, DictType) and tag not in type.fields:
+				fields = python.dict(type.fields)
+				fields[tag] = SetType([value])
+				# the tag is checked first, before the fields in the order of the branch
+				order = None if type.order is None else (tag, ) + python.tuple(type.order)
+				type = DictType(fields, trim=type.trim, order=order)
+			self.types[value] = type
+
+	def _args(self):
+		return (self.tag, self.types)
+
+	def _map(self, f):
+		return TaggedUnionType(self.tag, python.dict((value, f(type, '|%s' % value)) for value, type in self.types.iteritems()))
+
+	def branch(self, obj):
+		if not isinstance(obj, python.dict):
+			raise ValueError('object is not a dict')
+		if self.tag not in obj:
+			raise ValueError('dict is missing field %s' % repr(self.tag))
+
+		try:
+			return self.types[obj[self.tag]]
+		except (KeyError, TypeError):
+			raise ValueError('unknown %s %s' % (self.tag, repr(obj[self.tag])))
+
+	def test(self, obj):
+		if not isinstance(obj, python.dict):
+			return False
+
+		try:
+			type = self.types[obj[self.tag]]
+		except (KeyError, TypeError):
+			return False
+		return type.test(obj)
+
+	def _validate(self, obj, path, failures, first):
+		if not isinstance(obj, python.dict):
+			failures.append(ValidationFailure(path, self, obj, 'object is not a dict'))
+			return False
+
+		if self.tag not in obj:
+			failures.append(ValidationFailure(json_pointer(path, self.tag), SetType(self.types), None, 'dict is missing field'))
+			return False
+
+		try:
+			type = self.types[obj[self.tag]]
+		except (KeyError, TypeError):
+			failures.append(ValidationFailure(json_pointer(path, self.tag), SetType(self.types), obj[self.tag], 'unknown %s' % self.tag))
+			return False
+		return type._validate(obj, path, failures, first)
+
+	def __repr__(self):
+		types = ', '.join('%r: %r' % item for item in self.types.iteritems())
+		return 'typed.tagged(%r, {%s})' % (self.tag, types)
+
+	def load(self, obj):
+		return self.branch(obj).load(obj)
+
+	def save(self, obj):
+		return self.branch(obj).save(obj)
+
+	def load_new(self, obj):
+		return self.branch(obj).load_new(obj)
+
+	def save_new(self, obj):
+		return self.branch(obj).save_new(obj)
+
+	def _accepts(self, cls, method):
+		return issubclass(cls, python.dict)
+
+	def _compile_test(self, c, v):
+		return c.function(self, 'test', v, self._compile_method, 'test')
+
+	def _compile_load(self, c, v):
+		return c.function(self, 'load', v, self._compile_method, 'load')
+
+	def _compile_save(self, c, v):
+		return c.function(self, 'save', v, self._compile_method, 'save')
+
+	def _compile_json(self, c, v):
+		return c.function(self, 'json', v, self._compile_method, 'json')
+
+	def _compile_binary_save(self, c, v):
+		return ['%s(%s, p)' % (c.function(self, 'binary_save', '', self._compile_binary_save_body, params='v, p')[:-2], v)]
+
+	def _compile_binary_save_body(self, c):
+		tag = c.literal(self.tag)
+		lines = [
+				'if not isinstance(v, dict):',
+				"\traise ValueError('object is not a dict')",
+				'if %s not in v:' % tag,
+				'\traise ValueError(%s)' % c.literal('dict is missing field %s' % repr(self.tag)),
+				'a = p.append',
+				't = v[%s]' % tag,
+			]
+		for index, value in enumerate(binary_order(self.types)):
+			lines.append('%s t == %s:' % ('if' if index == 0 else 'elif', c.literal(value)))
+			lines.append('\ta(%s)' % c.literal(binary_uint(index)))
+			lines.extend(binary_lines(self.types[value]._compile_binary_save(c, 'v')))
+		lines.append('else:')
+		lines.append('\traise ValueError(%s)' % c.literal('unknown %s' % self.tag))
+		return lines
+
+	def _compile_binary_load(self, c, v):
+		return ['%s, i = %s' % (v, c.function(self, 'binary_load', 's, i', self._compile_binary_load_body, params='s, i'))]
+
+	def _compile_binary_load_body(self, c):
+		lines = binary_read_uint_lines('j')
+		for index, value in enumerate(binary_order(self.types)):
+			lines.append('%s j == %d:' % ('if' if index == 0 else 'elif', index))
+			lines.extend(binary_lines(self.types[value]._compile_binary_load(c, 'v')))
+		lines.append('else:')
+		lines.append("\traise ValueError('invalid binary data')")
+		lines.append('return v, i')
+		return lines
+
+	def _compile_method(self, c, method):
+		table = c.table((c.literal(value), c.callable(type, method)) for value, type in self.types.iteritems())
+		tag = c.literal(self.tag)
+		if method == 'test':
+			return [
+					'if not isinstance(v, dict):',
+					'\treturn False',
+					'try:',
+					'\tf = %s[v[%s]]' % (table, tag),
+					'except (KeyError, TypeError):',
+					'\treturn False',
+					'return f(v)',
+				]
+		return [
+				'if not isinstance(v, dict):',
+				"\traise ValueError('object is not a dict')",
+				'try:',
+				'\tf = %s[v[%s]]' % (table, tag),
+				'except (KeyError, TypeError):',
+				'\traise ValueError(%s if %s in v else %s)' % (
+						c.literal('unknown %s' % self.tag), tag, c.literal('dict is missing field %s' % repr(self.tag))),
+				'return f(v)',
+			]
+
+
+class CompiledType(Type):
+	__slots__ = ['type', 'source', 'test', 'load', 'save']
+
+	def __init__(self, type, source, namespace):
+		self.type = type
+		self.source = source
+		self.test = namespace['test']
+		self.load = namespace['load']
+		self.save = namespace['save']
+
+	def __reduce__(self):
+		return (compile, (self.type, ))
+
+	def _args(self):
+		return (self.type, )
+
+	def _state(self):
+		return {'type': self.type}
+
+	def _restore(self, state):
+		compiled = Compiler().compile(state['type'])
+		for name in type_slots(CompiledType):
+			setattr(self, name, getattr(compiled, name))
+
+	def _map(self, f):
+		return self.type._map(f)
+
+	def _validate(self, obj, path, failures, first):
+		return self.type._validate(obj, path, failures, first)
+
+	def __repr__(self):
+		return '%r.compile()' % self.type
+
+	def load_new(self, obj):
+		return self.type.load_new(obj)
+
+	def save_new(self, obj):
+		return self.type.save_new(obj)
+
+	def compile(self):
+		return self
+
+	def optimize(self):
+		return self.type.optimize().compile()
+
+	def _accepts(self, cls, method):
+		return self.type._accepts(cls, method)
+
+	def _compile_json(self, c, v):
+		return self.type._compile_json(c, v)
+
+	def _compile_binary_save(self, c, v):
+		return self.type._compile_binary_save(c, v)
+
+	def _compile_binary_load(self, c, v):
+		return self.type._compile_binary_load(c, v)
+
+class CountingType(Type):
+	"""
+	Base class of types which count the objects they convert. Each of them
+	has its own counters, so it is only equal to itself.
+	"""
+	__slots__ = []
+
+	def __eq__(self, other):
+		return self is other
+
+	def __hash__(self):
+		return id(self)
+
+
+class ProfiledType(CountingType):
+	"""
+	Wraps a node of a profiled type, counting the calls, failures and
+	cumulative time of each of its methods in `counters`.
+	"""
+	__slots__ = ['type', 'counters', 'profile']
+
+	def __init__(self, type, counters, profile):
+		self.type = type
+		self.counters = counters
+		self.profile = profile
+
+	def _args(self):
+		return (self.type, self.counters, self.profile)
+
+	def _map(self, f):
+		return self.type._map(f)
+
+	def test(self, obj):
+		counter = self.counters['test']
+		start = timeit.default_timer()
+		try:
+			result = self.type.test(obj)
+		finally:
+			counter[0] += 1
+			counter[2] += timeit.default_timer() - start
+		if not result:
+			counter[1] += 1
+		return result
+
+	def _validate(self, obj, path, failures, first):
+		return self.type._validate(obj, path, failures, first)
+
+	def __repr__(self):
+		return repr(self.type)
+
+	def call(self, method, obj):
+		counter = self.counters[method]
+		start = timeit.default_timer()
+		try:
+			return getattr(self.type, method)(obj)
+		except ValueError:
+			counter[1] += 1
+			raise
+		finally:
+			counter[0] += 1
+			counter[2] += timeit.default_timer() - start
+
+	def load(self, obj):
+		return self.call('load', obj)
+
+	def save(self, obj):
+		return self.call('save', obj)
+
+	def load_new(self, obj):
+		return self.call('load_new', obj)
+
+	def save_new(self, obj):
+		return self.call('save_new', obj)
+
+	def _accepts(self, cls, method):
+		return self.type._accepts(cls, method)
+
+
+class Profile(object):
+	"""
+	Collects the counters of all nodes of a profiled type, keyed by the JSON
+	pointer path of each node. List items share the path `/*` under their
+	list, and union branches get the path of their union followed by `|` and
+	the index (or tag value) of the branch. Optional and format wrappers are
+	counted together with the types they wrap.
+	"""
+	__slots__ = ['counters', 'types', 'branches']
+
+	methods = ('test', 'load', 'save', 'load_new', 'save_new')
+
+	def __init__(self):
+		self.counters = {}
+		self.types = {}
+		self.branches = {}
+
+	def __getstate__(self):
+		return (self.counters, self.types, self.branches)
+
+	def __setstate__(self, state):
+		self.counters, self.types, self.branches = state
+
+	def wrap(self, type, path, union=None):
+		def wrap_child(child, suffix):
+			if not suffix:
+				return self.wrap(child, path, union)
+			return self.wrap(child, path + suffix, path if suffix[0] == '|' else None)
+
+		if isinstance(type, OptionalType) or path in self.counters:
+			return type._map(wrap_child)
+
+		counters = self.counters[path] = python.dict((method, [0, 0, 0.0]) for method in self.methods)
+		self.types[path] = type
+		if union is not None:
+			self.branches[path] = union
+		return ProfiledType(type._map(wrap_child), counters, self)
+
+	def reset(self):
+		for counters in self.counters.itervalues():
+			for counter in counters.itervalues():
+				counter[:] = [0, 0, 0.0]
+
+	def totals(self, path):
+		"""
+		Returns the number of calls and failures of the node at `path`, over
+		all methods.
+		"""
+		counters = self.counters.get(path)
+		if counters is None:
+			return 0, 0
+		return sum(counter[0] for counter in counters.itervalues()), sum(counter[1] for counter in counters.itervalues())
+
+	def reorder(self, type, path=''):
+		"""
+		Returns `type`, the type that was profiled, with unions which prefer
+		to try the members with the most hits first, and dicts which check the
+		fields that failed most often first, so that the counted objects take
+		the fewest checks.
+		"""
+		type = type._map(lambda child, suffix: self.reorder(child, path + suffix))
+		return type._reorder(self, path)
+
+	def stats(self):
+		"""
+		Returns a list of dicts with the `path`, `type`, `method`, `calls`,
+		`failures` and cumulative `time` (in seconds) of every node and method
+		that was called, slowest first. Rows of union branches also have a
+		`hit_rate`, the share of calls of their union that the branch handled.
+		"""
+		rows = []
+		for path, counters in self.counters.iteritems():
+			for method in self.methods:
+				calls, failures, time = counters[method]
+				if not calls:
+					continue
+				row = {
+						'path': path,
+						'type': repr(self.types[path]),
+						'method': method,
+						'calls': calls,
+						'failures': failures,
+						'time': time,
+					}
+				if path in self.branches:
+					union_calls = self.counters[self.branches[path]][method][0]
+					row['hit_rate'] = python.float(calls - failures) / union_calls if union_calls else 0.0
+				rows.append(row)
+		rows.sort(key=lambda row: (-row['time'], row['path'], row['method']))
+		return rows
+
+	def json(self):
+		return python.json.dumps(self.stats())
+
+	def table(self, limit=None):
+		lines = ['%-40s %-8s %10s %10s %12s %14s %8s' % ('path', 'method', 'calls', 'failures', 'time (ms)', 'per call (us)', 'hits')]
+		for row in self.stats()[:limit]:
+			hits = '%7.1f%%' % (row['hit_rate'] * 100) if 'hit_rate' in row else ''
+			line = '%-40s %-8s %10d %10d %12.3f %14.3f %8s' % (
+					row['path'] or '(root)', row['method'], row['calls'], row['failures'],
+					row['time'] * 1e3, row['time'] * 1e6 / row['calls'], hits)
+			lines.append(line.rstrip())
+		return '\n'.join(lines)
+
+
+class AdaptiveType(CountingType):
+	"""
+	Converts objects with a copy of `type` whose unions and dicts are
+	reordered by the objects seen so far (see `Profile.reorder`). One call out
+	of every `sample` calls goes through a profiled copy of `type`, and every
+	`interval` calls the copy in use is reordered by the profile.
+	"""
+	__slots__ = ['type', 'sample', 'interval', 'profiled', 'current', 'calls']
+
+	def __init__(self, type, sample=100, interval=10000):
+		if sample < 1 or interval < 1:
+			raise ValueError('sample and interval must be positive')
+		self.type = type
+		self.sample = sample
+		self.interval = interval
+		self.profiled = profile(type)
+		self.current = type
+		self.calls = 0
+
+	def _args(self):
+		return (self.type, self.sample, self.interval)
+
+	@property
+	def profile(self):
+		return self.profiled.profile
+
+	def adapt(self):
+		type = self.profile.reorder(self.type)
+		if isinstance(self.type, CompiledType):
+			if type != self.current.type:
+				self.current = type.compile()
+		elif type != self.current:
+			self.current = type
+
+	def freeze(self):
+		"""
+		Returns the copy of the type reordered by all objects seen so far,
+		which keeps its order when it is pickled, compiled or cached.
+		"""
+		self.adapt()
+		return self.current
+
+	def next_type(self):
+		self.calls += 1
+		if self.calls % self.sample:
+			return self.current
+		if self.calls >= self.interval:
+			self.calls = 0
+			self.adapt()
+		return self.profiled
+
+	def test(self, obj):
+		return self.next_type().test(obj)
+
+	def _validate(self, obj, path, failures, first):
+		return self.current._validate(obj, path, failures, first)
+
+	def __repr__(self):
+		return 'typed.adaptive(%r)' % self.type
+
+	def load(self, obj):
+		return self.next_type().load(obj)
+
+	def save(self, obj):
+		return self.next_type().save(obj)
+
+	def load_new(self, obj):
+		return self.next_type().load_new(obj)
+
+	def save_new(self, obj):
+		return self.next_type().save_new(obj)
+
+	def _accepts(self, cls, method):
+		return self.type._accepts(cls, method)
+
+
+def _chunks(iterable, size):
+	iterator = python.iter(iterable)
+	while True:
+		chunk = python.list(itertools.islice(iterator, size))
+		if not chunk:
+			break
+		yield chunk
+
+_pool_type = None
+
+def _pool_init(type):
+	global _pool_type
+	_pool_type = type
+
+def _pool_load(chunk):
+	return [_pool_type.load(obj) for obj in chunk]
+
+def _pool_save(chunk):
+	return [_pool_type.save(obj) for obj in chunk]
+
+def map_many(type, method, iterable, workers, chunksize, ordered):
+	"""
+	Loads or saves all objects from `iterable` in a pool of `workers` processes,
+	which receive the type once and then process the objects in chunks.
+	"""
+	if workers == 1:
+		convert = getattr(type, method)
+		for obj in iterable:
+			yield convert(obj)
+		return
+
+	pool = multiprocessing.Pool(workers, _pool_init, (type, ))
+	try:
+		convert = _pool_load if method == 'load' else _pool_save
+		if ordered:
+			results = pool.imap(convert, _chunks(iterable, chunksize))
+		else:
+			results = pool.imap_unordered(convert, _chunks(iterable, chunksize))
+
+		for chunk in results:
+			for obj in chunk:
+				yield obj
+	finally:
+		pool.terminate()
+		pool.join()
+
+
+def _invalid():
+	raise ValueError('object has invalid type')
+
+def _missing(obj, fields):
+	for field in fields:
+		if field not in obj:
+			raise ValueError('dict is missing field %s' % repr(field))
+
+def _contains(values, obj):
+	try:
+		return obj in values
+	except TypeError:		# unhashable types
+		return False
+
+
+class Compiler(object):
+	"""
+	Generates the source of a python module with flat `test`, `load` and `save`
+	functions for a type. Checks of nested types are inlined into expressions
+	where possible, and container types get one generated function per node.
+	Types that do not know how to compile themselves are called as constants.
+	"""
+
+	builtins = {
+			'_invalid': _invalid,
+			'_contains': _contains,
+			'_int_types': (python.int, python.long),
+			'_hashable_types': python.frozenset([python.int, python.long, python.float, python.bool, python.str, python.unicode, python.types.NoneType, python.datetime.date, python.datetime.datetime]),
+			'_date': python.datetime.date,
+			'_datetime': python.datetime.datetime,
+			'isinstance': isinstance,
+			'len': len,
+			'xrange': xrange,
+			'list': python.list,
+			'dict': python.dict,
+			'tuple': python.tuple,
+			'bool': python.bool,
+			'ValueError': ValueError,
+			'_str': python.str,
+			'_json_float': json_float,
+			'_float_repr': python.float.__repr__,
+			'_infinity': json_encoder.INFINITY,
+			'_json_string': json_string,
+			'_json_encode': json_encode,
+			'_missing': _missing,
+			'_unicode': python.unicode,
+			'_bools': (False, True),
+			'_pack_double': binary_double.pack,
+			'_unpack_double': binary_double.unpack_from,
+			'_binary_uint': binary_uint,
+			'_binary_int': binary_int,
+			'_binary_read_uint': binary_read_uint,
+			'_binary_bits': binary_bits,
+			'_binary_read_bits': binary_read_bits,
+			'_binary_datetime': binary_datetime,
+			'_binary_any': binary_any,
+			'_binary_load_any': binary_load_any,
+		}
+
+	literal_types = (python.str, python.unicode, python.int, python.long, python.bool, python.types.NoneType)
+
+	def __init__(self):
+		self.namespace = python.dict(self.builtins)
+		self.consts = {}
+		self.functions = {}
+		self.sources = []
+		self.counter = itertools.count()
+
+	def const(self, value):
+		key = id(value)
+		if key not in self.consts:
+			name = '_c%d' % next(self.counter)
+			self.consts[key] = name
+			self.namespace[name] = value
+		return self.consts[key]
+
+	def literal(self, value):
+		if python.type(value) in self.literal_types:
+			return repr(value)
+		return self.const(value)
+
+	def function(self, type, method, v, body, *args, **kwargs):
+		key = (id(type), method)
+		if key not in self.functions:
+			name = '_%s%d' % (method, next(self.counter))
+			self.functions[key] = name
+			self.define(name, body(self, *args), kwargs.get('params', 'v'))
+		return '%s(%s)' % (self.functions[key], v)
+
+	def define(self, name, lines, params='v'):
+		self.sources.append('def %s(%s):\n%s' % (name, params, ''.join('\t%s\n' % line for line in lines)))
+
+	def callable(self, type, method):
+		expr = getattr(type, '_compile_' + method)(self, 'v')
+		if expr[:-3] in self.functions.itervalues() and expr.endswith('(v)'):
+			return expr[:-3]
+		name = '_%s%d' % (method, next(self.counter))
+		self.define(name, ['return %s' % expr])
+		return name
+
+	def table(self, items):
+		name = '_t%d' % next(self.counter)
+		self.sources.append('%s = {%s}\n' % (name, ', '.join('%s: %s' % item for item in items)))
+		return name
+
+	def execute(self):
+		source = '\n'.join(self.sources)
+		code = compile_source(source, '<typed>')
+		exec code in self.namespace
+		return source
+
+	def compile(self, type):
+		self.sources.append('test = %s\n' % self.callable(type, 'test'))
+		self.sources.append('load = %s\n' % self.callable(type, 'load'))
+		self.sources.append('save = %s\n' % self.callable(type, 'save'))
+		source = self.execute()
+		return CompiledType(type, source, self.namespace)
+
+	def compile_json(self, type):
+		"""
+		Returns a function which encodes objects of `type` into JSON directly,
+		as `json.dumps(type.save(obj))` would.
+		"""
+		self.sources.append('encode = %s\n' % self.callable(type, 'json'))
+		self.execute()
+		return self.namespace['encode']
+
+	def compile_binary(self, type):
+		"""
+		Returns a function which encodes objects of `type` into binary strings,
+		and one which decodes them from bytearrays, returning the object and
+		the index after it.
+		"""
+		self.define('encode', ['p = []', 'a = p.append'] + type._compile_binary_save(self, 'v') + ["return ''.join(p)"])
+		self.define('decode', ['i = 0'] + type._compile_binary_load(self, 'v') + ['return v, i'], 's')
+		self.execute()
+		return self.namespace['encode'], self.namespace['decode']
+
 
 
 
@@ -561,13 +3967,31 @@ datetime = DatetimeType()
 def set(*values):
 	return SetType(values)
 
+def range_base(low, high):
+	for type in (number, string, date, datetime):
+		if type.test(low) and type.test(high):
+			return type
+	return None
+
+def range(low, high):
+	type = range_base(low, high)
+	if type is None:
+		raise TypeError('typed.range() bounds must be numbers, strings, dates or datetimes')
+	return type.range(low, high)
+
 number = num = int | float
 
-def list(type):
+def list(type, buffers=False):
 	if not isinstance(type, Type):
 		raise TypeError('typed.list() argument must be a typed type')
 
-	return ListType(type)
+	return ListType(type, buffers)
+
+def iter(type):
+	if not isinstance(type, Type):
+		raise TypeError('typed.iter() argument must be a typed type')
+
+	return IterType(type)
 
 def dict(fields_dict):
 	if not isinstance(fields_dict, python.dict):
@@ -589,5 +4013,38 @@ optional = any.optional
 def default(value):
 	return any.default(value)
 
+def compile(type):
+	return type.compile()
+
+def profile(type):
+	return Profile().wrap(type, '')
+
+def adaptive(type, sample=100, interval=10000):
+	if not isinstance(type, Type):
+		raise TypeError('typed.adaptive() argument must be a typed type')
+
+	return AdaptiveType(type, sample, interval)
+
 def json(type, **kwargs):
 	return JSONFormatType(type, **kwargs)
+
+def binary(type):
+	return BinaryFormatType(type)
+
+def tagged(tag, types_dict):
+	if not isinstance(types_dict, python.dict):
+		raise TypeError('typed.tagged() argument must be a python dict')
+	if not all(isinstance(type, Type) for type in types_dict.itervalues()):
+		raise TypeError('typed.tagged() argument must have values which are typed types')
+
+	return TaggedUnionType(tag, types_dict)
+
+
+# module level types are pickled by name, so that they stay unique
+singleton_names = python.dict((id(value), name) for name, value in sorted(globals().items(), reverse=True) if isinstance(value, Type))
+
+def singleton(name):
+	return globals()[name]
+
+
+from typed import stream, records, cache
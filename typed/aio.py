@@ -0,0 +1,165 @@
+"""
+Loading of streams of records in coroutines, without blocking the event loop.
+Requires `trollius`, the asyncio library for Python 2.
+
+	@asyncio.coroutine
+	def handle(stream_reader, stream_writer):
+		reader = typed.aio.load(t, stream_reader, framing='ndjson')
+		while True:
+			records = yield From(reader.read_batch())
+			if not records:
+				break
+			...
+
+Records are read as newline-delimited JSON (`'ndjson'`) or as frames prefixed
+with their length as a 4-byte big-endian unsigned integer (`'length'`), which
+hold JSON, or the encoding of the type for `typed.json` and `typed.binary`
+types. Only one batch of frames is read ahead of the records that were
+returned, so a slow consumer pauses the stream instead of buffering it.
+
+Each batch is loaded in the event loop until it has taken `time_slice`
+seconds, and the rest of the batch is loaded by `executor` (by default, the
+executor of the loop), so that large bodies don't delay other connections.
+"""
+
+from __future__ import absolute_import
+
+import collections, timeit
+
+import trollius as asyncio
+from trollius import From, Return
+
+try:
+	import ujson as json
+except ImportError:
+	import json
+
+import typed
+from typed import stream
+
+
+timer = timeit.default_timer
+
+BATCH_SIZE = 1000
+TIME_SLICE = 0.005
+
+framings = {
+		'ndjson': stream.LineDecoder,
+		'length': stream.FrameDecoder,
+	}
+
+
+def load_frame(type, frame):
+	if isinstance(type, (typed.JSONFormatType, typed.BinaryFormatType)):
+		return type.load(frame)
+	return type.load(json.loads(frame))
+
+def load_batch(type, frames, first, on_error, deadline=None):
+	"""
+	Loads the `frames`, numbered from `first`, with `type`, until `deadline`
+	has passed. Returns the list of records, the list of (number, frame,
+	exception) tuples of the frames that failed to load (unless `on_error` is
+	'raise') and the number of frames that were loaded. Empty lines aren't
+	records.
+	"""
+	records = []
+	errors = []
+	for i, frame in enumerate(frames):
+		if deadline is not None and timer() > deadline:
+			return records, errors, i
+		if not frame.strip():
+			continue
+
+		try:
+			records.append(load_frame(type, frame))
+		except ValueError, e:
+			if on_error == 'raise':
+				raise ValueError('frame %d: %s' % (first + i, e))
+			errors.append((first + i, frame, e))
+
+	return records, errors, len(frames)
+
+
+class Reader(object):
+	"""
+	Reads records of `type` from `stream`, an `asyncio.StreamReader` or any
+	object with a `read(n)` coroutine, in batches of at most `batch_size`
+	records. Frames that fail to load are handled according to `on_error`,
+	as in `typed.stream.load`; collected errors are (frame number, frame,
+	exception) tuples, with frames numbered from 1.
+	"""
+
+	def __init__(self, type, stream, framing='ndjson', batch_size=BATCH_SIZE, time_slice=TIME_SLICE, executor=None,
+			on_error='raise', chunk_size=typed.stream.CHUNK_SIZE, max_frame_size=typed.stream.MAX_FRAME_SIZE, loop=None):
+		if framing not in framings:
+			raise ValueError('framing must be one of %s' % ', '.join(repr(name) for name in sorted(framings)))
+		if on_error not in ('raise', 'skip', 'collect'):
+			raise ValueError('on_error must be one of \'raise\', \'skip\' or \'collect\'')
+
+		self.type = type
+		self.stream = stream
+		self.decoder = framings[framing](max_frame_size)
+		self.batch_size = batch_size
+		self.time_slice = time_slice
+		self.executor = executor
+		self.on_error = on_error
+		self.chunk_size = chunk_size
+		self.loop = loop if loop is not None else asyncio.get_event_loop()
+		self.frames = collections.deque()
+		self.count = 0
+		self.eof = False
+		self.errors = []
+
+	@asyncio.coroutine
+	def read_frames(self):
+		while len(self.frames) < self.batch_size and not self.eof:
+			chunk = yield From(self.stream.read(self.chunk_size))
+			if chunk:
+				self.frames.extend(self.decoder.feed(chunk))
+			else:
+				self.frames.extend(self.decoder.flush())
+				self.eof = True
+
+		frames = [self.frames.popleft() for i in xrange(min(self.batch_size, len(self.frames)))]
+		first = self.count + 1
+		self.count += len(frames)
+		raise Return((frames, first))
+
+	@asyncio.coroutine
+	def read_batch(self):
+		"""
+		Returns the next list of loaded records, which is empty at the end of
+		the stream.
+		"""
+		records = []
+		while not records:
+			frames, first = yield From(self.read_frames())
+			if not frames:
+				break
+
+			records, errors, count = load_batch(self.type, frames, first, self.on_error, timer() + self.time_slice)
+			if count < len(frames):
+				rest, rest_errors, rest_count = yield From(self.loop.run_in_executor(self.executor,
+						load_batch, self.type, frames[count:], first + count, self.on_error))
+				records.extend(rest)
+				errors.extend(rest_errors)
+			if self.on_error == 'collect':
+				self.errors.extend(errors)
+
+		raise Return(records)
+
+	@asyncio.coroutine
+	def read_all(self):
+		"""
+		Returns the list of all records of the stream.
+		"""
+		records = []
+		while True:
+			batch = yield From(self.read_batch())
+			if not batch:
+				raise Return(records)
+			records.extend(batch)
+
+
+def load(type, stream, framing='ndjson', **kwargs):
+	return Reader(type, stream, framing=framing, **kwargs)
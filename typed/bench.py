@@ -0,0 +1,256 @@
+"""
+Benchmarks of `test`, `load` and `save` over a range of schema shapes.
+
+	python -m typed.bench --output results.json
+	python -m typed.bench --baseline results.json --tolerance 0.1
+
+Every benchmark is reported as operations per second and per-record latency
+percentiles (in microseconds) in a JSON document. When a baseline document is
+given, the results are compared to it and the process exits with status 1 if
+any benchmark got slower than the tolerance allows.
+"""
+
+import sys, timeit, random, argparse, datetime, platform
+
+import json as std_json
+
+try:
+	import ujson
+except ImportError:
+	ujson = None
+
+import typed
+
+
+timer = timeit.default_timer
+
+BATCH_TIME = 0.0001
+
+
+class Case(object):
+	"""
+	A benchmark case: a type, the records it is run over, and the methods
+	which are measured. The records are inputs for `test` and `load`, and
+	their loaded values are the inputs for `save`. If `load` or `save` is
+	given, `load(type, obj)` or `save(type, obj)` is measured instead of the
+	method of the type.
+	"""
+
+	def __init__(self, name, type, records, methods=('test', 'load', 'save'), load=None, save=None):
+		self.name = name
+		self.type = type
+		self.records = records
+		self.methods = methods
+		self.functions = {'load': load, 'save': save}
+
+	def function(self, type, method):
+		function = self.functions.get(method)
+		if function is not None:
+			return lambda obj: function(type, obj)
+		return getattr(type, method)
+
+	def inputs(self, method):
+		if method == 'save':
+			load = self.function(self.type, 'load')
+			return [load(record) for record in self.records]
+		return self.records
+
+
+def wide_dict(width):
+	types = [typed.int, typed.float, typed.string, typed.bool, typed.int.optional, typed.list(typed.int)]
+	values = [1, 1.5, 'abc', True, None, [1, 2, 3]]
+	fields = {}
+	record = {}
+	for i in xrange(width):
+		fields['field%d' % i] = types[i % len(types)]
+		if values[i % len(values)] is not None:
+			record['field%d' % i] = values[i % len(values)]
+	return typed.dict(fields), record
+
+def deep_dict(depth):
+	t = typed.dict({'id': typed.int, 'name': typed.string})
+	record = {'id': depth, 'name': 'leaf'}
+	for i in xrange(depth):
+		t = typed.dict({'id': typed.int, 'child': t})
+		record = {'id': i, 'child': record}
+	return t, record
+
+def wide_union():
+	branches = [
+			(typed.int, 1),
+			(typed.float, 1.5),
+			(typed.string, 'abc'),
+			(typed.bool, True),
+			(typed.none, None),
+			(typed.list(typed.int), [1, 2, 3]),
+			(typed.dict({'a': typed.int}), {'a': 1}),
+			(typed.dict({'b': typed.string}), {'b': 'x'}),
+			(typed.dict({'c': typed.list(typed.string)}), {'c': ['x']}),
+			(typed.tuple(typed.int, typed.int), (1, 2)),
+			(typed.datetime.format('%Y-%m-%d %H:%M:%S'), '2013-10-11 11:02:45'),
+		]
+	return typed.UnionType(*[t for t, value in branches]), [value for t, value in branches]
+
+def cases(size=1000):
+	rand = random.Random(0)
+	result = []
+
+	result.append(Case('int', typed.int, [rand.randint(-1000000, 1000000) for i in xrange(size)]))
+	result.append(Case('float', typed.float, [rand.random() for i in xrange(size)]))
+	result.append(Case('string', typed.string, ['s%d' % rand.randint(0, 1000000) for i in xrange(size)]))
+	result.append(Case('bool', typed.bool, [rand.random() < 0.5 for i in xrange(size)]))
+	result.append(Case('set', typed.set('a', 'b', 'c'), [rand.choice('abc') for i in xrange(size)]))
+
+	t, record = wide_dict(50)
+	result.append(Case('dict.wide', t, [record] * size))
+
+	t, record = deep_dict(20)
+	result.append(Case('dict.deep', t, [record] * size))
+
+	result.append(Case('list.long', typed.list(typed.int), [range(10000)] * max(1, size // 100)))
+
+	t, values = wide_union()
+	result.append(Case('union.wide', t, [values[i % len(values)] for i in xrange(size)]))
+
+	t, record = wide_dict(20)
+	records = [std_json.dumps(record)] * size
+	result.append(Case('json', typed.json(t), records, ('load', 'save')))
+	result.append(Case('json.schema', typed.json(t, decoder='schema', encoder='schema'), records, ('load', 'save')))
+	result.append(Case('binary', typed.binary(t), [typed.binary(t).save(record)] * size, ('load', 'save')))
+	for name, module in [('json.stdlib', std_json), ('json.ujson', ujson)]:
+		if module is not None:
+			result.append(Case(name, t, records, ('load', 'save'),
+					load=lambda t, s, module=module: t.load(module.loads(s)),
+					save=lambda t, obj, module=module: module.dumps(t.save(obj))))
+
+	start = datetime.datetime(2000, 1, 1)
+	dates = [start + datetime.timedelta(seconds=rand.randint(0, 10 ** 9), microseconds=rand.randint(0, 999999)) for i in xrange(size)]
+	for name, fmt in [('date.iso', '%Y-%m-%d'), ('date.european', '%d.%m.%Y')]:
+		result.append(Case(name, typed.date.format(fmt), [d.strftime(fmt) for d in dates], ('load', 'save')))
+	for name, fmt in [('datetime.iso', '%Y-%m-%dT%H:%M:%S.%f'), ('datetime.named', '%d %b %Y %H:%M')]:
+		result.append(Case(name, typed.datetime.format(fmt), [d.strftime(fmt) for d in dates], ('load', 'save')))
+
+	return result
+
+
+def percentile(sorted_values, fraction):
+	return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def measure(function, inputs, duration, samples=1000):
+	"""
+	Runs `function` over `inputs` until `duration` seconds have passed and at
+	least one full pass was made, to measure throughput. Latencies are then
+	sampled over batches of consecutive records, each batch being large enough
+	to take about `BATCH_TIME` seconds, so that timer resolution doesn't
+	distort the latencies of fast operations.
+	"""
+	count = 0
+	elapsed = 0.0
+	while elapsed < duration or count == 0:
+		start = timer()
+		for obj in inputs:
+			function(obj)
+		elapsed += timer() - start
+		count += len(inputs)
+
+	batch = max(1, min(len(inputs), int(BATCH_TIME * count / elapsed)))
+	batches = [inputs[i:i + batch] for i in xrange(0, len(inputs) - batch + 1, batch)]
+	latencies = []
+	end = timer() + duration
+	while len(latencies) < samples and (timer() < end or not latencies):
+		for objs in batches:
+			start = timer()
+			for obj in objs:
+				function(obj)
+			latencies.append((timer() - start) / batch)
+	latencies.sort()
+
+	return {
+			'ops': count / elapsed,
+			'records': len(inputs),
+			'batch': batch,
+			'p50': percentile(latencies, 0.5) * 1e6,
+			'p90': percentile(latencies, 0.9) * 1e6,
+			'p99': percentile(latencies, 0.99) * 1e6,
+			'max': latencies[-1] * 1e6,
+		}
+
+def run(selected=None, duration=0.2, size=1000, compiled=False, log=None):
+	"""
+	Runs all benchmarks whose names contain one of the `selected` strings
+	and returns a JSON-serializable dict of results keyed by `case.method`.
+	"""
+	results = {}
+	for case in cases(size):
+		t = case.type.compile() if compiled else case.type
+		for method in case.methods:
+			name = '%s.%s' % (case.name, method)
+			if selected and not any(s in name for s in selected):
+				continue
+			results[name] = measure(case.function(t, method), case.inputs(method), duration)
+			if log is not None:
+				log.write('%-24s %12.0f ops/s %10.2f us p50 %10.2f us p99\n' % (name, results[name]['ops'], results[name]['p50'], results[name]['p99']))
+
+	return {
+			'python': platform.python_version(),
+			'implementation': platform.python_implementation(),
+			'ujson': ujson is not None,
+			'compiled': compiled,
+			'results': results,
+		}
+
+def compare(report, baseline, tolerance=0.1):
+	"""
+	Compares the results of `report` with those of `baseline`. Returns a list
+	of (name, baseline ops, ops, ratio) tuples for all benchmarks present in
+	both, and a list of the names of those which are slower by more than
+	`tolerance`.
+	"""
+	comparison = []
+	regressions = []
+	for name in sorted(report['results']):
+		if name not in baseline['results']:
+			continue
+		ops = report['results'][name]['ops']
+		baseline_ops = baseline['results'][name]['ops']
+		ratio = ops / baseline_ops
+		comparison.append((name, baseline_ops, ops, ratio))
+		if ratio < 1 - tolerance:
+			regressions.append(name)
+	return comparison, regressions
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog='python -m typed.bench', description='Benchmarks typed types.')
+	parser.add_argument('selected', nargs='*', help='only run benchmarks whose names contain one of these strings')
+	parser.add_argument('--duration', type=float, default=0.2, help='minimum time spent on each benchmark, in seconds')
+	parser.add_argument('--size', type=int, default=1000, help='number of records per benchmark')
+	parser.add_argument('--compiled', action='store_true', help='benchmark compiled types')
+	parser.add_argument('--output', help='file to write the JSON results to (default: standard output)')
+	parser.add_argument('--baseline', help='JSON results to compare against')
+	parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative slowdown against the baseline')
+	args = parser.parse_args(argv)
+
+	report = run(args.selected, args.duration, args.size, args.compiled, log=sys.stderr)
+
+	regressions = []
+	if args.baseline:
+		with open(args.baseline) as f:
+			baseline = std_json.load(f)
+		comparison, regressions = compare(report, baseline, args.tolerance)
+		report['baseline'] = dict((name, ratio) for name, baseline_ops, ops, ratio in comparison)
+		for name, baseline_ops, ops, ratio in comparison:
+			sys.stderr.write('%-24s %12.0f -> %12.0f ops/s %+7.1f%%%s\n' % (name, baseline_ops, ops, (ratio - 1) * 100, ' REGRESSION' if name in regressions else ''))
+
+	output = std_json.dumps(report, indent=2, sort_keys=True)
+	if args.output:
+		with open(args.output, 'w') as f:
+			f.write(output + '\n')
+	else:
+		sys.stdout.write(output + '\n')
+
+	return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
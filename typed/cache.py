@@ -0,0 +1,201 @@
+"""
+Schema caches: files of types together with the code generated for them,
+from which a fresh process rebuilds ready-to-use types without calling their
+constructors or compiling any generated code.
+
+	schemas = {
+			'user': typed.dict({'id': typed.int, 'name': typed.string}),
+			'event': typed.json(typed.list(typed.int | typed.string), encoder='schema'),
+		}
+	typed.cache.dump(schemas, 'schemas.cache')
+
+	schemas = typed.cache.load('schemas.cache')
+	schemas['user'].load(obj)
+
+Each distinct type is stored once, under its digest, a hash of its structure
+which is stable across processes, so equal types of different schemas are
+restored as a single object. The attributes of types are stored as they are,
+including derived ones like the dispatch tables of unions, and the generated
+code of compiled types, date formats and binary and JSON formats is stored as
+code objects, which are used instead of compiling the same source again.
+
+A cache can only be loaded by the Python version and typed version that wrote
+it. Like pickles, caches must only be loaded from trusted sources.
+"""
+
+from __future__ import absolute_import
+
+import __builtin__, imp, hashlib, marshal, cPickle, StringIO
+
+import typed
+
+
+NoneType = type(None)
+
+MAGIC = 'TYPEDSCH'
+VERSION = 1
+
+
+def canonical(obj):
+	"""
+	Returns a string describing `obj`, a type or constructor arguments of a
+	type, which doesn't depend on the order of dicts and sets.
+	"""
+	if isinstance(obj, typed.Type):
+		if id(obj) in typed.singleton_names:
+			return 'typed.%s' % typed.singleton_names[id(obj)]
+		if isinstance(obj, typed.CountingType):
+			raise TypeError('profiled and adaptive types have no stable structure and can\'t be cached')
+		cls = type(obj)
+		return '%s.%s%s' % (cls.__module__, cls.__name__, canonical(tuple(obj._args())))
+	cls = type(obj)
+	if cls is dict:
+		return '{%s}' % ', '.join(sorted('%s: %s' % (canonical(key), canonical(value)) for key, value in obj.iteritems()))
+	elif cls is list:
+		return '[%s]' % ', '.join(canonical(item) for item in obj)
+	elif cls is tuple:
+		return '(%s)' % ', '.join(canonical(item) for item in obj)
+	elif cls is set or cls is frozenset:
+		return '{%s}' % ', '.join(sorted(canonical(item) for item in obj))
+	return repr(obj)
+
+def digest(type):
+	"""
+	Returns the hex digest of the structure of `type`. Equal types have the
+	same digest, in every process. Profiled and adaptive types, which are
+	only equal to themselves, raise a TypeError.
+	"""
+	return hashlib.sha1(canonical(type)).hexdigest()
+
+def layout():
+	"""
+	Returns a digest of the attributes of the type classes of the library,
+	which the stored types have to match.
+	"""
+	classes = [cls for cls in vars(typed).itervalues() if isinstance(cls, type) and issubclass(cls, typed.Type)]
+	return hashlib.sha1(repr(sorted((cls.__name__, typed.type_slots(cls)) for cls in classes))).digest()
+
+def header():
+	return MAGIC + chr(VERSION) + imp.get_magic() + layout()
+
+
+class Dumper(object):
+	"""
+	Collects the states of types and of the types they reference, each
+	pickled separately and keyed by the digest of the type.
+	"""
+
+	def __init__(self):
+		self.entries = {}
+		self.keys = {}
+
+	def persistent_id(self, obj):
+		if obj is NoneType:
+			return ('NoneType', )
+		if not isinstance(obj, typed.Type):
+			return None
+		if id(obj) in typed.singleton_names:
+			return ('singleton', typed.singleton_names[id(obj)])
+		if id(obj) in self.keys:
+			return self.keys[id(obj)][1]
+
+		key = digest(obj)
+		self.keys[id(obj)] = (obj, key)
+		if key not in self.entries:
+			self.entries[key] = (type(obj), self.dumps(obj._state()))
+		return key
+
+	def dumps(self, obj):
+		f = StringIO.StringIO()
+		pickler = cPickle.Pickler(f, cPickle.HIGHEST_PROTOCOL)
+		pickler.persistent_id = self.persistent_id
+		pickler.dump(obj)
+		return f.getvalue()
+
+
+class Loader(object):
+	"""
+	Rebuilds types from the entries of a `Dumper`, each type once.
+	"""
+
+	def __init__(self, entries):
+		self.entries = entries
+		self.types = {}
+
+	def persistent_load(self, key):
+		if key == ('NoneType', ):
+			return NoneType
+		if isinstance(key, tuple):
+			return typed.singleton(key[1])
+		if key in self.types:
+			return self.types[key]
+
+		cls, state = self.entries[key]
+		obj = cls.__new__(cls)
+		obj._restore(self.loads(state))
+		self.types[key] = obj
+		return obj
+
+	def loads(self, data):
+		unpickler = cPickle.Unpickler(StringIO.StringIO(data))
+		unpickler.persistent_load = self.persistent_load
+		return unpickler.load()
+
+
+def dump(types, fileobj):
+	"""
+	Writes the dict `types`, of names and types, to the schema cache
+	`fileobj`, a file name or a file object. The code generated for the types
+	is compiled to be stored with them. Profiled and adaptive types can't be
+	stored and raise a TypeError.
+	"""
+	dumper = Dumper()
+	names = dict((name, dumper.persistent_id(type)) for name, type in types.iteritems())
+
+	# restore the types once, to collect the code generated for them
+	codes = typed.code_recorder = {}
+	try:
+		loader = Loader(dumper.entries)
+		for key in names.itervalues():
+			loader.persistent_load(key)
+	finally:
+		typed.code_recorder = None
+
+	data = header() + cPickle.dumps((names, dumper.entries, marshal.dumps(codes)), cPickle.HIGHEST_PROTOCOL)
+	if isinstance(fileobj, basestring):
+		with __builtin__.open(fileobj, 'wb') as f:
+			f.write(data)
+	else:
+		fileobj.write(data)
+
+def load(fileobj):
+	"""
+	Reads the schema cache `fileobj`, a file name or a file object, and
+	returns its dict of names and types. The stored code objects are kept in
+	`typed.code_cache` and used by types compiled afterwards from the same
+	source.
+	"""
+	if isinstance(fileobj, basestring):
+		with __builtin__.open(fileobj, 'rb') as f:
+			return load(f)
+
+	data = fileobj.read()
+	expected = header()
+	if not data.startswith(MAGIC + chr(VERSION)):
+		raise ValueError('not a schema cache')
+	if not data.startswith(expected):
+		raise ValueError('schema cache was written by a different version')
+
+	try:
+		names, entries, codes = cPickle.loads(data[len(expected):])
+		codes = marshal.loads(codes)
+	except (cPickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError, ImportError, IndexError):
+		raise ValueError('invalid schema cache')
+
+	typed.code_cache.update(codes)
+
+	loader = Loader(entries)
+	try:
+		return dict((name, loader.persistent_load(key)) for name, key in names.iteritems())
+	except (cPickle.UnpicklingError, EOFError, KeyError):
+		raise ValueError('invalid schema cache')
@@ -0,0 +1,176 @@
+"""
+NumPy structured dtypes and arrays for `typed.dict` and `typed.tuple` types.
+
+	import typed.numpy
+
+	t = typed.dict({'id': typed.int, 'day': typed.date.format('%Y-%m-%d'), 'kind': typed.set('a', 'b')})
+
+	typed.numpy.dtype(t)		# [('day', '<M8[D]'), ('id', '<i8'), ('kind', 'u1')]
+	array = typed.numpy.load(t, records)
+
+Ints, floats and bools are stored with numeric dtypes, dates and datetimes as
+`datetime64` and set members as integer codes, which index the list returned
+by `categories(type)`. Dicts and tuples are stored as nested structured types,
+with dict fields in sorted order, and all other values as Python objects.
+Missing optional fields are stored as NaN, NaT or None, depending on the
+dtype, so optional fields of other types need a default value.
+"""
+
+from __future__ import absolute_import
+
+import numpy
+
+import typed
+
+
+class NoMissing(object):
+	pass
+
+def categories(type):
+	"""
+	Returns the list of the members of the `typed.set` type `type`, in the
+	order of their codes.
+	"""
+	if isinstance(type, typed.OptionalType):
+		type = type.type
+	if not isinstance(type, typed.SetType):
+		raise TypeError('categories() requires a typed.set type')
+	return typed.binary_order(type.values)
+
+def converter(type):
+	"""
+	Returns the dtype of objects of `type`, a function which loads an object
+	and converts it to a value that can be stored in an array of the dtype,
+	and the value of missing objects (or `NoMissing`).
+	"""
+	if isinstance(type, typed.DictType):
+		fields = []
+		for field in sorted(type.fields):
+			if not isinstance(field, str):
+				raise TypeError('NumPy field names must be strings')
+			field_type = type.fields[field]
+			dtype, convert, missing = converter(field_type)
+			if isinstance(field_type, typed.DefaultType):
+				missing = convert(field_type.default_value)
+			elif not isinstance(field_type, typed.OptionalType):
+				missing = NoMissing
+			elif missing is NoMissing:
+				raise TypeError('optional field %s of type %r needs a default value' % (repr(field), field_type.type))
+			fields.append((field, dtype, convert, missing))
+		return numpy.dtype([(field, dtype) for field, dtype, convert, missing in fields]), dict_converter(type, fields), NoMissing
+
+	elif isinstance(type, typed.TupleType):
+		items = [converter(item_type) for item_type in type.types]
+		return numpy.dtype([('f%d' % i, dtype) for i, (dtype, convert, missing) in enumerate(items)]), tuple_converter(items), NoMissing
+
+	elif isinstance(type, typed.OptionalType):
+		return converter(type.type)
+
+	elif isinstance(type, typed.SetType):
+		values = categories(type)
+		codes = dict((value, code) for code, value in enumerate(values))
+		dtype = numpy.dtype('u1' if len(values) <= 1 << 8 else 'u2' if len(values) <= 1 << 16 else 'u4')
+
+		def convert(obj):
+			try:
+				return codes[obj]
+			except (KeyError, TypeError):
+				raise ValueError('object has invalid type')
+
+		return dtype, convert, NoMissing
+
+	elif isinstance(type, typed.IntType):
+		return numpy.dtype('i8'), type.load, NoMissing
+
+	elif isinstance(type, typed.PrimitiveType) and type.type is float:
+		return numpy.dtype('f8'), type.load, numpy.nan
+
+	elif isinstance(type, typed.PrimitiveType) and type.type is bool:
+		return numpy.dtype('?'), type.load, NoMissing
+
+	elif isinstance(type, (typed.DateType, typed.DateFormatType)):
+		return numpy.dtype('M8[D]'), type.load_new, numpy.datetime64('NaT')
+
+	elif isinstance(type, (typed.DatetimeType, typed.DatetimeFormatType)):
+		load = type.load_new
+
+		def convert(obj):
+			obj = load(obj)
+			if obj.tzinfo is not None:
+				raise ValueError('timezone-aware datetimes are not supported')
+			return obj
+
+		return numpy.dtype('M8[us]'), convert, numpy.datetime64('NaT')
+
+	return numpy.dtype('O'), type.load_new, None
+
+def dict_converter(type, fields):
+	def convert(obj):
+		if not isinstance(obj, dict):
+			raise ValueError('object is not a dict')
+
+		values = []
+		num = 0
+		for field, dtype, convert_field, missing in fields:
+			if field in obj:
+				values.append(convert_field(obj[field]))
+				num += 1
+			elif missing is not NoMissing:
+				values.append(missing)
+			else:
+				raise ValueError('dict is missing field %s' % repr(field))
+
+		if len(obj) > num and not type.trim:
+			raise ValueError('dict has unexpected fields')
+		return tuple(values)
+
+	return convert
+
+def tuple_converter(items):
+	def convert(obj):
+		if not isinstance(obj, tuple):
+			raise ValueError('object is not a tuple')
+		if len(obj) > len(items):
+			raise ValueError('too many items')
+		if len(obj) < len(items):
+			raise ValueError('not enough items')
+		return tuple(convert_item(item) for (dtype, convert_item, missing), item in zip(items, obj))
+
+	return convert
+
+
+def dtype(type):
+	"""
+	Returns the structured NumPy dtype of the `typed.dict` or `typed.tuple`
+	type `type`.
+	"""
+	if not isinstance(type, (typed.DictType, typed.TupleType)):
+		raise TypeError('dtype() requires a typed.dict or typed.tuple type')
+	return converter(type)[0]
+
+def load(type, records, count=None):
+	"""
+	Loads the records of `type` from the iterable `records` into a new array
+	of `dtype(type)`, validating them while the array is filled. If `records`
+	has no length, `count` has to be given. The records are not modified.
+	"""
+	if not isinstance(type, (typed.DictType, typed.TupleType)):
+		raise TypeError('load() requires a typed.dict or typed.tuple type')
+	dtype, convert, missing = converter(type)
+
+	if count is None:
+		count = len(records)
+	array = numpy.empty(count, dtype=dtype)
+
+	i = -1
+	for i, obj in enumerate(records):
+		if i >= count:
+			raise ValueError('more than %d records' % count)
+		try:
+			array[i] = convert(obj)
+		except (ValueError, OverflowError), e:
+			raise ValueError('record %d: %s' % (i, e))
+
+	if i + 1 < count:
+		raise ValueError('only %d of %d records' % (i + 1, count))
+	return array
@@ -0,0 +1,359 @@
+"""
+Record files: streams of `typed.dict` or `typed.tuple` records in the binary
+format of `typed.binary`, with an index of record offsets, which are read
+through `mmap` without loading the whole file.
+
+	t = typed.dict({'id': typed.int, 'name': typed.string, 'tags': typed.list(typed.string)})
+
+	typed.records.dump(t, records, 'records.typed')
+
+	with typed.records.open(t, 'records.typed') as f:
+		print len(f), f[12345]['name']
+		for record in f[1000:2000]:
+			...
+
+Records are returned as lazy views: the fields of a record are decoded the
+first time they are accessed, directly from the mapped file.
+
+The file starts with a header holding a description of the type, which has
+to match the type the file is opened with. Each record holds its fields
+in a fixed order (sorted, for dicts), each field prefixed with its encoded
+length plus one, or 0 if the field is missing. The index of record offsets
+and a footer with its position and the number of records end the file.
+"""
+
+from __future__ import absolute_import
+
+import __builtin__, mmap, struct, collections
+
+import typed
+from typed import cache
+
+
+MAGIC = 'TYPEDREC'
+VERSION = 2
+
+CHUNK_SIZE = 64 * 1024
+
+offset_format = struct.Struct('<Q')
+record_format = struct.Struct('<QQ')
+footer_format = struct.Struct('<QQ8s')
+
+
+def read_uint(data, i):
+	n = 0
+	shift = 0
+	while True:
+		b = ord(data[i])
+		i += 1
+		n |= (b & 127) << shift
+		if b < 128:
+			return n, i
+		shift += 7
+
+def record_fields(type):
+	"""
+	Returns the list of (key, type) pairs of the fields of the records of
+	`type`, in the order in which they are stored.
+	"""
+	if isinstance(type, typed.DictType):
+		return [(field, type.fields[field]) for field in typed.binary_order(type.fields)]
+	elif isinstance(type, typed.TupleType):
+		return list(enumerate(type.types))
+	raise TypeError('record files require a typed.dict or typed.tuple type')
+
+def schema(type):
+	"""
+	Returns the description of `type` stored in the header, which doesn't
+	depend on the order of dicts and sets.
+	"""
+	return cache.canonical(type)
+
+
+class Encoder(object):
+	"""
+	Encodes records of a `typed.dict` or `typed.tuple` type, without modifying
+	them.
+	"""
+
+	def __init__(self, type):
+		self.type = type
+		self.fields = [(key, field_type, typed.binary(field_type)) for key, field_type in record_fields(type)]
+
+	def encode(self, obj):
+		type = self.type
+		parts = []
+		if isinstance(type, typed.TupleType):
+			if not isinstance(obj, tuple):
+				raise ValueError('object is not a tuple')
+			if len(obj) > len(type.types):
+				raise ValueError('too many items')
+			if len(obj) < len(type.types):
+				raise ValueError('not enough items')
+			for key, field_type, binary in self.fields:
+				data = binary.save(obj[key])
+				parts.append(typed.binary_uint(len(data) + 1))
+				parts.append(data)
+			return ''.join(parts)
+
+		if not isinstance(obj, dict):
+			raise ValueError('object is not a dict')
+		num = 0
+		for key, field_type, binary in self.fields:
+			if key in obj:
+				num += 1
+				value = obj[key]
+				if not isinstance(field_type, typed.DefaultType) or value != field_type.default_value:
+					data = binary.save(value)
+					parts.append(typed.binary_uint(len(data) + 1))
+					parts.append(data)
+					continue
+			elif not isinstance(field_type, typed.OptionalType):
+				raise ValueError('dict is missing field %s' % repr(key))
+			parts.append('\x00')
+		if not type.trim and len(obj) > num:
+			raise ValueError('dict has additional fields')
+		return ''.join(parts)
+
+
+class RecordView(object):
+	"""
+	Base class of the lazy views of records. The positions of the fields in
+	the record are read on first access, and each field is decoded when it is
+	first accessed and then cached.
+	"""
+
+	__slots__ = ['file', 'start', 'end', 'positions', 'values']
+
+	def __init__(self, file, start, end):
+		self.file = file
+		self.start = start
+		self.end = end
+		self.positions = None
+		self.values = {}
+
+	def _positions(self):
+		data = self.file.data
+		positions = []
+		i = self.start
+		try:
+			for field in self.file.fields:
+				n, i = read_uint(data, i)
+				if n:
+					positions.append((i, n - 1))
+					i += n - 1
+				else:
+					positions.append(None)
+		except IndexError:
+			raise ValueError('invalid record')
+		if i != self.end:
+			raise ValueError('invalid record')
+		self.positions = positions
+		return positions
+
+	def _field(self, index):
+		if index in self.values:
+			return self.values[index]
+		positions = self.positions
+		if positions is None:
+			positions = self._positions()
+		position = positions[index]
+		if position is None:
+			key, type, binary = self.file.fields[index]
+			if isinstance(type, typed.DefaultType):
+				return type.default_value
+			raise KeyError(key)
+
+		i, n = position
+		value = self.values[index] = self.file.fields[index][2].load(bytearray(buffer(self.file.data, i, n)))
+		return value
+
+
+class DictRecord(RecordView, collections.Mapping):
+	"""
+	A read-only mapping of the fields of a dict record. Missing optional
+	fields are not present, and missing fields with a default value have
+	their default value.
+	"""
+
+	__slots__ = []
+
+	def __getitem__(self, key):
+		index = self.file.indices.get(key)
+		if index is None:
+			raise KeyError(key)
+		return self._field(index)
+
+	def _present(self):
+		positions = self.positions
+		if positions is None:
+			positions = self._positions()
+		return [key for (key, type, binary), position in zip(self.file.fields, positions) if position is not None or isinstance(type, typed.DefaultType)]
+
+	def __iter__(self):
+		return iter(self._present())
+
+	def __len__(self):
+		return len(self._present())
+
+	def __repr__(self):
+		return '<typed.records.DictRecord at %d>' % self.start
+
+
+class TupleRecord(RecordView, collections.Sequence):
+	"""
+	A read-only sequence of the items of a tuple record.
+	"""
+
+	__slots__ = []
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return tuple(self._field(i) for i in xrange(*index.indices(len(self.file.fields))))
+		if index < 0:
+			index += len(self.file.fields)
+		if not 0 <= index < len(self.file.fields):
+			raise IndexError('record index out of range')
+		return self._field(index)
+
+	def __len__(self):
+		return len(self.file.fields)
+
+	def __repr__(self):
+		return '<typed.records.TupleRecord at %d>' % self.start
+
+
+class RecordSlice(collections.Sequence):
+	"""
+	A range of the records of a file, which doesn't hold any records until
+	they are accessed.
+	"""
+
+	__slots__ = ['file', 'start', 'step', 'length']
+
+	def __init__(self, file, start, step, length):
+		self.file = file
+		self.start = start
+		self.step = step
+		self.length = length
+
+	def __len__(self):
+		return self.length
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			start, stop, step = index.indices(self.length)
+			return RecordSlice(self.file, self.start + start * self.step, self.step * step, len(xrange(start, stop, step)))
+		if index < 0:
+			index += self.length
+		if not 0 <= index < self.length:
+			raise IndexError('record index out of range')
+		return self.file.record(self.start + index * self.step)
+
+	def __iter__(self):
+		record = self.file.record
+		for i in xrange(self.start, self.start + self.length * self.step, self.step):
+			yield record(i)
+
+
+class RecordFile(RecordSlice):
+	"""
+	A record file opened for reading. Indexing it returns a lazy view of a
+	record in constant time, and slicing it returns a `RecordSlice`.
+	"""
+
+	__slots__ = ['type', 'fileobj', 'data', 'fields', 'indices', 'index', 'view']
+
+	def __init__(self, type, fileobj):
+		self.type = type
+		self.fileobj = fileobj
+		self.fields = [(key, field_type, typed.binary(field_type)) for key, field_type in record_fields(type)]
+		self.indices = dict((key, index) for index, (key, field_type, binary) in enumerate(self.fields))
+		self.view = DictRecord if isinstance(type, typed.DictType) else TupleRecord
+
+		try:
+			self.data = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+		except (ValueError, mmap.error):
+			raise ValueError('not a record file')
+
+		data = self.data
+		header = MAGIC + chr(VERSION)
+		if len(data) < len(header) + footer_format.size or data[:len(header)] != header:
+			raise ValueError('not a record file')
+		index, count, magic = footer_format.unpack_from(data, len(data) - footer_format.size)
+		if magic != MAGIC or index + (count + 1) * offset_format.size != len(data) - footer_format.size:
+			raise ValueError('not a record file')
+		n, i = read_uint(data, len(header))
+		if data[i:i + n] != schema(type):
+			raise ValueError('record file was written with a different type')
+
+		self.index = index
+		super(RecordFile, self).__init__(self, 0, 1, count)
+
+	def record(self, i):
+		start, end = record_format.unpack_from(self.data, self.index + i * offset_format.size)
+		return self.view(self, start, end)
+
+	def close(self):
+		self.data.close()
+		self.fileobj.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+
+def open(type, fileobj):
+	"""
+	Opens the record file `fileobj`, a file name or a file object, of records
+	of `type`. The file is closed with the returned `RecordFile`.
+	"""
+	if not isinstance(fileobj, basestring):
+		return RecordFile(type, fileobj)
+
+	fileobj = __builtin__.open(fileobj, 'rb')
+	try:
+		return RecordFile(type, fileobj)
+	except Exception:
+		fileobj.close()
+		raise
+
+def dump(type, iterable, fileobj, buffer_size=CHUNK_SIZE):
+	"""
+	Saves all objects from `iterable` with `type` to a record file, which is
+	written to `fileobj` in batches of about `buffer_size` bytes. The objects
+	are not modified. Returns the number of records written.
+	"""
+	encode = Encoder(type).encode
+
+	if isinstance(fileobj, basestring):
+		with __builtin__.open(fileobj, 'wb') as f:
+			return dump(type, iterable, f, buffer_size=buffer_size)
+
+	position = fileobj.tell()
+	s = schema(type)
+	buffer = [MAGIC, chr(VERSION), typed.binary_uint(len(s)), s]
+	size = sum(len(part) for part in buffer)
+	offsets = bytearray()
+	count = 0
+	for obj in iterable:
+		data = encode(obj)
+		offsets.extend(offset_format.pack(position + size))
+		buffer.append(data)
+		size += len(data)
+		count += 1
+		if size >= buffer_size:
+			fileobj.write(''.join(buffer))
+			position += size
+			buffer = []
+			size = 0
+
+	index = position + size
+	offsets.extend(offset_format.pack(index))
+	buffer.append(str(offsets))
+	buffer.append(footer_format.pack(index, count, MAGIC))
+	fileobj.write(''.join(buffer))
+
+	return count
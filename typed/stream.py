@@ -0,0 +1,270 @@
+"""
+Streaming of newline-delimited JSON records, one record per line.
+
+	t = typed.dict({'id': typed.int, 'name': typed.string})
+
+	with open('records.ndjson.gz', 'rb') as f:
+		for record in typed.stream.load(t, f, compression='gzip'):
+			...
+
+	with open('out.ndjson', 'wb') as f:
+		typed.stream.dump(t, records, f)
+
+Records are read and written one at a time, so memory use doesn't depend on
+the size of the stream.
+"""
+
+import gzip, bz2, struct
+
+try:
+	import ujson as json
+except ImportError:
+	import json
+
+import typed
+
+
+CHUNK_SIZE = 64 * 1024
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+compressions = {
+		'.gz': 'gzip',
+		'.bz2': 'bz2',
+	}
+
+
+def read_chunks(fileobj, size=CHUNK_SIZE):
+	while True:
+		chunk = fileobj.read(size)
+		if not chunk:
+			break
+		yield chunk
+
+def read_lines(chunks):
+	pending = []
+	for chunk in chunks:
+		start = 0
+		end = chunk.find('\n')
+		while end >= 0:
+			pending.append(chunk[start:end + 1])
+			yield ''.join(pending)
+			pending = []
+			start = end + 1
+			end = chunk.find('\n', start)
+		if start < len(chunk):
+			pending.append(chunk[start:])
+
+	if pending:
+		yield ''.join(pending)
+
+def decompress(chunks, decompressor):
+	for chunk in chunks:
+		chunk = decompressor.decompress(chunk)
+		if chunk:
+			yield chunk
+
+
+class LineDecoder(object):
+	"""
+	Splits the chunks of a stream into lines, without their line ends. An
+	incomplete last line is kept until a later chunk completes it. Lines of
+	more than `max_size` bytes raise a ValueError, so that a stream without
+	line ends doesn't fill the memory.
+	"""
+
+	def __init__(self, max_size=MAX_FRAME_SIZE):
+		self.max_size = max_size
+		self.pending = []
+		self.size = 0
+
+	def feed(self, chunk):
+		"""
+		Returns the list of the lines completed by `chunk`.
+		"""
+		lines = chunk.split('\n')
+		if len(lines) > 1:
+			lines[0] = ''.join(self.pending) + lines[0]
+			self.pending = []
+			self.size = 0
+			if len(lines[0]) > self.max_size:
+				raise ValueError('line is longer than %d bytes' % self.max_size)
+
+		last = lines.pop()
+		if last:
+			self.pending.append(last)
+			self.size += len(last)
+			if self.size > self.max_size:
+				raise ValueError('line is longer than %d bytes' % self.max_size)
+		return lines
+
+	def flush(self):
+		"""
+		Returns the list of the lines left at the end of the stream.
+		"""
+		line = ''.join(self.pending)
+		self.pending = []
+		self.size = 0
+		return [line] if line else []
+
+
+class FrameDecoder(object):
+	"""
+	Splits the chunks of a stream into frames, each prefixed with its length
+	as a 4-byte big-endian unsigned integer. Frames of more than `max_size`
+	bytes raise a ValueError.
+	"""
+
+	header = struct.Struct('>I')
+
+	def __init__(self, max_size=MAX_FRAME_SIZE):
+		self.max_size = max_size
+		self.buffer = bytearray()
+
+	def feed(self, chunk):
+		"""
+		Returns the list of the frames completed by `chunk`.
+		"""
+		buffer = self.buffer
+		buffer.extend(chunk)
+		frames = []
+		i = 0
+		while len(buffer) - i >= self.header.size:
+			n, = self.header.unpack_from(buffer, i)
+			if n > self.max_size:
+				raise ValueError('frame is longer than %d bytes' % self.max_size)
+			start = i + self.header.size
+			if len(buffer) - start < n:
+				break
+			frames.append(str(buffer[start:start + n]))
+			i = start + n
+		del buffer[:i]
+		return frames
+
+	def flush(self):
+		if self.buffer:
+			raise ValueError('stream ends with an incomplete frame')
+		return []
+
+	@classmethod
+	def encode(cls, frame):
+		return cls.header.pack(len(frame)) + frame
+
+
+class Reader(object):
+	"""
+	Iterates over the records of a stream, loading each one with `type`.
+	Lines that fail to load are handled according to `on_error`, which is
+	one of 'raise', 'skip' or 'collect'. Collected errors are available as
+	a list of (line number, line, exception) tuples in the `errors` attribute.
+	"""
+
+	def __init__(self, type, fileobj, on_error='raise', compression=None):
+		if on_error not in ('raise', 'skip', 'collect'):
+			raise ValueError('on_error must be one of \'raise\', \'skip\' or \'collect\'')
+
+		self.type = type
+		self.fileobj = fileobj
+		self.on_error = on_error
+		self.compression = compression
+		self.errors = []
+
+	def lines(self, fileobj, compression):
+		if compression is None:
+			return iter(fileobj)
+		elif compression == 'gzip':
+			return iter(gzip.GzipFile(fileobj=fileobj, mode='rb'))
+		elif compression == 'bz2':
+			return read_lines(decompress(read_chunks(fileobj), bz2.BZ2Decompressor()))
+		raise ValueError('unknown compression %s' % repr(compression))
+
+	def __iter__(self):
+		fileobj = self.fileobj
+		compression = self.compression
+		if isinstance(fileobj, basestring):
+			for extension, extension_compression in compressions.iteritems():
+				if compression is None and fileobj.endswith(extension):
+					compression = extension_compression
+			fileobj = open(fileobj, 'rb')
+
+		if isinstance(self.type, typed.JSONFormatType):
+			load = self.type.load
+		else:
+			load = lambda line: self.type.load(json.loads(line))
+
+		try:
+			for number, line in enumerate(self.lines(fileobj, compression), 1):
+				if not line.strip():
+					continue
+
+				try:
+					record = load(line)
+				except ValueError, e:
+					if self.on_error == 'raise':
+						raise ValueError('line %d: %s' % (number, e))
+					elif self.on_error == 'collect':
+						self.errors.append((number, line, e))
+					continue
+
+				yield record
+		finally:
+			if fileobj is not self.fileobj:
+				fileobj.close()
+
+
+def load(type, fileobj, on_error='raise', compression=None):
+	return Reader(type, fileobj, on_error=on_error, compression=compression)
+
+def dump(type, iterable, fileobj, compression=None, buffer_size=CHUNK_SIZE):
+	"""
+	Saves all objects from `iterable` with `type` and writes them to `fileobj`
+	in batches of about `buffer_size` bytes. The objects are not modified.
+	Returns the number of records written.
+	"""
+	if isinstance(type, typed.JSONFormatType):
+		save = type.save_new
+	else:
+		save = lambda obj: json.dumps(type.save_new(obj))
+
+	if isinstance(fileobj, basestring):
+		with open(fileobj, 'wb') as f:
+			if compression is None:
+				for extension, extension_compression in compressions.iteritems():
+					if fileobj.endswith(extension):
+						compression = extension_compression
+			return dump(type, iterable, f, compression=compression, buffer_size=buffer_size)
+
+	if compression is None:
+		write = fileobj.write
+		close = None
+	elif compression == 'gzip':
+		gzip_file = gzip.GzipFile(fileobj=fileobj, mode='wb')
+		write = gzip_file.write
+		close = gzip_file.close
+	elif compression == 'bz2':
+		compressor = bz2.BZ2Compressor()
+		write = lambda data: fileobj.write(compressor.compress(data))
+		close = lambda: fileobj.write(compressor.flush())
+	else:
+		raise ValueError('unknown compression %s' % repr(compression))
+
+	buffer = []
+	size = 0
+	count = 0
+	for obj in iterable:
+		line = save(obj)
+		buffer.append(line)
+		buffer.append('\n')
+		size += len(line) + 1
+		count += 1
+		if size >= buffer_size:
+			write(''.join(buffer))
+			buffer = []
+			size = 0
+
+	if buffer:
+		write(''.join(buffer))
+	if close is not None:
+		close()
+
+	return count
+